@@ -0,0 +1,338 @@
+"""
+Benchmark of the `TwoFactorAuth` hot paths.
+
+Runs `get_status()`, `obtain()` and `verify()` in several scenarios:
+- happy: a new device, the code is sent by email and verified;
+- trusted_device: a known device, no code is needed;
+- lockout: the requester is locked by the `2fa-auth` throttle;
+- stuffing: a burst of unknown usernames from one IP.
+
+Each cache backend runs in its own process:
+- locmem;
+- latency: locmem with a fixed delay per call, a stand-in for a local Redis (`--latency`, 0.2 ms by default);
+- redis: only if `REDIS_URL` is set.
+
+It reports latency percentiles, cache round trips, DB queries and bytes written to the cache per operation.
+Passwords are hashed with MD5 to measure the library instead of the password hasher.
+
+Usage: python -m benchmarks.flows [--iterations 500] [--output results.json] [--compare previous.json]
+"""
+import argparse
+import collections
+import datetime
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import statistics
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+
+SCENARIOS = ('happy', 'trusted_device', 'lockout', 'stuffing')
+PERCENTILES = (50, 90, 99)
+
+
+class InstrumentedCacheMixin:
+    """
+    Counts round trips and written bytes, and adds `OPTIONS['LATENCY']` seconds to each call.
+    Calls made by another call of the same backend (e.g. `get_many()` of locmem calls `get()`) aren't counted.
+    """
+
+    def __init__(self, location, params) -> None:
+        super().__init__(location, params)
+        self._latency = params.get('OPTIONS', {}).get('LATENCY', 0)
+        self._local = threading.local()
+        self.stats = collections.Counter()
+
+    def _call(self, operation: str, *args, written_values=(), **kwargs):
+        if getattr(self._local, 'is_active', False):
+            return getattr(super(), operation)(*args, **kwargs)
+
+        self.stats['cache_round_trips'] += 1
+        self.stats['cache_bytes_written'] += sum(len(pickle.dumps(value)) for value in written_values)
+
+        if self._latency:
+            time.sleep(self._latency)
+
+        self._local.is_active = True
+
+        try:
+            return getattr(super(), operation)(*args, **kwargs)
+        finally:
+            self._local.is_active = False
+
+    def get(self, *args, **kwargs):
+        return self._call('get', *args, **kwargs)
+
+    def get_many(self, *args, **kwargs):
+        return self._call('get_many', *args, **kwargs)
+
+    def has_key(self, *args, **kwargs):
+        return self._call('has_key', *args, **kwargs)
+
+    def set(self, key, value, *args, **kwargs):
+        return self._call('set', key, value, *args, written_values=(value,), **kwargs)
+
+    def add(self, key, value, *args, **kwargs):
+        return self._call('add', key, value, *args, written_values=(value,), **kwargs)
+
+    def set_many(self, data, *args, **kwargs):
+        return self._call('set_many', data, *args, written_values=data.values(), **kwargs)
+
+    def touch(self, *args, **kwargs):
+        return self._call('touch', *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', *args, **kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        return self._call('delete_many', *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._call('incr', *args, **kwargs)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
+
+
+def _get_backends(latency: float) -> dict:
+    backends = {
+        'locmem': {'BACKEND': 'benchmarks.flows.InstrumentedLocMemCache'},
+        'latency': {'BACKEND': 'benchmarks.flows.InstrumentedLocMemCache', 'OPTIONS': {'LATENCY': latency}},
+    }
+
+    if os.environ.get('REDIS_URL'):
+        backends['redis'] = {'BACKEND': 'benchmarks.flows.InstrumentedRedisCache', 'LOCATION': os.environ['REDIS_URL']}
+
+    return backends
+
+
+def _setup_django(cache: dict) -> None:
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    cache = {**cache, 'OPTIONS': {'MAX_ENTRIES': 1_000_000, **cache.get('OPTIONS', {})}}
+
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'django_simple_2fa'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        CACHES={'default': cache},
+        TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}],
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        USE_TZ=True,
+        DJANGO_SIMPLE_2FA={
+            'IS_ENABLED': 'benchmarks.flows.is_enabled',
+            'THROTTLING_IS_ENABLED': 'benchmarks.flows.is_enabled',
+        },
+    )
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def is_enabled() -> bool:
+    return True
+
+
+def _measure(results: dict, operation: str, func) -> None:
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from django_simple_2fa.errors import TwoFactorAuthError
+
+    stats = cache.stats
+    stats.clear()
+
+    with CaptureQueriesContext(connection) as queries:
+        started_at = time.perf_counter()
+
+        try:
+            func()
+        except TwoFactorAuthError:
+            pass
+
+        duration = time.perf_counter() - started_at
+
+    result = results.setdefault(operation, collections.defaultdict(list))
+    result['latency'].append(duration)
+    result['cache_round_trips'].append(stats['cache_round_trips'])
+    result['cache_bytes_written'].append(stats['cache_bytes_written'])
+    result['db_queries'].append(len(queries))
+
+
+def _run_scenario(scenario: str, iterations: int, *, prefix: str = '') -> dict:
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+
+    from django_simple_2fa.base import TwoFactorAuth
+    from django_simple_2fa.dto import TwoFactorRequester
+    from django_simple_2fa.settings import app_settings
+    from django_simple_2fa.utils import UserDeviceManager, get_requester_ident
+
+    UserModel = get_user_model()
+    cache.clear()
+    results = {}
+    password = 'password'
+
+    def _get_two_factor_auth(username, ip='192.0.2.1', device_id='device'):
+        return TwoFactorAuth(TwoFactorRequester(username=username, password=password, ip=ip, device_id=device_id))
+
+    for i in range(iterations):
+        username = f'{prefix}{scenario}-{i}'
+
+        if scenario == 'stuffing':
+            # Attackers rotate usernames, so every attempt misses the throttles of the previous ones.
+            _measure(results, 'get_status', lambda: _get_two_factor_auth(username, ip='198.51.100.1').get_status())
+            continue
+
+        user = UserModel(username=username, email=f'{username}@example.com')
+        user.set_password(password)
+        user.save()
+
+        if scenario == 'trusted_device':
+            UserDeviceManager(user).add_device('device')
+        elif scenario == 'lockout':
+            rate_throttle = app_settings.RATE_THROTTLE_FOR_AUTH
+
+            for _ in range(rate_throttle.condition.max_attempts):
+                rate_throttle.increase_attempts(get_requester_ident(username=username, ip='192.0.2.1'))
+
+        _measure(results, 'get_status', lambda: _get_two_factor_auth(username).get_status())
+
+        obtain_result = None
+
+        def _obtain():
+            nonlocal obtain_result
+            obtain_result = _get_two_factor_auth(username).obtain()
+
+        if scenario != 'trusted_device':
+            _measure(results, 'obtain', _obtain)
+
+        verification_code = obtain_result.verification_code if obtain_result else ''
+        _measure(results, 'verify', lambda: _get_two_factor_auth(username).verify(verification_code))
+
+    return {operation: _summarize(values) for operation, values in results.items()}
+
+
+def _summarize(values: dict) -> dict:
+    latencies = sorted(values['latency'])
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+
+    return {
+        'count': len(latencies),
+        **{f'p{percentile}_ms': quantiles[percentile - 1] * 1000 for percentile in PERCENTILES},
+        'max_ms': latencies[-1] * 1000,
+        'cache_round_trips': statistics.mean(values['cache_round_trips']),
+        'cache_bytes_written': statistics.mean(values['cache_bytes_written']),
+        'db_queries': statistics.mean(values['db_queries']),
+    }
+
+
+def _worker(cache: dict, iterations: int, queue) -> None:
+    _setup_django(cache)
+
+    # Warm up imports, templates and connections.
+    try:
+        _run_scenario('happy', 5, prefix='warm-up-')
+        queue.put({scenario: _run_scenario(scenario, iterations) for scenario in SCENARIOS})
+    except BaseException:
+        queue.put(None)
+        raise
+
+
+def run(backend: dict, *, iterations: int) -> dict:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_worker, args=(backend, iterations, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    if result is None:
+        raise RuntimeError(f'Benchmark failed for {backend["BACKEND"]}, see the traceback above.')
+
+    return result
+
+
+def _print_results(results: dict, previous_results: dict) -> None:
+    print(
+        f'{"backend":<8} {"scenario":<15} {"operation":<10} '
+        f'{"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"cache":>6} {"bytes":>6} {"db":>4}',
+    )
+
+    for backend, scenarios in results.items():
+        for scenario, operations in scenarios.items():
+            for operation, result in operations.items():
+                line = (
+                    f'{backend:<8} {scenario:<15} {operation:<10} '
+                    f'{result["p50_ms"]:>8.3f} {result["p90_ms"]:>8.3f} {result["p99_ms"]:>8.3f} '
+                    f'{result["cache_round_trips"]:>6.1f} {result["cache_bytes_written"]:>6.0f} '
+                    f'{result["db_queries"]:>4.1f}'
+                )
+                previous_result = previous_results.get(backend, {}).get(scenario, {}).get(operation)
+
+                if previous_result:
+                    change = result['p50_ms'] / previous_result['p50_ms'] - 1
+                    line += f'  p50 {change:+.0%}'
+
+                    for name in ('cache_round_trips', 'db_queries'):
+                        if result[name] != previous_result[name]:
+                            line += f', {name} {previous_result[name]:g} -> {result[name]:g}'
+
+                print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0002, help='seconds per call of the "latency" backend')
+    parser.add_argument('--output', help='save results to a JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    args = parser.parse_args()
+
+    results = {
+        name: run(backend, iterations=args.iterations)
+        for name, backend in _get_backends(args.latency).items()
+    }
+
+    previous_results = {}
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous_results = json.load(f)['results']
+
+    _print_results(results, previous_results)
+
+    if args.output:
+        import django
+
+        import django_simple_2fa
+
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'version': django_simple_2fa.__version__,
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'iterations': args.iterations,
+                    'latency': args.latency,
+                },
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
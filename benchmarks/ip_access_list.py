@@ -0,0 +1,100 @@
+"""
+IP access list benchmark.
+
+Builds an `IPAccessList` from many random IPv4 and IPv6 prefixes
+and reports build time, memory and lookup cost, next to a linear scan over a fraction of the prefixes.
+Lookup cost depends on the number of distinct prefix lengths, not on the number of prefixes.
+
+Usage: python -m benchmarks.ip_access_list [--prefixes 100000] [--lookups 200000]
+"""
+import argparse
+import ipaddress
+import random
+import time
+import tracemalloc
+
+from django_simple_2fa.networks import ALLOW, DENY, IPAccessList
+
+
+def _get_networks(count: int, rnd: random.Random) -> list:
+    networks = set()
+
+    while len(networks) < count:
+        if rnd.random() < 0.8:
+            address = ipaddress.IPv4Address(rnd.getrandbits(32))
+            network = ipaddress.IPv4Network((address, rnd.randint(12, 32)), strict=False)
+        else:
+            address = ipaddress.IPv6Address(rnd.getrandbits(128))
+            network = ipaddress.IPv6Network((address, rnd.randint(16, 64)), strict=False)
+
+        networks.add(str(network))
+
+    return list(networks)
+
+
+def _get_ips(networks: list, count: int, rnd: random.Random) -> list:
+    ips = []
+
+    for i in range(count):
+        if i % 2:
+            # Random addresses, mostly misses.
+            ips.append(str(ipaddress.IPv4Address(rnd.getrandbits(32))))
+        else:
+            network = ipaddress.ip_network(rnd.choice(networks))
+            offset = rnd.getrandbits(network.max_prefixlen - network.prefixlen)
+            ips.append(str(network.network_address + offset))
+
+    return ips
+
+
+def _measure_lookups(get_rule, ips: list) -> float:
+    started_at = time.perf_counter()
+
+    for ip in ips:
+        get_rule(ip)
+
+    return (time.perf_counter() - started_at) / len(ips)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prefixes', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    networks = _get_networks(args.prefixes, rnd)
+    half = len(networks) // 2
+
+    started_at = time.perf_counter()
+    ip_access_list = IPAccessList(networks[:half], networks[half:])
+    build_time = time.perf_counter() - started_at
+
+    tracemalloc.start()
+    measured_ip_access_list = IPAccessList(networks[:half], networks[half:])
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured_ip_access_list
+
+    ips = _get_ips(networks, args.lookups, rnd)
+    rules = [ip_access_list.get_rule(ip) for ip in ips]
+    lookup_time = _measure_lookups(ip_access_list.get_rule, ips)
+
+    print(f'prefixes: {len(ip_access_list)}, build {build_time:.2f} s, {size / 1024 / 1024:.1f} MiB')
+    print(f'lookups: {lookup_time * 1e6:.2f} us/lookup '
+          f'({rules.count(ALLOW)} allowed, {rules.count(DENY)} denied, {rules.count(None)} not listed)')
+
+    # A linear scan is too slow for all prefixes, so it's measured on 1% of them.
+    scanned_networks = [ipaddress.ip_network(network) for network in networks[:max(len(networks) // 100, 1)]]
+    scanned_ips = [ipaddress.ip_address(ip) for ip in ips[:1000]]
+
+    def _scan(ip):
+        return next((network for network in scanned_networks if ip in network), None)
+
+    scan_time = _measure_lookups(_scan, scanned_ips)
+    print(f'linear scan over {len(scanned_networks)} prefixes: {scan_time * 1e6:.2f} us/lookup')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters, how long `django.setup()` takes
+and how long the first login path spends on settings and templates afterwards.
+
+Usage: python -m benchmarks.startup [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+SNIPPET = '''
+import json
+import time
+
+started_at = time.perf_counter()
+
+import django
+django.setup()
+
+setup_time = time.perf_counter() - started_at
+started_at = time.perf_counter()
+
+from django.template import loader
+from django_simple_2fa.settings import app_settings
+
+app_settings.USER_AUTH_SECURITY_CLASS
+app_settings.RATE_THROTTLE_FOR_AUTH
+app_settings.RATE_THROTTLE_FOR_OBTAIN
+app_settings.RATE_THROTTLE_FOR_VERIFY
+app_settings.DEFAULT_TWO_FACTOR_TYPE
+loader.get_template(app_settings.DEFAULT_TWO_FACTOR_TYPE.letter_template_name)
+loader.get_template(app_settings.USER_AUTH_SECURITY_CLASS.letter_template_name)
+
+first_request_time = time.perf_counter() - started_at
+
+print(json.dumps({'setup': setup_time, 'first_request': first_request_time}))
+'''
+
+
+def run_once(settings_module: str) -> dict:
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    output = subprocess.check_output([sys.executable, '-c', SNIPPET], env=env)
+    return json.loads(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--settings', default='tests.settings')
+    args = parser.parse_args()
+
+    results = [run_once(args.settings) for _ in range(args.runs)]
+
+    for name in ('setup', 'first_request'):
+        values = [result[name] * 1000 for result in results]
+        print(
+            f'{name:>14}: median {statistics.median(values):.2f} ms, '
+            f'min {min(values):.2f} ms, max {max(values):.2f} ms',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Throttle store benchmark: locmem vs. SharedMemoryCache vs. Redis.
+
+Runs `RateThrottle.increase_attempts()` / `get_status()` against each backend
+from several worker processes and reports ops/sec and memory.
+Redis is used only if `REDIS_URL` is set.
+
+Usage: python -m benchmarks.throttle_store [--workers 4] [--ops 20000]
+"""
+import argparse
+import datetime
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+
+def _setup_django(caches: dict) -> None:
+    import django
+    from django.conf import settings
+
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes'],
+        DATABASES={},
+        CACHES=caches,
+        DJANGO_SIMPLE_2FA={
+            'THROTTLING_IS_ENABLED': 'benchmarks.throttle_store.is_enabled',
+            'THROTTLE_CACHE_ALIAS': 'benchmark',
+            'LOCKOUT_REGISTRY': None,
+        },
+    )
+    django.setup()
+
+
+def is_enabled() -> bool:
+    return True
+
+
+def _worker(caches: dict, worker_id: int, ops: int, idents: int, queue) -> None:
+    _setup_django(caches)
+
+    from django_simple_2fa.throttling import RateThrottle, RateThrottleCondition
+
+    rate_throttle = RateThrottle(
+        scope='benchmark',
+        condition=RateThrottleCondition(max_attempts=1_000_000, duration=datetime.timedelta(minutes=5)),
+    )
+
+    started_at = time.perf_counter()
+
+    for i in range(ops):
+        ident = f'user-{(worker_id * ops + i) % idents}'
+
+        if i % 2:
+            rate_throttle.get_status(ident)
+        else:
+            rate_throttle.increase_attempts(ident)
+
+    queue.put(time.perf_counter() - started_at)
+
+
+def _memory_worker(caches: dict, idents: int, queue) -> None:
+    _setup_django(caches)
+
+    from django.core.cache import caches as django_caches
+
+    backend = caches['benchmark']['BACKEND']
+    cache = django_caches['benchmark']
+    value = [time.time()] * 3
+
+    if backend.endswith('SharedMemoryCache'):
+        queue.put(f'{os.path.getsize(caches["benchmark"]["LOCATION"]) / 1024 / 1024:.1f} MiB (fixed, per host)')
+        return
+
+    if backend.endswith('LocMemCache'):
+        tracemalloc.start()
+
+        for i in range(idents):
+            cache.set(f'rate-throttle:user-{i}:benchmark', value, 300)
+
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        queue.put(f'{size / 1024 / 1024:.1f} MiB (per process)')
+        return
+
+    client = cache._cache.get_client(write=True)
+    before = client.info('memory')['used_memory']
+
+    for i in range(idents):
+        cache.set(f'rate-throttle:user-{i}:benchmark', value, 300)
+
+    after = client.info('memory')['used_memory']
+    queue.put(f'{(after - before) / 1024 / 1024:.1f} MiB (per host)')
+
+
+def run(name: str, caches: dict, *, workers: int, ops: int, idents: int) -> None:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(caches, worker_id, ops, idents, queue))
+        for worker_id in range(workers)
+    ]
+
+    started_at = time.perf_counter()
+
+    for process in processes:
+        process.start()
+
+    durations = [queue.get() for _ in processes]
+
+    for process in processes:
+        process.join()
+
+    total_time = time.perf_counter() - started_at
+    ops_per_second = workers * ops / max(durations)
+
+    print(f'{name:>14}: {ops_per_second:>10.0f} ops/sec ({workers} workers, wall {total_time:.2f} s)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=20_000)
+    parser.add_argument('--idents', type=int, default=10_000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    backends = {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': args.idents * 2},
+        },
+        'shared-memory': {
+            'BACKEND': 'django_simple_2fa.cache_backends.SharedMemoryCache',
+            'LOCATION': os.path.join(directory, 'throttling'),
+            'OPTIONS': {'CAPACITY': 65536, 'MAX_KEY_SIZE': 96, 'MAX_VALUE_SIZE': 128},
+        },
+    }
+
+    if os.environ.get('REDIS_URL'):
+        backends['redis'] = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['REDIS_URL']}
+
+    for name, backend in backends.items():
+        caches = {'default': backends['locmem'], 'benchmark': backend}
+        run(name, caches, workers=args.workers, ops=args.ops, idents=args.idents)
+
+    print(f'memory for {args.idents} identities (value is {len(pickle.dumps([time.time()] * 3))} B):')
+
+    for name, backend in backends.items():
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(
+            target=_memory_worker,
+            args=({'default': backends['locmem'], 'benchmark': backend}, args.idents, queue),
+        )
+        process.start()
+        print(f'{name:>14}: {queue.get()}')
+        process.join()
+
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
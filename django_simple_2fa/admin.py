@@ -2,14 +2,24 @@ import datetime
 import uuid
 
 from django import forms
+from django.contrib import messages
 from django.contrib.admin import AdminSite
 from django.contrib.admin.forms import AdminAuthenticationForm
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.translation import gettext_lazy as _
 
+from . import flags
 from .auth_types import DirectTwoFactorAuthType
 from .base import TwoFactorAuth
 from .dto import TwoFactorRequester
 from .errors import TwoFactorAuthError
+from .lockouts import LockoutList
+from .settings import app_settings
+from .throttling import RateThrottle
 from .utils import get_ip_from_request
 
 
@@ -34,6 +44,7 @@ class AdminAuthenticationFormWith2FA(AdminAuthenticationForm):
         ),
     )
 
+    @flags.evaluation_scope()
     def clean(self):
         requester = TwoFactorRequester(
             username=self.cleaned_data.get('username'),
@@ -76,6 +87,8 @@ class AdminSiteWith2FA(AdminSite):
     """
     login_form = AdminAuthenticationFormWith2FA
     login_template = 'two_factor_auth/admin_login.html'
+    lockouts_template = 'two_factor_auth/lockouts.html'
+    lockouts_per_page = 100
 
     def login(self, request, *args, **kwargs):
         response = super().login(request, *args, **kwargs)
@@ -92,3 +105,58 @@ class AdminSiteWith2FA(AdminSite):
             )
 
         return response
+
+    def get_urls(self):
+        return [
+            path('lockouts/', self.admin_view(self.lockouts_view), name='lockouts'),
+            *super().get_urls(),
+        ]
+
+    def lockouts_view(self, request):
+        """
+        Paginated list of active lockouts from `LOCKOUT_REGISTRY` for superusers.
+        POST unlocks an identity.
+        """
+        registry = app_settings.LOCKOUT_REGISTRY
+
+        if not request.user.is_superuser or registry is None:
+            raise PermissionDenied
+
+        if request.method == 'POST':
+            scope, ident = request.POST.get('scope'), request.POST.get('ident')
+
+            if scope and ident:
+                self._unlock(scope=scope, ident=ident)
+            else:
+                messages.error(request, _('Scope and identity are required to unlock.'))
+
+            return redirect(request.get_full_path())
+
+        paginator = Paginator(LockoutList(registry), self.lockouts_per_page)
+        page_obj = paginator.get_page(request.GET.get('p'))
+
+        context = {
+            **self.each_context(request),
+            'title': _('Lockouts'),
+            'paginator': paginator,
+            'page_obj': page_obj,
+        }
+
+        return TemplateResponse(request, self.lockouts_template, context)
+
+    @staticmethod
+    def _unlock(*, scope: str, ident: str) -> None:
+        rate_throttles = {
+            rate_throttle.scope: rate_throttle
+            for rate_throttle in (
+                app_settings.RATE_THROTTLE_FOR_AUTH,
+                app_settings.RATE_THROTTLE_FOR_OBTAIN,
+                app_settings.RATE_THROTTLE_FOR_VERIFY,
+            )
+        }
+
+        if scope in rate_throttles:
+            rate_throttles[scope].reset(ident)
+        else:
+            RateThrottle.cache.delete(RateThrottle.cache_format.format(ident=ident, scope=scope))
+            app_settings.LOCKOUT_REGISTRY.remove(scope=scope, ident=ident)
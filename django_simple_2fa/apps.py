@@ -0,0 +1,116 @@
+import typing
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+__all__ = (
+    'DjangoSimple2FAConfig',
+)
+
+
+class DjangoSimple2FAConfig(AppConfig):
+    name = 'django_simple_2fa'
+    verbose_name = 'Django Simple 2FA'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
+        from .settings import app_settings
+
+        self.resolve_settings(app_settings)
+        self.compile_letter_templates(app_settings)
+
+        if app_settings.WARM_UP_CACHE:
+            self.warm_up_cache()
+
+    @staticmethod
+    def resolve_settings(app_settings) -> None:
+        """
+        Resolve all import strings at startup,
+        so the first request doesn't pay for it and typos are found early.
+        """
+        from .audit import BaseAuditSink
+        from .auth_types.base import BaseTwoFactorAuthType
+        from .lockouts import BaseLockoutRegistry
+        from .throttling import RateThrottle
+        from .tracing import BaseTraceSink
+
+        try:
+            app_settings.setup()
+        except ImportError as e:
+            raise ImproperlyConfigured(str(e)) from e
+        except (OSError, ValueError) as e:
+            # Invalid networks in `TRUSTED_PROXIES` or IP access lists.
+            raise ImproperlyConfigured(f'DJANGO_SIMPLE_2FA: {e}') from e
+
+        for attr in ('IS_ENABLED', 'THROTTLING_IS_ENABLED', 'USER_TWO_FACTOR_TYPE_GETTER'):
+            value = getattr(app_settings, attr)
+
+            if value is not None and not callable(value):
+                raise ImproperlyConfigured(f'DJANGO_SIMPLE_2FA["{attr}"] must be a callable.')
+
+        if not isinstance(app_settings.USER_AUTH_SECURITY_CLASS, type):
+            raise ImproperlyConfigured('DJANGO_SIMPLE_2FA["USER_AUTH_SECURITY_CLASS"] must be a class.')
+
+        for two_factor_type in (*app_settings.TWO_FACTOR_TYPES, app_settings.DEFAULT_TWO_FACTOR_TYPE):
+            if not _is_subclass(two_factor_type, BaseTwoFactorAuthType):
+                raise ImproperlyConfigured(
+                    f'{two_factor_type!r} must be a subclass of {BaseTwoFactorAuthType.__name__}.',
+                )
+
+        for attr in ('RATE_THROTTLE_FOR_AUTH', 'RATE_THROTTLE_FOR_OBTAIN', 'RATE_THROTTLE_FOR_VERIFY'):
+            if not isinstance(getattr(app_settings, attr), RateThrottle):
+                raise ImproperlyConfigured(
+                    f'DJANGO_SIMPLE_2FA["{attr}"] must be an instance of {RateThrottle.__name__}.',
+                )
+
+        if app_settings.THROTTLE_CACHE_ALIAS not in settings.CACHES:
+            raise ImproperlyConfigured(
+                f'DJANGO_SIMPLE_2FA["THROTTLE_CACHE_ALIAS"] must be one of CACHES: {", ".join(settings.CACHES)}.',
+            )
+
+        lockout_registry = app_settings.LOCKOUT_REGISTRY
+
+        if lockout_registry is not None and not isinstance(lockout_registry, BaseLockoutRegistry):
+            raise ImproperlyConfigured(
+                f'DJANGO_SIMPLE_2FA["LOCKOUT_REGISTRY"] must be an instance of {BaseLockoutRegistry.__name__}.',
+            )
+
+        for sink in app_settings.TRACING_SINKS:
+            if not isinstance(sink, BaseTraceSink):
+                raise ImproperlyConfigured(
+                    f'DJANGO_SIMPLE_2FA["TRACING_SINKS"] must contain instances of {BaseTraceSink.__name__}.',
+                )
+
+        for sink in app_settings.AUDIT_SINKS:
+            if not isinstance(sink, BaseAuditSink):
+                raise ImproperlyConfigured(
+                    f'DJANGO_SIMPLE_2FA["AUDIT_SINKS"] must contain instances of {BaseAuditSink.__name__}.',
+                )
+
+    @staticmethod
+    def compile_letter_templates(app_settings) -> None:
+        from django.template import loader
+
+        template_names = {
+            getattr(klass, 'letter_template_name', None)
+            for klass in (app_settings.USER_AUTH_SECURITY_CLASS, *app_settings.TWO_FACTOR_TYPES)
+        }
+        template_names.discard(None)
+
+        for template_name in sorted(template_names):
+            # Populates the cached template loader.
+            loader.get_template(template_name)
+
+    @staticmethod
+    def warm_up_cache() -> None:
+        from django.core.cache import cache
+
+        # Opens a connection to the cache backend in the current worker.
+        cache.get('django-simple-2fa:warm-up')
+
+
+def _is_subclass(value: typing.Any, klass: type) -> bool:
+    return isinstance(value, type) and issubclass(value, klass)
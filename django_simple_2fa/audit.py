@@ -0,0 +1,280 @@
+"""
+Audit log of authentication events (obtain, verify, failures, lockouts, ...).
+
+`record()` only appends an `AuditEvent` to a bounded in-memory buffer, so logins don't wait for the audit storage.
+A background thread of each process hands the buffer to `AUDIT_SINKS` in batches
+every `AUDIT_FLUSH_INTERVAL` seconds or as soon as `AUDIT_BATCH_SIZE` events are buffered.
+When the buffer holds `AUDIT_BUFFER_SIZE` events, new events are dropped and counted
+(`audit_log.stats['dropped']` and the `django_simple_2fa_audit_events_total` metric) instead of blocking.
+
+Without `AUDIT_SINKS` nothing is recorded and no thread is started.
+With `AUDIT_FLUSH_INTERVAL = None` there is no thread either: events are written by `audit_log.flush()`
+(and at exit), e.g. in tests and scripts.
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import threading
+import typing
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+
+from . import clock, metrics
+from .settings import app_settings
+
+
+if typing.TYPE_CHECKING:
+    from django.contrib.auth import get_user_model
+    UserModel = get_user_model()
+
+__all__ = (
+    'AuditEvent',
+    'AuditLog',
+    'BaseAuditSink',
+    'DatabaseAuditSink',
+    'JSONLinesAuditSink',
+    'audit_log',
+    'database_sink',
+    'record',
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AuditEvent:
+    timestamp: float
+    # E.g. `authenticate`, `obtain`, `verify`, `lockout`.
+    event: str
+    # E.g. `success`, `failure`, `blocked`, `denied`, `locked`.
+    outcome: str
+    username: typing.Optional[str] = None
+    user_id: typing.Optional[str] = None
+    ip: typing.Optional[str] = None
+    device_id: typing.Optional[str] = None
+    auth_type: typing.Optional[str] = None
+    details: typing.Dict[str, typing.Any] = field(default_factory=dict)
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.timestamp, tz=datetime.timezone.utc)
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        data = asdict(self)
+        data['timestamp'] = self.created_at.isoformat()
+        return data
+
+
+class BaseAuditSink:
+    def write(self, events: typing.List[AuditEvent]) -> None:
+        raise NotImplementedError
+
+
+class JSONLinesAuditSink(BaseAuditSink):
+    """
+    Appends one JSON object per line to `path`.
+    The file is rotated like `logging.handlers.RotatingFileHandler` when it would exceed `max_bytes`:
+    `path` becomes `path.1`, `path.1` becomes `path.2` and so on up to `backup_count`.
+
+    `{pid}` in `path` is replaced with the process ID, so worker processes don't rotate each other's files.
+    """
+    path: str
+    max_bytes: int
+    backup_count: int
+
+    def __init__(self, path: str, *, max_bytes: int = 100 * 1024 * 1024, backup_count: int = 5) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def write(self, events: typing.List[AuditEvent]) -> None:
+        data = ''.join(json.dumps(event.as_dict(), default=str) + '\n' for event in events).encode()
+        path = self.path.format(pid=os.getpid())
+
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                size = 0
+
+            if size and self.max_bytes and size + len(data) > self.max_bytes:
+                self._rotate(path)
+
+            with open(path, 'ab') as f:
+                f.write(data)
+
+    def _rotate(self, path: str) -> None:
+        if not self.backup_count:
+            os.remove(path)
+            return
+
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{path}.{i}'):
+                os.replace(f'{path}.{i}', f'{path}.{i + 1}')
+
+        os.replace(path, f'{path}.1')
+
+
+class DatabaseAuditSink(BaseAuditSink):
+    """
+    Saves events as `AuditLogEntry` rows with one `bulk_create()` per batch.
+    """
+    batch_size: typing.Optional[int]
+
+    def __init__(self, batch_size: typing.Optional[int] = None) -> None:
+        self.batch_size = batch_size
+
+    def write(self, events: typing.List[AuditEvent]) -> None:
+        from django.db import close_old_connections
+
+        from .models import AuditLogEntry
+
+        # The writer thread keeps its own connection, which can become stale between flushes.
+        close_old_connections()
+
+        AuditLogEntry.objects.bulk_create(
+            [
+                AuditLogEntry(
+                    created_at=clock.to_datetime(event.timestamp),
+                    event=event.event,
+                    outcome=event.outcome,
+                    username=event.username or '',
+                    user_id=event.user_id or '',
+                    ip=event.ip or None,
+                    device_id=event.device_id or '',
+                    auth_type=event.auth_type or '',
+                    details=event.details,
+                )
+                for event in events
+            ],
+            batch_size=self.batch_size,
+        )
+
+
+class AuditLog:
+    """
+    Bounded buffer of events with a background writer thread.
+    `stats` counts `recorded` and `dropped` events, and `written` and `failed` events per sink.
+    """
+    stats: typing.Counter[str]
+
+    def __init__(self) -> None:
+        self.stats = Counter()
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def record(self, event: AuditEvent) -> None:
+        self._ensure_started()
+
+        with self._lock:
+            if len(self._buffer) >= app_settings.AUDIT_BUFFER_SIZE:
+                self.stats['dropped'] += 1
+                is_dropped = True
+            else:
+                self._buffer.append(event)
+                self.stats['recorded'] += 1
+                is_dropped = False
+
+            is_batch_ready = len(self._buffer) >= app_settings.AUDIT_BATCH_SIZE
+
+        if is_dropped:
+            metrics.audit_events.inc(result='dropped')
+
+        if is_batch_ready:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """
+        Write buffered events in the calling thread and return their number.
+        """
+        with self._write_lock:
+            with self._lock:
+                events = list(self._buffer)
+                self._buffer.clear()
+
+            batch_size = app_settings.AUDIT_BATCH_SIZE
+
+            for i in range(0, len(events), batch_size):
+                self._write(events[i:i + batch_size])
+
+        return len(events)
+
+    def _write(self, events: typing.List[AuditEvent]) -> None:
+        for sink in app_settings.AUDIT_SINKS:
+            try:
+                sink.write(events)
+            except Exception:
+                # Events aren't retried: a broken sink mustn't make the buffer grow.
+                logger.exception('Audit sink %r failed to write %d events.', sink, len(events))
+                result = 'failed'
+            else:
+                result = 'written'
+
+            self.stats[result] += len(events)
+            metrics.audit_events.inc(len(events), result=result)
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            if self._pid is not None:
+                # A forked child: events of the parent are written by the parent.
+                self._buffer.clear()
+            else:
+                atexit.register(self.flush)
+
+            self._pid = os.getpid()
+
+            if app_settings.AUDIT_FLUSH_INTERVAL is not None:
+                threading.Thread(target=self._run, name='django-simple-2fa-audit', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(app_settings.AUDIT_FLUSH_INTERVAL)
+            self._wakeup.clear()
+
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Audit log flush failed.')
+
+
+audit_log = AuditLog()
+database_sink = DatabaseAuditSink()
+
+
+def record(event: str,
+           outcome: str, *,
+           username: typing.Optional[str] = None,
+           user: typing.Optional['UserModel'] = None,
+           ip: typing.Optional[str] = None,
+           device_id: typing.Optional[str] = None,
+           auth_type: typing.Optional[str] = None,
+           **details: typing.Any) -> None:
+    """
+    Buffer an event for `AUDIT_SINKS`, extra keyword arguments go to `details`.
+    """
+    if not app_settings.AUDIT_SINKS:
+        return
+
+    audit_log.record(AuditEvent(
+        timestamp=clock.now(),
+        event=event,
+        outcome=outcome,
+        username=username,
+        user_id=str(user.pk) if user is not None else None,
+        ip=ip,
+        device_id=device_id,
+        auth_type=auth_type,
+        details=details,
+    ))
@@ -1,3 +1,4 @@
 from .base import *
 from .direct import *
 from .email import *
+from .recovery_codes import *
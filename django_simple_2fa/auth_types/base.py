@@ -1,6 +1,7 @@
 import typing
 
 from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
 
 from ..dto import TwoFactorAuthObtainResult
 
@@ -16,6 +17,12 @@ __all__ = (
 class BaseTwoFactorAuthType:
     name: str
     type: str
+    # `verify()` calls `reset()` and shows it when the verify throttle is spent, `None` keeps the code.
+    lockout_reason: typing.Optional[str] = _(
+        'After many failed attempts we removed your code. You need to request a code again.'
+    )
+    # `obtain()` issues a new code, so it resets the verify throttle. `False` keeps the attempts.
+    obtain_rotates_secret = True
 
     @classmethod
     def obtain(cls, *, user: 'UserModel') -> TwoFactorAuthObtainResult:
@@ -18,6 +18,7 @@ __all__ = (
 class DirectTwoFactorAuthType(BaseTwoFactorAuthType):
     name = 'Direct (without 2FA)'
     type = 'direct'
+    lockout_reason = None
 
     @classmethod
     def obtain(cls, *, user: 'UserModel') -> TwoFactorAuthObtainResult:
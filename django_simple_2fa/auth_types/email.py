@@ -4,12 +4,11 @@ import typing
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
-from django.core.mail import send_mail
-from django.template import loader
 from django.utils.translation import gettext_lazy as _
 
 from .base import BaseTwoFactorAuthType
+from .. import metrics, tracing
+from ..caching import cache
 from ..dto import TwoFactorAuthObtainResult
 from ..errors import TwoFactorAuthError
 
@@ -25,6 +24,7 @@ __all__ = (
 class EmailTwoFactorAuthType(BaseTwoFactorAuthType):
     name = 'Email'
     type = 'email'
+    letter_template_name = 'two_factor_auth/letters/verification_code.txt'
     _code_ttl = datetime.timedelta(days=1)
 
     @classmethod
@@ -41,6 +41,7 @@ class EmailTwoFactorAuthType(BaseTwoFactorAuthType):
 
         context = cls.get_context_for_letter(user=user, verification_code=verification_code)
         cls.send_letter(context)
+        metrics.codes_sent.inc(auth_type=cls.type)
 
         return TwoFactorAuthObtainResult(
             message=_(
@@ -71,19 +72,24 @@ class EmailTwoFactorAuthType(BaseTwoFactorAuthType):
 
         return code_is_valid
 
-    @staticmethod
-    def send_letter(context: dict) -> None:
-        message = loader.render_to_string(
-            'two_factor_auth/letters/verification_code.txt',
-            context=context,
-        )
-
-        send_mail(
-            subject='2-factor authentication',
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[context['user'].email],
-        )
+    @classmethod
+    def send_letter(cls, context: dict) -> None:
+        from django.core.mail import send_mail
+        from django.template import loader
+
+        with tracing.stage('render_letter'):
+            message = loader.render_to_string(
+                cls.letter_template_name,
+                context=context,
+            )
+
+        with tracing.stage('send_letter'):
+            send_mail(
+                subject='2-factor authentication',
+                message=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[context['user'].email],
+            )
 
     @staticmethod
     def get_context_for_letter(*,
@@ -0,0 +1,120 @@
+import hashlib
+import hmac
+import secrets
+import typing
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+
+from .base import BaseTwoFactorAuthType
+from ..dto import TwoFactorAuthObtainResult
+from ..errors import TwoFactorAuthError
+
+
+if typing.TYPE_CHECKING:
+    UserModel = get_user_model()
+
+__all__ = (
+    'RecoveryCodesTwoFactorAuthType',
+)
+
+
+class RecoveryCodesTwoFactorAuthType(BaseTwoFactorAuthType):
+    """
+    One-time backup codes, e.g. for users who lost access to their email.
+
+    `generate()` returns new codes to show to a user once. They are stored in one `RecoveryCodes` row per user
+    as salted BLAKE2b digests (16 bytes per code), and a valid code is removed from the row in the same transaction.
+    Codes have 50 random bits, so a fast hash is enough, and guessing is limited by `RATE_THROTTLE_FOR_VERIFY`.
+    """
+    name = 'Recovery codes'
+    type = 'recovery_codes'
+    # The codes are kept after a lockout, and `obtain()` doesn't issue new ones.
+    lockout_reason = None
+    obtain_rotates_secret = False
+    code_length = 10
+    # Crockford's Base32: no I, L, O and U.
+    alphabet = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+    _digest_size = 16
+
+    @classmethod
+    def generate(cls, *, user: 'UserModel', count: int = 10) -> typing.List[str]:
+        """
+        Replace codes of a user with `count` new ones, formatted as `XXXXX-XXXXX`.
+        """
+        from ..models import RecoveryCodes
+
+        codes = [''.join(secrets.choice(cls.alphabet) for _ in range(cls.code_length)) for _ in range(count)]
+        salt = secrets.token_bytes(hashlib.blake2b.SALT_SIZE)
+
+        RecoveryCodes.objects.update_or_create(
+            user=user,
+            defaults={
+                'salt': salt,
+                'hashes': b''.join(cls._hash(code, salt=salt) for code in codes),
+            },
+        )
+
+        return [f'{code[:cls.code_length // 2]}-{code[cls.code_length // 2:]}' for code in codes]
+
+    @classmethod
+    def count_remaining(cls, *, user: 'UserModel') -> int:
+        from ..models import RecoveryCodes
+
+        hashes = RecoveryCodes.objects.filter(user=user).values_list('hashes', flat=True).first()
+        return len(hashes) // cls._digest_size if hashes else 0
+
+    @classmethod
+    def obtain(cls, *, user: 'UserModel') -> TwoFactorAuthObtainResult:
+        if not cls.count_remaining(user=user):
+            raise TwoFactorAuthError(_('You do not have recovery codes left.'))
+
+        return TwoFactorAuthObtainResult(
+            message=_('Enter one of your recovery codes.'),
+            verification_code='',
+        )
+
+    @classmethod
+    def reset(cls, *, user: 'UserModel') -> None:
+        pass
+
+    @classmethod
+    def is_valid(cls, *,
+                 user: 'UserModel',
+                 verification_code: str) -> bool:
+        from django.db import transaction
+
+        from ..models import RecoveryCodes
+
+        code = cls._normalize(verification_code)
+
+        if len(code) != cls.code_length:
+            return False
+
+        with transaction.atomic():
+            # The row is locked, so concurrent requests can't use one code twice.
+            recovery_codes = RecoveryCodes.objects.select_for_update().filter(user=user).first()
+
+            if recovery_codes is None:
+                return False
+
+            digest = cls._hash(code, salt=bytes(recovery_codes.salt))
+            hashes = bytes(recovery_codes.hashes)
+
+            for offset in range(0, len(hashes), cls._digest_size):
+                if hmac.compare_digest(hashes[offset:offset + cls._digest_size], digest):
+                    recovery_codes.hashes = hashes[:offset] + hashes[offset + cls._digest_size:]
+                    recovery_codes.save(update_fields=('hashes',))
+                    return True
+
+        return False
+
+    @classmethod
+    def _hash(cls, code: str, *, salt: bytes) -> bytes:
+        return hashlib.blake2b(code.encode(), digest_size=cls._digest_size, salt=salt).digest()
+
+    @staticmethod
+    def _normalize(verification_code: typing.Optional[str]) -> str:
+        code = (verification_code or '').replace('-', '').replace(' ', '').upper()
+        # Letters that are easy to mistake for digits.
+        return code.translate(str.maketrans('OIL', '011'))
@@ -1,13 +1,14 @@
+import dataclasses
 import typing
 
 from django.utils.translation import gettext_lazy as _
 
-from . import constants, utils
-from .auth_types import DirectTwoFactorAuthType
+from . import audit, constants, metrics, networks, tracing, utils
+from .auth_types import BaseTwoFactorAuthType
 from .dto import TwoFactorAuthObtainResult, TwoFactorAuthStatus, TwoFactorAuthVerifyResult, TwoFactorRequester
 from .errors import TwoFactorAuthError
 from .settings import app_settings
-from .throttling import RateThrottle, ThrottleStatus
+from .throttling import ExemptRateThrottle, RateThrottle, ThrottleMemo, ThrottleStatus, get_many_statuses
 
 
 __all__ = (
@@ -22,29 +23,74 @@ class TwoFactorAuth:
     _rate_throttle_for_obtain: RateThrottle
     _rate_throttle_for_verify: RateThrottle
     _user_auth_security: utils.UserAuthSecurity
+    _throttle_memo: ThrottleMemo
+    _ip_rule: typing.Optional[str]
 
     def __init__(self, requester: TwoFactorRequester) -> None:
         self.requester = requester
+        # `TwoFactorAuth` lives during one request, so each throttle key is read from the cache once.
+        self._throttle_memo = ThrottleMemo()
         self._user_auth_security = app_settings.USER_AUTH_SECURITY_CLASS(self.requester.username)
-        self._requester_ident = f'{requester.username}-{requester.ip}'
-        self._rate_throttle_for_auth = app_settings.RATE_THROTTLE_FOR_AUTH
+        self._requester_ident = utils.get_requester_ident(username=requester.username, ip=requester.ip)
+        self._ip_rule = utils.get_ip_rule(requester.ip)
+        self._rate_throttle_for_auth = self._get_rate_throttle(app_settings.RATE_THROTTLE_FOR_AUTH)
+        # Allowlisted networks are still limited in sending and guessing codes.
         self._rate_throttle_for_obtain = app_settings.RATE_THROTTLE_FOR_OBTAIN
         self._rate_throttle_for_verify = app_settings.RATE_THROTTLE_FOR_VERIFY
 
+    @classmethod
+    def bulk_status(cls,
+                    usernames: typing.Iterable[str],
+                    ips: typing.Iterable[str]) -> typing.Dict[typing.Tuple[str, str], typing.Dict[str, ThrottleStatus]]:
+        """
+        Read-only throttle statuses for every pair of `usernames` and `ips`,
+        e.g. `{('john', '127.0.0.1'): {'2fa-auth': ThrottleStatus(...), ...}}`.
+
+        Unlike `get_status()` it doesn't authenticate users, query the DB or write to the cache.
+        """
+        throttles = (
+            app_settings.RATE_THROTTLE_FOR_AUTH,
+            app_settings.RATE_THROTTLE_FOR_OBTAIN,
+            app_settings.RATE_THROTTLE_FOR_VERIFY,
+        )
+        ips = tuple(ips)
+        idents = {
+            utils.get_requester_ident(username=username, ip=ip): (username, ip)
+            for username in usernames
+            for ip in ips
+        }
+
+        statuses = get_many_statuses(
+            (throttle, ident)
+            for ident in idents
+            for throttle in throttles
+        )
+
+        result = {}
+
+        for (scope, ident), throttle_status in statuses.items():
+            result.setdefault(idents[ident], {})[scope] = throttle_status
+
+        return result
+
+    @tracing.traced('get_status')
     def get_status(self) -> TwoFactorAuthStatus:
         throttle_status = self._check_throttle_for_auth()
 
         return TwoFactorAuthStatus(
-            two_factor_type=self.requester.two_factor_auth_type,
+            two_factor_type=self._get_two_factor_auth_type(),
             throttle_status=throttle_status,
         )
 
+    @tracing.traced('obtain')
     def obtain(self) -> TwoFactorAuthObtainResult:
         self._check_throttle_for_auth()
 
-        throttle_status = self._rate_throttle_for_obtain.check(self._requester_ident)
+        with tracing.stage('throttle'):
+            throttle_status = self._rate_throttle_for_obtain.check(self._requester_ident, memo=self._throttle_memo)
 
         if not throttle_status.is_allowed:
+            self._audit('obtain', 'blocked', user=self.requester.user, scope=self._rate_throttle_for_obtain.scope)
             raise TwoFactorAuthError(
                 _('You have made a lot of requests. Try again in {waiting_time}.').format(
                     waiting_time=throttle_status.str_waiting_time,
@@ -52,65 +98,145 @@ class TwoFactorAuth:
                 throttle_status=throttle_status,
             )
 
+        auth_type = self._get_two_factor_auth_type()
+
         try:
-            result = self.requester.two_factor_auth_type.obtain(user=self.requester.user)
+            with tracing.stage('obtain_code'):
+                result = auth_type.obtain(user=self.requester.user)
         except TwoFactorAuthError as e:
             e.throttle_status = throttle_status
+            self._audit('obtain', 'failure', user=self.requester.user, auth_type=auth_type.type, reason=str(e.reason))
             raise
         else:
-            result.throttle_status = throttle_status
+            result = dataclasses.replace(result, throttle_status=throttle_status)
 
-        # Reset attempts for `verify()`.
-        self._rate_throttle_for_verify.reset(self._requester_ident)
+        self._audit('obtain', 'success', user=self.requester.user, auth_type=auth_type.type)
+
+        if auth_type.obtain_rotates_secret:
+            with tracing.stage('throttle'):
+                # Reset attempts for `verify()`.
+                self._rate_throttle_for_verify.reset(self._requester_ident, memo=self._throttle_memo)
 
         return result
 
+    @tracing.traced('verify')
     def verify(self, verification_code: typing.Optional[str] = None) -> TwoFactorAuthVerifyResult:
         self._check_throttle_for_auth()
 
-        throttle_status = self._rate_throttle_for_verify.check(self._requester_ident, increase_attempts=False)
-        auth_type = self.requester.two_factor_auth_type
+        with tracing.stage('throttle'):
+            throttle_status = self._rate_throttle_for_verify.check(
+                self._requester_ident,
+                increase_attempts=False,
+                memo=self._throttle_memo,
+            )
+
+        auth_type = self._get_two_factor_auth_type()
 
         if not throttle_status.is_allowed:
-            if issubclass(auth_type, DirectTwoFactorAuthType):
-                reason = None
-            else:
+            reason = auth_type.lockout_reason
+
+            if reason is not None:
                 auth_type.reset(user=self.requester.user)
-                reason = _('After many failed attempts we removed your code. You need to request a code again.')
 
+            metrics.verifications.inc(auth_type=auth_type.type, result='blocked')
+            self._audit('verify', 'blocked', user=self.requester.user, auth_type=auth_type.type)
             raise TwoFactorAuthError(throttle_status=throttle_status, reason=reason)
 
-        code_is_valid = auth_type.is_valid(user=self.requester.user, verification_code=verification_code)
+        with tracing.stage('verify_code'):
+            code_is_valid = auth_type.is_valid(user=self.requester.user, verification_code=verification_code)
 
         if not code_is_valid:
-            self._user_auth_security.add_failed_login_attempt(self.requester.ip)
-            throttle_status = self._rate_throttle_for_verify.increase_attempts(self._requester_ident)
+            metrics.verifications.inc(auth_type=auth_type.type, result='failure')
+
+            with tracing.stage('user_auth_security'):
+                self._user_auth_security.add_failed_login_attempt(self.requester.ip)
+
+            with tracing.stage('throttle'):
+                throttle_status = self._rate_throttle_for_verify.increase_attempts(
+                    self._requester_ident,
+                    memo=self._throttle_memo,
+                )
+
+            self._audit('verify', 'failure', user=self.requester.user, auth_type=auth_type.type)
+
+            if throttle_status.is_spent_all_attempts:
+                self._audit('lockout', 'locked', user=self.requester.user, scope=self._rate_throttle_for_verify.scope)
 
             raise TwoFactorAuthError(
                 _('Invalid verification code.'),
                 throttle_status=throttle_status,
             )
 
-        # Save user device
-        user_device_manager = utils.UserDeviceManager(self.requester.user)
-        user_device_manager.add_device(self.requester.device_id)
+        metrics.verifications.inc(auth_type=auth_type.type, result='success')
+        self._audit('verify', 'success', user=self.requester.user, auth_type=auth_type.type)
+
+        with tracing.stage('add_device'):
+            # Save user device
+            user_device_manager = utils.UserDeviceManager(self.requester.user)
+            user_device_manager.add_device(self.requester.device_id)
 
         return TwoFactorAuthVerifyResult(
             user=self.requester.user,
             throttle_status=throttle_status,
         )
 
+    def _audit(self, event: str, outcome: str, **kwargs: typing.Any) -> None:
+        audit.record(
+            event,
+            outcome,
+            username=self.requester.username,
+            ip=self.requester.ip,
+            device_id=self.requester.device_id,
+            **kwargs,
+        )
+
+    def _get_two_factor_auth_type(self) -> typing.Optional[typing.Type[BaseTwoFactorAuthType]]:
+        with tracing.stage('two_factor_type'):
+            return self.requester.two_factor_auth_type
+
+    def _get_rate_throttle(self, rate_throttle: RateThrottle) -> RateThrottle:
+        if self._ip_rule == networks.ALLOW:
+            return ExemptRateThrottle(rate_throttle)
+
+        return rate_throttle
+
     def _check_throttle_for_auth(self) -> ThrottleStatus:
-        throttle_status = self._rate_throttle_for_auth.check(self._requester_ident, increase_attempts=False)
+        if self._ip_rule == networks.DENY:
+            self._audit('authenticate', 'denied')
+            raise TwoFactorAuthError(constants.IP_DENIED_MSG)
+
+        with tracing.stage('throttle'):
+            throttle_status = self._rate_throttle_for_auth.check(
+                self._requester_ident,
+                increase_attempts=False,
+                memo=self._throttle_memo,
+            )
 
         if not throttle_status.is_allowed:
+            self._audit('authenticate', 'blocked', scope=self._rate_throttle_for_auth.scope)
             raise TwoFactorAuthError(throttle_status=throttle_status)
 
-        if not self.requester.user or not self.requester.user.is_active:
-            if not self.requester.user:
+        with tracing.stage('authenticate'):
+            user = self.requester.user
+
+        if not user or not user.is_active:
+            if not user:
                 # Increase attempts only for failed login.
-                self._user_auth_security.add_failed_login_attempt(self.requester.ip)
-                throttle_status = self._rate_throttle_for_auth.increase_attempts(self._requester_ident)
+                with tracing.stage('user_auth_security'):
+                    self._user_auth_security.add_failed_login_attempt(self.requester.ip)
+
+                with tracing.stage('throttle'):
+                    throttle_status = self._rate_throttle_for_auth.increase_attempts(
+                        self._requester_ident,
+                        memo=self._throttle_memo,
+                    )
+
+                self._audit('authenticate', 'failure')
+
+                if throttle_status.is_spent_all_attempts:
+                    self._audit('lockout', 'locked', scope=self._rate_throttle_for_auth.scope)
+            else:
+                self._audit('authenticate', 'inactive', user=user)
 
             error_msg = constants.ACCOUNT_ERROR_MSG
 
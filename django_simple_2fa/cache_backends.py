@@ -0,0 +1,381 @@
+"""
+Shared-memory cache backend for single-host deployments without Redis.
+
+All processes that use the same `LOCATION` share one fixed-size hash table
+in a memory-mapped file (e.g. in `/dev/shm`), so a throttle is shared by all
+workers of the host. The table is split into stripes with their own locks
+(`fcntl` locks between processes and thread locks inside of a process).
+
+Usage:
+
+    CACHES = {
+        ...
+        'throttling': {
+            'BACKEND': 'django_simple_2fa.cache_backends.SharedMemoryCache',
+            'LOCATION': '/dev/shm/django-simple-2fa',
+            'OPTIONS': {
+                'CAPACITY': 65536,
+            },
+        },
+    }
+
+    DJANGO_SIMPLE_2FA = {
+        ...
+        'THROTTLE_CACHE_ALIAS': 'throttling',
+    }
+
+Unexpired entries are never evicted, because an evicted throttle history would unlock its identity.
+When all slots of a key's stripe (`CAPACITY / STRIPES`) hold unexpired entries, `set()` of a new key
+is refused with an error in the log, and `add()` returns `False`. Size `CAPACITY` for the peak number of keys
+alive at once with headroom for uneven stripes, e.g. twice the failing identities per throttle duration
+times the throttle scopes (3 by default, plus one `user-auth-security` key per username for 2 hours).
+"""
+import contextlib
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import typing
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+__all__ = (
+    'SharedMemoryCache',
+)
+
+_HEADER = struct.Struct('<8sIIII')
+_HEADER_SIZE = 64
+_MAGIC = b'DS2FASHM'
+
+# state, expires_at (0 - never), key length, value length
+_SLOT_HEADER = struct.Struct('<BdHH')
+
+logger = logging.getLogger(__name__)
+
+_EMPTY = 0
+_USED = 1
+_DELETED = 2
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+class _SharedTable:
+    def __init__(self, path: str, *, capacity: int, stripes: int, key_size: int, value_size: int) -> None:
+        if capacity % stripes:
+            raise ImproperlyConfigured('CAPACITY must be a multiple of STRIPES.')
+
+        self.capacity = capacity
+        self.stripes = stripes
+        self.stripe_size = capacity // stripes
+        self.key_size = key_size
+        self.value_size = value_size
+        self.slot_size = _SLOT_HEADER.size + key_size + value_size
+        self.size = _HEADER_SIZE + capacity * self.slot_size
+        self.thread_locks = [threading.Lock() for _ in range(stripes)]
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        # The whole header is locked while the file is initialized.
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+
+        try:
+            header = (_MAGIC, 1, capacity, key_size, value_size)
+
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, self.size)
+                os.pwrite(self.fd, _HEADER.pack(*header), 0)
+            elif _HEADER.unpack(os.pread(self.fd, _HEADER.size, 0)) != header:
+                raise ImproperlyConfigured(f'{path} was created with other options of SharedMemoryCache.')
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+
+        self.buffer = mmap.mmap(self.fd, self.size)
+
+    @contextlib.contextmanager
+    def lock(self, stripe: int) -> typing.Iterator[None]:
+        with self.thread_locks[stripe]:
+            # Stripe locks are byte-range locks past the end of the table (`fcntl` can lock beyond EOF).
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.size + stripe)
+
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.size + stripe)
+
+    def get_stripe_and_slots(self, key: bytes) -> typing.Tuple[int, '_Slots']:
+        key_hash = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+        stripe = key_hash % self.stripes
+        start = (key_hash // self.stripes) % self.stripe_size
+
+        return stripe, _Slots(stripe * self.stripe_size, self.stripe_size, start)
+
+    def read_slot(self, slot: int) -> typing.Tuple[int, float, int, int]:
+        return _SLOT_HEADER.unpack_from(self.buffer, self.get_offset(slot))
+
+    def read_key(self, slot: int, key_length: int) -> bytes:
+        offset = self.get_offset(slot) + _SLOT_HEADER.size
+        return self.buffer[offset:offset + key_length]
+
+    def read_value(self, slot: int, value_length: int) -> bytes:
+        offset = self.get_offset(slot) + _SLOT_HEADER.size + self.key_size
+        return self.buffer[offset:offset + value_length]
+
+    def write_slot(self, slot: int, key: bytes, value: bytes, expires_at: float) -> None:
+        offset = self.get_offset(slot)
+        key_offset = offset + _SLOT_HEADER.size
+        value_offset = key_offset + self.key_size
+
+        self.buffer[key_offset:key_offset + len(key)] = key
+        self.buffer[value_offset:value_offset + len(value)] = value
+        _SLOT_HEADER.pack_into(self.buffer, offset, _USED, expires_at, len(key), len(value))
+
+    def write_state(self, slot: int, state: int) -> None:
+        self.buffer[self.get_offset(slot)] = state
+
+    def get_offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.slot_size
+
+
+class _Slots:
+    """
+    Linear probing sequence of a key inside of its stripe.
+    """
+    __slots__ = ('first_slot', 'size', 'start')
+
+    def __init__(self, first_slot: int, size: int, start: int) -> None:
+        self.first_slot = first_slot
+        self.size = size
+        self.start = start
+
+    def __iter__(self) -> typing.Iterator[int]:
+        for i in range(self.size):
+            yield self.first_slot + (self.start + i) % self.size
+
+    def next(self, slot: int) -> int:
+        return self.first_slot + (slot - self.first_slot + 1) % self.size
+
+    def previous(self, slot: int) -> int:
+        return self.first_slot + (slot - self.first_slot - 1) % self.size
+
+
+class SharedMemoryCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location: str, params: dict) -> None:
+        super().__init__(params)
+
+        options = params.get('OPTIONS', {})
+        table_options = {
+            'capacity': options.get('CAPACITY', 65536),
+            'stripes': options.get('STRIPES', 64),
+            'key_size': options.get('MAX_KEY_SIZE', 128),
+            'value_size': options.get('MAX_VALUE_SIZE', 256),
+        }
+
+        with _tables_lock:
+            if location not in _tables:
+                _tables[location] = _SharedTable(location, **table_options)
+
+        self._table = _tables[location]
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, value = self._encode(key, value, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            if self._find(key, slots) is not None:
+                return False
+
+            return self._set(key, value, slots, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self._encode_key(key, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            slot = self._find(key, slots)
+
+            if slot is None:
+                return default
+
+            value = self._table.read_value(slot, self._table.read_slot(slot)[3])
+
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, value = self._encode(key, value, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            self._set(key, value, slots, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._encode_key(key, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            slot = self._find(key, slots)
+
+            if slot is None:
+                return False
+
+            _, _, key_length, value_length = self._table.read_slot(slot)
+            value = self._table.read_value(slot, value_length)
+            self._table.write_slot(slot, key, value, self._get_expires_at(timeout))
+            return True
+
+    def delete(self, key, version=None):
+        key = self._encode_key(key, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            slot = self._find(key, slots)
+
+            if slot is None:
+                return False
+
+            self._delete_slot(slot, slots)
+            return True
+
+    def has_key(self, key, version=None):
+        key = self._encode_key(key, version=version)
+        stripe, slots = self._table.get_stripe_and_slots(key)
+
+        with self._table.lock(stripe):
+            return self._find(key, slots) is not None
+
+    def clear(self):
+        for stripe in range(self._table.stripes):
+            with self._table.lock(stripe):
+                first_slot = stripe * self._table.stripe_size
+
+                for slot in range(first_slot, first_slot + self._table.stripe_size):
+                    self._table.write_state(slot, _EMPTY)
+
+    def iter_entries(self) -> typing.Iterator[typing.Tuple[str, int, float]]:
+        """
+        `(made key, size, expires_at)` of used slots (`expires_at` is `0` for no expiration, expired slots included).
+        Only one stripe is locked at a time.
+        """
+        for stripe in range(self._table.stripes):
+            first_slot = stripe * self._table.stripe_size
+            entries = []
+
+            with self._table.lock(stripe):
+                for slot in range(first_slot, first_slot + self._table.stripe_size):
+                    state, expires_at, key_length, value_length = self._table.read_slot(slot)
+
+                    if state == _USED:
+                        key = self._table.read_key(slot, key_length).decode()
+                        entries.append((key, key_length + value_length, expires_at))
+
+            yield from entries
+
+    def _find(self, key: bytes, slots: _Slots) -> typing.Optional[int]:
+        now = time.time()
+
+        for slot in slots:
+            state, expires_at, key_length, _ = self._table.read_slot(slot)
+
+            if state == _EMPTY:
+                return None
+
+            if state == _DELETED:
+                continue
+
+            if expires_at and expires_at <= now:
+                self._delete_slot(slot, slots)
+                continue
+
+            if key_length == len(key) and self._table.read_key(slot, key_length) == key:
+                return slot
+
+        return None
+
+    def _set(self, key: bytes, value: bytes, slots: _Slots, timeout) -> bool:
+        expires_at = self._get_expires_at(timeout)
+
+        if expires_at < 0:
+            # `timeout=0` expires the key immediately.
+            slot = self._find(key, slots)
+
+            if slot is not None:
+                self._delete_slot(slot, slots)
+
+            return True
+
+        now = time.time()
+        free_slot = None
+
+        for slot in slots:
+            state, slot_expires_at, key_length, _ = self._table.read_slot(slot)
+
+            if state == _EMPTY:
+                free_slot = slot if free_slot is None else free_slot
+                break
+
+            if state == _DELETED or (slot_expires_at and slot_expires_at <= now):
+                free_slot = slot if free_slot is None else free_slot
+                continue
+
+            if key_length == len(key) and self._table.read_key(slot, key_length) == key:
+                self._table.write_slot(slot, key, value, expires_at)
+                return True
+
+        if free_slot is None:
+            logger.error('SharedMemoryCache stripe is full, "%s" is not saved. Increase CAPACITY.', key.decode())
+            return False
+
+        self._table.write_slot(free_slot, key, value, expires_at)
+        return True
+
+    def _delete_slot(self, slot: int, slots: _Slots) -> None:
+        if self._table.read_slot(slots.next(slot))[0] != _EMPTY:
+            self._table.write_state(slot, _DELETED)
+            return
+
+        # Nothing is probed after this slot, so it and the deleted slots before it become empty.
+        self._table.write_state(slot, _EMPTY)
+        previous_slot = slots.previous(slot)
+
+        for _ in range(slots.size - 1):
+            if self._table.read_slot(previous_slot)[0] != _DELETED:
+                break
+
+            self._table.write_state(previous_slot, _EMPTY)
+            previous_slot = slots.previous(previous_slot)
+
+    def _get_expires_at(self, timeout) -> float:
+        timeout = self.get_backend_timeout(timeout)
+
+        if timeout is None:
+            return 0.0
+
+        if timeout <= time.time():
+            return -1.0
+
+        return timeout
+
+    def _encode(self, key, value, *, version=None) -> typing.Tuple[bytes, bytes]:
+        value = pickle.dumps(value, self.pickle_protocol)
+
+        if len(value) > self._table.value_size:
+            raise ValueError(f'Cache value is larger than MAX_VALUE_SIZE ({self._table.value_size} bytes).')
+
+        return self._encode_key(key, version=version), value
+
+    def _encode_key(self, key, *, version=None) -> bytes:
+        key = self.make_and_validate_key(key, version=version).encode()
+
+        if len(key) > self._table.key_size:
+            raise ValueError(f'Cache key is longer than MAX_KEY_SIZE ({self._table.key_size} bytes).')
+
+        return key
@@ -0,0 +1,483 @@
+"""
+Cache access of the package.
+
+`cache` (the default cache) and `throttle_cache` (`THROTTLE_CACHE_ALIAS`) proxy to Django caches.
+With `CACHE_CIRCUIT_BREAKER` they also get latency budgets and a circuit breaker:
+failed or slow operations open the breaker, and while it is open
+the package works with a bounded in-process store instead of the cache backend.
+Entries written there during an outage are pushed back to the cache on the next read,
+so lockouts are not lost when the backend recovers.
+
+`throttle_cache` fails closed: it also keeps the last values read from the backend,
+and while the breaker is open, reads of other keys return `UNKNOWN`, which throttles treat as a lockout.
+So identities locked before an outage stay locked during it.
+
+Every operation can be recorded with `record_cache_ops()`, e.g. to check cache budgets of login flows in tests
+(see `django_simple_2fa.testing.CacheOpsTestMixin`).
+"""
+import contextlib
+import contextvars
+import logging
+import pickle
+import threading
+import time
+import typing
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import setting_changed
+
+from .settings import app_settings
+
+
+__all__ = (
+    'CacheOps',
+    'CircuitBreaker',
+    'LocalStore',
+    'ResilientCache',
+    'UNKNOWN',
+    'cache',
+    'record_cache_ops',
+    'throttle_cache',
+)
+
+logger = logging.getLogger(__name__)
+
+# Value of a key that can't be read from a fail-closed cache.
+UNKNOWN = object()
+
+_MISSING = object()
+
+_breakers = {}
+_local_stores = {}
+_seen_stores = {}
+_lock = threading.Lock()
+_recorders = contextvars.ContextVar('django_simple_2fa_cache_ops', default=())
+
+
+class CacheOps:
+    """
+    Cache operations recorded by `record_cache_ops()`.
+
+    `counts` maps operations (`get`, `get_many`, `set`, `delete`) to the number of calls,
+    `keys` lists `(cache name, operation, key)` for every key touched,
+    and `bytes_written` is the pickled size of all written values.
+    """
+    counts: typing.Counter[str]
+    keys: typing.List[typing.Tuple[str, str, str]]
+    bytes_written: int
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+        self.keys = []
+        self.bytes_written = 0
+
+    def __repr__(self) -> str:
+        return (
+            f'<CacheOps gets={self.gets} sets={self.sets} deletes={self.deletes} '
+            f'keys={len(self.keys)} bytes_written={self.bytes_written}>'
+        )
+
+    @property
+    def gets(self) -> int:
+        return self.counts['get'] + self.counts['get_many']
+
+    @property
+    def sets(self) -> int:
+        return self.counts['set']
+
+    @property
+    def deletes(self) -> int:
+        return self.counts['delete']
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, cache_name: str, operation: str, keys: typing.Iterable[str], values: typing.Iterable = ()) -> None:
+        self.counts[operation] += 1
+        self.keys.extend((cache_name, operation, key) for key in keys)
+        self.bytes_written += sum(len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) for value in values)
+
+
+@contextlib.contextmanager
+def record_cache_ops() -> typing.Iterator[CacheOps]:
+    """
+    Record operations of `cache` and `throttle_cache` made in this context (thread or task).
+    Contexts can be nested, each of them gets all operations made inside it.
+
+    Direct client calls (e.g. of `RedisLockoutRegistry`) aren't recorded.
+    """
+    cache_ops = CacheOps()
+    token = _recorders.set((*_recorders.get(), cache_ops))
+
+    try:
+        yield cache_ops
+    finally:
+        _recorders.reset(token)
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    failure_threshold: int
+    reset_timeout: float
+    latency_budget: float
+    latency_budgets: typing.Dict[str, float]
+
+    def __init__(self, *,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30,
+                 latency_budget: float = 0.1,
+                 latency_budgets: typing.Optional[typing.Dict[str, float]] = None) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_budget = latency_budget
+        self.latency_budgets = latency_budgets or {}
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Only one trial request is allowed until it succeeds or fails.
+                self._state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def get_latency_budget(self, operation: str) -> float:
+        return self.latency_budgets.get(operation, self.latency_budget)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning('Cache circuit breaker is open.')
+
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class LocalStore:
+    """
+    Bounded in-process store with expiration (LRU eviction).
+    """
+    max_entries: int
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self._data)
+
+    def get(self, key: str) -> typing.Tuple[bool, typing.Any, typing.Optional[float]]:
+        """
+        Return `(found, value, expires_at)`.
+        """
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is None:
+                return False, None, None
+
+            pickled, expires_at = item
+
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return False, None, None
+
+            self._data.move_to_end(key)
+
+        return True, pickle.loads(pickled), expires_at
+
+    def set(self, key: str, value: typing.Any, expires_at: typing.Optional[float]) -> None:
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        with self._lock:
+            self._data[key] = (pickled, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class ResilientCache:
+    """
+    Proxy to a Django cache with an optional circuit breaker (see the module docstring).
+    Methods that aren't wrapped are passed to the cache backend as is.
+
+    With `fail_closed`, reads that can't reach the backend return the last value read from or written to it,
+    or `UNKNOWN` for keys that weren't seen.
+    """
+    name: str
+    fail_closed: bool
+
+    def __init__(self, get_backend: typing.Callable[[], BaseCache], *, name: str, fail_closed: bool = False) -> None:
+        self._get_backend = get_backend
+        self.name = name
+        self.fail_closed = fail_closed
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self._get_backend(), name)
+
+    @property
+    def backend(self) -> BaseCache:
+        return self._get_backend()
+
+    @property
+    def breaker(self) -> typing.Optional[CircuitBreaker]:
+        return _get_breaker(self.name)
+
+    @property
+    def local_store(self) -> LocalStore:
+        return _get_local_store(self.name, _local_stores)
+
+    @property
+    def seen_store(self) -> LocalStore:
+        """
+        Last known values of keys of a fail-closed cache: `(True, value)`, or `(False, None)` for missing keys.
+        """
+        return _get_local_store(self.name, _seen_stores)
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        self._record('get', (key,))
+
+        if self.breaker is None:
+            return self.backend.get(key, default)
+
+        found, value = self._get_local(key)
+
+        if found:
+            return value
+
+        is_ok, value = self._call('get', key, _MISSING)
+
+        if not is_ok:
+            return self._get_unavailable(key, default)
+
+        self._remember(key, value)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Any]:
+        if _recorders.get():
+            keys = list(keys)
+            self._record('get_many', keys)
+
+        if self.breaker is None:
+            return self.backend.get_many(keys)
+
+        result = {}
+        remote_keys = []
+
+        for key in keys:
+            found, value = self._get_local(key)
+
+            if found:
+                result[key] = value
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            is_ok, values = self._call('get_many', remote_keys)
+
+            if is_ok:
+                result.update(values)
+
+                for key in remote_keys:
+                    self._remember(key, values.get(key, _MISSING))
+            else:
+                for key in remote_keys:
+                    value = self._get_unavailable(key, _MISSING)
+
+                    if value is not _MISSING:
+                        result[key] = value
+
+        return result
+
+    def set(self, key: str, value: typing.Any, timeout: typing.Any = DEFAULT_TIMEOUT) -> None:
+        self._record('set', (key,), (value,))
+
+        if self.breaker is None:
+            return self.backend.set(key, value, timeout)
+
+        is_ok, _ = self._call('set', key, value, timeout)
+
+        if is_ok:
+            self.local_store.delete(key)
+            self._remember(key, value)
+        else:
+            self.local_store.set(key, value, self._get_expires_at(timeout))
+
+    def delete(self, key: str) -> bool:
+        self._record('delete', (key,))
+
+        if self.breaker is None:
+            return self.backend.delete(key)
+
+        deleted_locally = self.local_store.delete(key)
+        is_ok, deleted = self._call('delete', key)
+
+        if is_ok:
+            self._remember(key, _MISSING)
+
+        return bool(is_ok and deleted) or deleted_locally
+
+    def _record(self, operation: str, keys: typing.Iterable[str], values: typing.Iterable = ()) -> None:
+        for cache_ops in _recorders.get():
+            cache_ops.add(self.name, operation, keys, values)
+
+    def _get_local(self, key: str) -> typing.Tuple[bool, typing.Any]:
+        local_store = self.local_store
+
+        if not local_store:
+            return False, None
+
+        found, value, expires_at = local_store.get(key)
+
+        if not found:
+            return False, None
+
+        if self.breaker.state != CircuitBreaker.OPEN:
+            # The backend is back: push the value written during the outage and forget it.
+            timeout = None if expires_at is None else max(expires_at - time.time(), 1)
+            is_ok, _ = self._call('set', key, value, timeout)
+
+            if is_ok:
+                local_store.delete(key)
+
+        return True, value
+
+    def _get_expires_at(self, timeout: typing.Any) -> typing.Optional[float]:
+        """
+        Absolute expiration time for `LocalStore`. `get_backend_timeout()` isn't used,
+        because some backends (e.g. Redis and Memcached) return relative seconds there.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.backend.default_timeout
+
+        return None if timeout is None else time.time() + timeout
+
+    def _remember(self, key: str, value: typing.Any) -> None:
+        if self.fail_closed:
+            self.seen_store.set(key, (True, value) if value is not _MISSING else (False, None), None)
+
+    def _get_unavailable(self, key: str, default: typing.Any) -> typing.Any:
+        """
+        Value of a key that can't be read from the backend.
+        """
+        if not self.fail_closed:
+            return default
+
+        found, item, _ = self.seen_store.get(key)
+
+        if not found:
+            return UNKNOWN
+
+        is_set, value = item
+        return value if is_set else default
+
+    def _call(self, operation: str, *args: typing.Any) -> typing.Tuple[bool, typing.Any]:
+        """
+        Return `(is_ok, result)`, `is_ok` is `False` if the breaker is open or the operation failed.
+        """
+        breaker = self.breaker
+
+        if not breaker.allow_request():
+            return False, None
+
+        started_at = time.perf_counter()
+
+        try:
+            result = getattr(self.backend, operation)(*args)
+        except Exception as e:
+            logger.warning('Cache operation "%s" failed: %r', operation, e)
+            breaker.record_failure()
+            return False, None
+
+        if time.perf_counter() - started_at > breaker.get_latency_budget(operation):
+            # The result is used, but slow operations open the breaker as well as failed ones.
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        return True, result
+
+
+def _get_breaker(name: str) -> typing.Optional[CircuitBreaker]:
+    options = app_settings.CACHE_CIRCUIT_BREAKER
+
+    if options is None:
+        return None
+
+    breaker = _breakers.get(name)
+
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(
+                failure_threshold=options.get('FAILURE_THRESHOLD', 5),
+                reset_timeout=options.get('RESET_TIMEOUT', 30),
+                latency_budget=options.get('LATENCY_BUDGET', 0.1),
+                latency_budgets=options.get('LATENCY_BUDGETS'),
+            ))
+
+    return breaker
+
+
+def _get_local_store(name: str, stores: typing.Dict[str, LocalStore]) -> LocalStore:
+    local_store = stores.get(name)
+
+    if local_store is None:
+        options = app_settings.CACHE_CIRCUIT_BREAKER or {}
+
+        with _lock:
+            local_store = stores.setdefault(name, LocalStore(options.get('LOCAL_MAX_ENTRIES', 10_000)))
+
+    return local_store
+
+
+def _reset_breakers(*args, **kwargs) -> None:
+    if kwargs['setting'] in ('DJANGO_SIMPLE_2FA', 'CACHES'):
+        _breakers.clear()
+        _local_stores.clear()
+        _seen_stores.clear()
+
+
+setting_changed.connect(_reset_breakers)
+
+cache = ResilientCache(lambda: caches['default'], name='default')
+throttle_cache = ResilientCache(lambda: caches[app_settings.THROTTLE_CACHE_ALIAS], name='throttle', fail_closed=True)
@@ -0,0 +1,93 @@
+"""
+Clock of the package: throttles, lockouts and devices read the time through `now()`.
+
+Tests and simulations replace it with `VirtualClock`:
+
+    with use_clock(VirtualClock(start=time.time())) as virtual_clock:
+        ...
+        virtual_clock.advance(300)
+
+A single throttle can also get its own clock with `rate_throttle.timer = virtual_clock.time`.
+"""
+import contextlib
+import datetime
+import time
+import typing
+
+
+__all__ = (
+    'SystemClock',
+    'VirtualClock',
+    'get_clock',
+    'now',
+    'to_datetime',
+    'use_clock',
+)
+
+
+class SystemClock:
+    @staticmethod
+    def time() -> float:
+        return time.time()
+
+
+class VirtualClock:
+    """
+    Clock that moves only when it is told to.
+    """
+    _now: float
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._now = start
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        self._now += seconds
+
+    def set(self, timestamp: float) -> None:
+        self._now = timestamp
+
+
+Clock = typing.Union[SystemClock, VirtualClock]
+
+_clock: Clock = SystemClock()
+
+
+def now() -> float:
+    """
+    Current UNIX timestamp of the active clock.
+    """
+    return _clock.time()
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+@contextlib.contextmanager
+def use_clock(clock: Clock) -> typing.Iterator[Clock]:
+    """
+    Replace the clock of the whole process (all threads) until the end of the block.
+    """
+    global _clock
+
+    previous_clock = _clock
+    _clock = clock
+
+    try:
+        yield clock
+    finally:
+        _clock = previous_clock
+
+
+def to_datetime(timestamp: float) -> datetime.datetime:
+    """
+    Datetime for model fields: aware in UTC with `USE_TZ`, naive in the current time zone otherwise.
+    """
+    from django.conf import settings
+    from django.utils import timezone
+
+    value = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    return value if settings.USE_TZ else timezone.make_naive(value)
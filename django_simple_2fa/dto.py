@@ -20,23 +20,28 @@ __all__ = (
 )
 
 
-@dataclass
+# Results are immutable, use `dataclasses.replace()` to change them.
+@dataclass(frozen=True, slots=True)
 class TwoFactorAuthObtainResult:
     message: str
     verification_code: str
     throttle_status: typing.Optional[ThrottleStatus] = None
+    # Seconds per stage with `TRACING_ATTACH_TIMINGS`, see `tracing.Trace.timings`.
+    timings: typing.Optional[typing.Dict[str, float]] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TwoFactorAuthStatus:
     two_factor_type: typing.Type['BaseTwoFactorAuthType']
     throttle_status: ThrottleStatus
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TwoFactorAuthVerifyResult:
     user: 'UserModel'
     throttle_status: ThrottleStatus
+    # Seconds per stage with `TRACING_ATTACH_TIMINGS`, see `tracing.Trace.timings`.
+    timings: typing.Optional[typing.Dict[str, float]] = None
 
 
 @dataclass
@@ -13,18 +13,26 @@ __all__ = (
 
 class TwoFactorAuthError(Exception):
     throttle_status: typing.Optional[ThrottleStatus] = None
-    reason: str
 
     def __init__(self,
                  reason: typing.Optional[str] = None, *,
                  throttle_status: typing.Optional[ThrottleStatus] = None) -> None:
         self.throttle_status = throttle_status
-        self.reason = reason
-
-        if throttle_status and not throttle_status.is_allowed and not self.reason:
-            self.reason = constants.ACCOUNT_LOCKED_MSG.format(
-                waiting_time=throttle_status.str_waiting_time,
+        self._reason = reason
+
+    @property
+    def reason(self) -> typing.Optional[str]:
+        # The lockout message is formatted only when somebody reads it.
+        if not self._reason and self.throttle_status and not self.throttle_status.is_allowed:
+            self._reason = constants.ACCOUNT_LOCKED_MSG.format(
+                waiting_time=self.throttle_status.str_waiting_time,
             )
 
+        return self._reason
+
+    @reason.setter
+    def reason(self, reason: typing.Optional[str]) -> None:
+        self._reason = reason
+
     def __str__(self) -> str:
         return self.reason
@@ -0,0 +1,150 @@
+import contextlib
+import contextvars
+import time
+import typing
+from collections import Counter
+
+from django.core.signals import setting_changed
+
+from .settings import app_settings
+
+
+__all__ = (
+    'FeatureFlag',
+    'evaluation_scope',
+    'get_flag_stats',
+    'invalidate_flags',
+    'is_enabled',
+    'reset_flag_stats',
+    'throttling_is_enabled',
+)
+
+_scope: contextvars.ContextVar[typing.Optional[dict]] = contextvars.ContextVar('django_simple_2fa_flags', default=None)
+_stats = Counter()
+
+
+class FeatureFlag:
+    """
+    Evaluates a callable from settings (e.g. `IS_ENABLED`).
+
+    A result is memoized inside of `evaluation_scope()` (e.g. one request)
+    and cached in-process for `FEATURE_FLAGS_TTL` seconds.
+    The cache entry is bound to the callable, so replacing it in settings invalidates the entry.
+    """
+    setting_name: str
+    _cached: typing.Optional[typing.Tuple[typing.Callable, bool, float]]
+
+    def __init__(self, setting_name: str) -> None:
+        self.setting_name = setting_name
+        self._cached = None
+
+    def __call__(self) -> bool:
+        _stats[f'{self.setting_name}.calls'] += 1
+
+        func = getattr(app_settings, self.setting_name)
+        scope = _scope.get()
+
+        if scope is not None and scope.get(self.setting_name, (None,))[0] is func:
+            _stats[f'{self.setting_name}.scope_hits'] += 1
+            return scope[self.setting_name][1]
+
+        value = self._get_cached_value(func)
+
+        if value is None:
+            _stats[f'{self.setting_name}.evaluations'] += 1
+            value = bool(func())
+            self._set_cached_value(func, value)
+        else:
+            _stats[f'{self.setting_name}.ttl_hits'] += 1
+
+        if scope is not None:
+            scope[self.setting_name] = (func, value)
+
+        return value
+
+    def invalidate(self) -> None:
+        self._cached = None
+
+    @contextlib.contextmanager
+    def override(self, value: bool) -> typing.Iterator[None]:
+        """
+        Force the flag to `value` until the end of the block in the current context, e.g. in simulations.
+        """
+        with evaluation_scope():
+            scope = _scope.get()
+            previous = scope.get(self.setting_name)
+            scope[self.setting_name] = (getattr(app_settings, self.setting_name), value)
+
+            try:
+                yield
+            finally:
+                if previous is None:
+                    scope.pop(self.setting_name, None)
+                else:
+                    scope[self.setting_name] = previous
+
+    def _get_cached_value(self, func: typing.Callable) -> typing.Optional[bool]:
+        cached = self._cached
+
+        if cached is None:
+            return None
+
+        cached_func, value, expires_at = cached
+
+        if cached_func is not func or time.monotonic() >= expires_at:
+            return None
+
+        return value
+
+    def _set_cached_value(self, func: typing.Callable, value: bool) -> None:
+        ttl = app_settings.FEATURE_FLAGS_TTL
+
+        if ttl:
+            self._cached = (func, value, time.monotonic() + ttl)
+
+
+is_enabled = FeatureFlag('IS_ENABLED')
+throttling_is_enabled = FeatureFlag('THROTTLING_IS_ENABLED')
+
+
+@contextlib.contextmanager
+def evaluation_scope() -> typing.Iterator[None]:
+    """
+    Memoize flags until the end of the block, e.g. during one request.
+    Nested scopes share the outer one.
+    """
+    if _scope.get() is not None:
+        yield
+        return
+
+    token = _scope.set({})
+
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def invalidate_flags() -> None:
+    is_enabled.invalidate()
+    throttling_is_enabled.invalidate()
+
+
+def get_flag_stats() -> typing.Dict[str, int]:
+    """
+    Counters per flag: `calls`, `evaluations` (the callable was invoked),
+    `scope_hits` and `ttl_hits`.
+    """
+    return dict(_stats)
+
+
+def reset_flag_stats() -> None:
+    _stats.clear()
+
+
+def _invalidate_flags_on_setting_changed(*args, **kwargs) -> None:
+    if kwargs['setting'] == 'DJANGO_SIMPLE_2FA':
+        invalidate_flags()
+
+
+setting_changed.connect(_invalidate_flags_on_setting_changed)
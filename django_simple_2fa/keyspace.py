@@ -0,0 +1,229 @@
+"""
+Scanning of the cache keys of the package, used by the `two_factor_cache` management command.
+
+Keys are streamed in batches, so the keyspace is never loaded at once:
+
+- Redis (`django.core.cache.backends.redis.RedisCache`) is scanned with incremental `SCAN`,
+  sizes and TTLs are read with one pipeline per batch;
+- `SharedMemoryCache` is scanned stripe by stripe;
+- `LocMemCache` (bounded by `MAX_ENTRIES`) is scanned from a snapshot of its keys.
+
+Other backends (e.g. Memcached) can't list their keys. Keys are expected to be made by the default `KEY_FUNCTION`.
+Values are read and written through the Django cache API.
+"""
+import math
+import time
+import typing
+from dataclasses import dataclass
+
+from .caching import ResilientCache, cache, throttle_cache
+
+
+if typing.TYPE_CHECKING:
+    from django.core.cache.backends.base import BaseCache
+
+__all__ = (
+    'KEY_FAMILIES',
+    'BaseKeyspaceScanner',
+    'KeyFamily',
+    'KeyInfo',
+    'LocMemKeyspaceScanner',
+    'RedisKeyspaceScanner',
+    'SharedMemoryKeyspaceScanner',
+    'compact_value',
+    'get_scanner',
+)
+
+
+@dataclass
+class KeyFamily:
+    name: str
+    prefix: str
+    cache: ResilientCache
+    # Position of the user ID in `key.split(':')`, for families that are orphaned by deleted users.
+    user_id_index: typing.Optional[int] = None
+    # Throttle keys are reported by their scope (the last part of the key).
+    by_scope: bool = False
+
+    def get_scope(self, key: str) -> str:
+        if self.by_scope:
+            return f'{self.name}:{key.rsplit(":", 1)[-1]}'
+
+        return self.name
+
+    def get_user_id(self, key: str) -> typing.Optional[str]:
+        if self.user_id_index is None:
+            return None
+
+        parts = key.split(':')
+        return parts[self.user_id_index] if len(parts) > self.user_id_index else None
+
+
+KEY_FAMILIES = (
+    # `RateThrottle.cache_format`
+    KeyFamily('rate-throttle', 'rate-throttle:', throttle_cache, by_scope=True),
+    # `CacheLockoutRegistry.cache_key`
+    KeyFamily('lockouts', 'rate-throttle-lockouts', cache),
+    # `EmailTwoFactorAuthType._get_cache_key()`
+    KeyFamily('email-codes', '2fa:email:', cache, user_id_index=2),
+    # `UserDeviceManager._cache_key_tpl`
+    KeyFamily('devices', 'used-device:', cache, user_id_index=1),
+    # `utils._two_factor_type_cache_key_tpl`
+    KeyFamily('two-factor-types', '2fa-type:', cache, user_id_index=1),
+    # `UserDeviceManager.notify_about_login_attempts()`
+    KeyFamily('notifications', 'notification-about-login-attempts:', cache, user_id_index=1),
+)
+
+
+@dataclass
+class KeyInfo:
+    # The key as the package passes it to the cache (without the prefix and version of the backend).
+    key: str
+    # Bytes taken by the key and its value, as reported by the backend.
+    size: int
+    # `None` for keys without expiration.
+    expires_at: typing.Optional[float]
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+class BaseKeyspaceScanner:
+    backend: 'BaseCache'
+
+    def __init__(self, backend: 'BaseCache') -> None:
+        self.backend = backend
+        self._made_prefix = backend.make_key('')
+
+    def scan(self, prefix: str, *, batch_size: int) -> typing.Iterator[typing.List[KeyInfo]]:
+        """
+        Batches of up to `batch_size` keys that start with `prefix`.
+        """
+        batch = []
+
+        for info in self._iter_keys(prefix, batch_size=batch_size):
+            batch.append(info)
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _iter_keys(self, prefix: str, *, batch_size: int) -> typing.Iterator[KeyInfo]:
+        raise NotImplementedError
+
+    def _unmake_key(self, made_key: str) -> typing.Optional[str]:
+        if not made_key.startswith(self._made_prefix):
+            return None
+
+        return made_key[len(self._made_prefix):]
+
+
+class RedisKeyspaceScanner(BaseKeyspaceScanner):
+    def _iter_keys(self, prefix: str, *, batch_size: int) -> typing.Iterator[KeyInfo]:
+        client = self.backend._cache.get_client()
+        pattern = _escape_glob(self.backend.make_key(prefix)) + '*'
+        made_keys = []
+
+        for made_key in client.scan_iter(match=pattern, count=batch_size):
+            made_keys.append(made_key)
+
+            if len(made_keys) >= batch_size:
+                yield from self._get_infos(client, made_keys)
+                made_keys = []
+
+        if made_keys:
+            yield from self._get_infos(client, made_keys)
+
+    def _get_infos(self, client: typing.Any, made_keys: typing.List[bytes]) -> typing.Iterator[KeyInfo]:
+        pipeline = client.pipeline(transaction=False)
+
+        for made_key in made_keys:
+            # `MEMORY USAGE` also works for the sorted set of `RedisLockoutRegistry`.
+            pipeline.memory_usage(made_key, samples=0)
+            pipeline.pttl(made_key)
+
+        results = pipeline.execute(raise_on_error=False)
+        now = time.time()
+
+        for made_key, size, ttl in zip(made_keys, results[::2], results[1::2]):
+            key = self._unmake_key(made_key.decode())
+
+            # -2: the key expired or was deleted after `SCAN`.
+            if key is None or ttl == -2:
+                continue
+
+            yield KeyInfo(
+                key=key,
+                size=size if isinstance(size, int) else 0,
+                expires_at=now + ttl / 1000 if isinstance(ttl, int) and ttl >= 0 else None,
+            )
+
+
+class SharedMemoryKeyspaceScanner(BaseKeyspaceScanner):
+    def _iter_keys(self, prefix: str, *, batch_size: int) -> typing.Iterator[KeyInfo]:
+        made_prefix = self.backend.make_key(prefix)
+
+        for made_key, size, expires_at in self.backend.iter_entries():
+            if made_key.startswith(made_prefix):
+                yield KeyInfo(key=self._unmake_key(made_key), size=size, expires_at=expires_at or None)
+
+
+class LocMemKeyspaceScanner(BaseKeyspaceScanner):
+    def _iter_keys(self, prefix: str, *, batch_size: int) -> typing.Iterator[KeyInfo]:
+        made_prefix = self.backend.make_key(prefix)
+
+        with self.backend._lock:
+            made_keys = [made_key for made_key in self.backend._cache if made_key.startswith(made_prefix)]
+
+        for made_key in made_keys:
+            value = self.backend._cache.get(made_key)
+
+            if value is None:
+                continue
+
+            yield KeyInfo(
+                key=self._unmake_key(made_key),
+                size=len(made_key) + len(value),
+                expires_at=self.backend._expire_info.get(made_key),
+            )
+
+
+def get_scanner(backend: 'BaseCache') -> BaseKeyspaceScanner:
+    from django.core.cache.backends.locmem import LocMemCache
+    from django.core.cache.backends.redis import RedisCache
+
+    from .cache_backends import SharedMemoryCache
+
+    if isinstance(backend, RedisCache):
+        return RedisKeyspaceScanner(backend)
+
+    if isinstance(backend, SharedMemoryCache):
+        return SharedMemoryKeyspaceScanner(backend)
+
+    if isinstance(backend, LocMemCache):
+        return LocMemKeyspaceScanner(backend)
+
+    raise ValueError(f"Keys of {type(backend).__name__} can't be scanned.")
+
+
+def compact_value(value: typing.Any) -> typing.Any:
+    """
+    Throttle history (or backoff state) with whole-second timestamps, `value` itself if there is nothing to compact.
+
+    Timestamps are rounded up, so attempts are kept and lockouts end no sooner than before.
+    A pickled `int` takes 5 bytes instead of 9 bytes of a `float`.
+    """
+    if not isinstance(value, (list, tuple)) or not any(isinstance(item, float) for item in value):
+        return value
+
+    return type(value)(math.ceil(item) if isinstance(item, float) else item for item in value)
+
+
+def _escape_glob(pattern: str) -> str:
+    for char in '\\*?[]':
+        pattern = pattern.replace(char, f'\\{char}')
+
+    return pattern
@@ -0,0 +1,389 @@
+"""
+Load test of `TwoFactorAuth` under contention, used by the `two_factor_load_test` management command.
+
+Workers (threads of one process or single-threaded processes) send a mix of requests for synthetic users:
+
+- login: `get_status()`, `obtain()` and `verify()` from a new device;
+- trusted: `get_status()` from a device that passed 2FA before;
+- bad_password: `get_status()` with a wrong password;
+- stuffing: `get_status()` for unknown usernames from a small pool of IPs.
+
+After the mix, every worker sends `max_attempts` wrong passwords for the same requester at once in each
+contention round. The `2fa-auth` throttle should let only `max_attempts` of them check the password;
+more checks mean a lockout was skipped, and fewer attempts in the cache than checks mean lost updates
+(`RateThrottle` reads and writes the history without a lock).
+"""
+import multiprocessing
+import random
+import statistics
+import threading
+import time
+import typing
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import constants
+
+
+__all__ = (
+    'LoadTestConfig',
+    'LoadTestReport',
+    'LoadTestUser',
+    'create_users',
+    'delete_users',
+    'run_process_pool',
+    'run_thread_pool',
+)
+
+PERCENTILES = (50, 90, 99)
+# Seconds to wait for the other workers before a contention round.
+_BARRIER_TIMEOUT = 60
+
+
+@dataclass
+class LoadTestUser:
+    username: str
+    ip: str
+    # Device that passed 2FA before, `None` for users who log in from new devices.
+    trusted_device_id: typing.Optional[str] = None
+
+
+@dataclass
+class LoadTestConfig:
+    # Usernames of synthetic users and requesters start with it.
+    prefix: str
+    password: str
+    requests: int
+    bad_password_rate: float = 0.1
+    stuffing_rate: float = 0.1
+    stuffing_ips: int = 10
+    contention_rounds: int = 10
+    seed: int = 0
+
+    def get_contention_requester(self, contention_round: int) -> typing.Tuple[str, str]:
+        return f'{self.prefix}-contention-{contention_round}', '203.0.113.1'
+
+
+@dataclass
+class LoadTestReport:
+    workers: int = 0
+    requests: int = 0
+    # Wall-clock time of the request mix, from the first worker's start to the last worker's end.
+    started_at: typing.Optional[float] = None
+    finished_at: typing.Optional[float] = None
+    # Seconds per call of `get_status`, `obtain` and `verify`.
+    latencies: typing.Dict[str, typing.List[float]] = field(default_factory=dict)
+    # `(request kind, outcome)`, e.g. `('login', 'success')` or `('bad_password', 'blocked')`.
+    outcomes: typing.Counter[typing.Tuple[str, str]] = field(default_factory=Counter)
+    # Password checks (attempts that passed the throttle) per contention round.
+    contention_checks: typing.Counter[int] = field(default_factory=Counter)
+    # Rounds with more password checks than `max_attempts`.
+    skipped_lockouts: int = 0
+    # Password checks above `max_attempts` in all rounds.
+    excess_attempts: int = 0
+    # Password checks that aren't in the throttle history.
+    lost_updates: int = 0
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0
+
+        return self.finished_at - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.wall_seconds if self.wall_seconds else 0
+
+    def merge(self, other: 'LoadTestReport') -> None:
+        self.workers += other.workers
+        self.requests += other.requests
+        self.started_at = min(filter(None, (self.started_at, other.started_at)), default=None)
+        self.finished_at = max(filter(None, (self.finished_at, other.finished_at)), default=None)
+
+        for operation, latencies in other.latencies.items():
+            self.latencies.setdefault(operation, []).extend(latencies)
+
+        self.outcomes.update(other.outcomes)
+        self.contention_checks.update(other.contention_checks)
+
+    def get_percentiles(self, operation: str) -> typing.Dict[int, float]:
+        latencies = self.latencies.get(operation, [])
+
+        if len(latencies) < 2:
+            return {percentile: latencies[0] if latencies else 0 for percentile in PERCENTILES}
+
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {percentile: quantiles[percentile - 1] for percentile in PERCENTILES}
+
+
+def create_users(count: int, *, config: LoadTestConfig, trusted_device_rate: float) -> typing.List[LoadTestUser]:
+    """
+    Create `count` active users with `config.password` and trust a device of `trusted_device_rate` of them.
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    from .utils import UserDeviceManager
+
+    UserModel = get_user_model()
+    rng = random.Random(config.seed)
+    # One hash for all users, hashing is the slowest part of creating them.
+    password = make_password(config.password)
+    users = []
+
+    for i in range(count):
+        username = f'{config.prefix}-{i}'
+        user = UserModel(**{UserModel.USERNAME_FIELD: username, 'password': password})
+
+        if UserModel.EMAIL_FIELD:
+            setattr(user, UserModel.EMAIL_FIELD, f'{username}@example.com')
+
+        users.append(user)
+
+    users = UserModel._default_manager.bulk_create(users, batch_size=1000)
+    result = []
+
+    for i, user in enumerate(users):
+        load_test_user = LoadTestUser(username=user.get_username(), ip=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}')
+
+        if rng.random() < trusted_device_rate:
+            load_test_user.trusted_device_id = 'load-test'
+            UserDeviceManager(user).add_device(load_test_user.trusted_device_id)
+
+        result.append(load_test_user)
+
+    return result
+
+
+def delete_users(config: LoadTestConfig) -> int:
+    from django.contrib.auth import get_user_model
+
+    UserModel = get_user_model()
+    lookup = {f'{UserModel.USERNAME_FIELD}__startswith': f'{config.prefix}-'}
+
+    return UserModel._default_manager.filter(**lookup).delete()[0]
+
+
+def run_thread_pool(users: typing.List[LoadTestUser], *, config: LoadTestConfig, threads: int) -> LoadTestReport:
+    barrier = threading.Barrier(threads)
+    report = LoadTestReport()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [
+            executor.submit(_run_worker, worker_id, users, config=config, barrier=barrier)
+            for worker_id in range(threads)
+        ]
+
+        for future in futures:
+            report.merge(future.result())
+
+    _check_contention(report, config=config)
+
+    return report
+
+
+def run_process_pool(users: typing.List[LoadTestUser], *,
+                     config: LoadTestConfig,
+                     processes: int,
+                     settings_overrides: typing.Dict[str, typing.Any]) -> LoadTestReport:
+    """
+    Workers are spawned processes, which set up Django with `DJANGO_SETTINGS_MODULE` and `settings_overrides`.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(processes)
+    queue = context.Queue()
+    workers = [
+        context.Process(
+            target=_process_worker,
+            args=(worker_id, users, config, barrier, queue, settings_overrides),
+        )
+        for worker_id in range(processes)
+    ]
+    report = LoadTestReport()
+
+    for worker in workers:
+        worker.start()
+
+    results = [queue.get() for _ in workers]
+
+    for worker in workers:
+        worker.join()
+
+    if any(result is None for result in results):
+        raise RuntimeError('A load test process failed, see the traceback above.')
+
+    for result in results:
+        report.merge(result)
+
+    _check_contention(report, config=config)
+
+    return report
+
+
+def _process_worker(worker_id: int,
+                    users: typing.List[LoadTestUser],
+                    config: LoadTestConfig,
+                    barrier: typing.Any,
+                    queue: typing.Any,
+                    settings_overrides: typing.Dict[str, typing.Any]) -> None:
+    import django
+    from django.test.utils import override_settings
+
+    try:
+        django.setup()
+
+        with override_settings(**settings_overrides):
+            queue.put(_run_worker(worker_id, users, config=config, barrier=barrier))
+    except BaseException:
+        queue.put(None)
+        raise
+
+
+def _run_worker(worker_id: int,
+                users: typing.List[LoadTestUser], *,
+                config: LoadTestConfig,
+                barrier: typing.Any) -> LoadTestReport:
+    from django.db import connections
+
+    rng = random.Random(f'{config.seed}-{worker_id}')
+    report = LoadTestReport(workers=1)
+
+    try:
+        # Processes start the mix together, after setting up Django.
+        _wait(barrier)
+        report.started_at = time.time()
+
+        for i in range(config.requests):
+            _run_request(users, config=config, rng=rng, device_id=f'load-test-{worker_id}-{i}', report=report)
+
+        report.finished_at = time.time()
+
+        for contention_round in range(config.contention_rounds):
+            _wait(barrier)
+            report.contention_checks[contention_round] += _run_contention_round(contention_round, config=config)
+    finally:
+        # Worker threads open their own DB connections.
+        connections.close_all()
+
+    return report
+
+
+def _run_request(users: typing.List[LoadTestUser], *,
+                 config: LoadTestConfig,
+                 rng: random.Random,
+                 device_id: str,
+                 report: LoadTestReport) -> None:
+    from .base import TwoFactorAuth
+    from .dto import TwoFactorRequester
+
+    value = rng.random()
+    user = rng.choice(users)
+    username, ip, password = user.username, user.ip, config.password
+
+    if value < config.stuffing_rate:
+        kind = 'stuffing'
+        username = f'{config.prefix}-stuffing-{rng.randrange(1_000_000_000)}'
+        ip = f'198.51.100.{rng.randrange(config.stuffing_ips)}'
+    elif value < config.stuffing_rate + config.bad_password_rate:
+        kind = 'bad_password'
+        password = f'{password}-invalid'
+    elif user.trusted_device_id is not None:
+        kind = 'trusted'
+        device_id = user.trusted_device_id
+    else:
+        kind = 'login'
+
+    def _get_two_factor_auth() -> TwoFactorAuth:
+        return TwoFactorAuth(TwoFactorRequester(username=username, password=password, ip=ip, device_id=device_id))
+
+    report.requests += 1
+    operations = [('get_status', lambda: _get_two_factor_auth().get_status())]
+
+    if kind == 'login':
+        operations.append(('obtain', lambda: _get_two_factor_auth().obtain()))
+
+    result = None
+
+    for operation, func in operations:
+        result, outcome = _measure(report, operation, func)
+
+        if outcome != 'success':
+            report.outcomes[kind, outcome] += 1
+            return
+
+    if kind == 'login':
+        _, outcome = _measure(report, 'verify', lambda: _get_two_factor_auth().verify(result.verification_code))
+    else:
+        outcome = 'success'
+
+    report.outcomes[kind, outcome] += 1
+
+
+def _run_contention_round(contention_round: int, *, config: LoadTestConfig) -> int:
+    from .base import TwoFactorAuth
+    from .dto import TwoFactorRequester
+    from .errors import TwoFactorAuthError
+    from .settings import app_settings
+
+    username, ip = config.get_contention_requester(contention_round)
+    checks = 0
+
+    for _ in range(app_settings.RATE_THROTTLE_FOR_AUTH.condition.max_attempts):
+        requester = TwoFactorRequester(username=username, password=config.password, ip=ip)
+
+        try:
+            TwoFactorAuth(requester).get_status()
+        except TwoFactorAuthError as e:
+            checks += _is_password_check(e)
+
+    return checks
+
+
+def _check_contention(report: LoadTestReport, *, config: LoadTestConfig) -> None:
+    from .settings import app_settings
+    from .utils import get_requester_ident
+
+    rate_throttle = app_settings.RATE_THROTTLE_FOR_AUTH
+
+    for contention_round in range(config.contention_rounds):
+        username, ip = config.get_contention_requester(contention_round)
+        checks = report.contention_checks[contention_round]
+        recorded = rate_throttle.get_status(get_requester_ident(username=username, ip=ip)).num_attempts
+        excess_attempts = max(checks - rate_throttle.condition.max_attempts, 0)
+
+        report.skipped_lockouts += excess_attempts > 0
+        report.excess_attempts += excess_attempts
+        report.lost_updates += max(checks - recorded, 0)
+
+
+def _wait(barrier: typing.Any) -> None:
+    try:
+        barrier.wait(_BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        # Another worker failed: the rest of the test runs without it.
+        pass
+
+
+def _measure(report: LoadTestReport, operation: str, func: typing.Callable) -> typing.Tuple[typing.Any, str]:
+    from .errors import TwoFactorAuthError
+
+    started_at = time.perf_counter()
+
+    try:
+        result, outcome = func(), 'success'
+    except TwoFactorAuthError as e:
+        is_blocked = e.throttle_status is not None and not e.throttle_status.is_allowed and not _is_password_check(e)
+        result, outcome = None, 'blocked' if is_blocked else 'failure'
+
+    report.latencies.setdefault(operation, []).append(time.perf_counter() - started_at)
+
+    return result, outcome
+
+
+def _is_password_check(error: Exception) -> bool:
+    """
+    Whether `get_status()` failed after checking the password rather than being blocked by the throttle.
+    """
+    return str(error.reason).startswith(str(constants.ACCOUNT_ERROR_MSG))
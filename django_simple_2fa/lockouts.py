@@ -0,0 +1,183 @@
+import typing
+from dataclasses import dataclass
+
+from . import clock
+from .caching import cache
+
+
+__all__ = (
+    'BaseLockoutRegistry',
+    'CacheLockoutRegistry',
+    'Lockout',
+    'LockoutList',
+    'RedisLockoutRegistry',
+)
+
+
+@dataclass
+class Lockout:
+    scope: str
+    ident: str
+    unlock_at: float
+
+    @property
+    def waiting_time(self) -> int:
+        return max(int(self.unlock_at - clock.now()), 0)
+
+    @property
+    def str_waiting_time(self) -> str:
+        from .utils import convert_seconds_to_str
+        return convert_seconds_to_str(self.waiting_time, round_time=True)
+
+
+class BaseLockoutRegistry:
+    """
+    Index of active lockouts ordered by unlock time.
+    `RateThrottle` adds an identity when it spends all attempts and removes it on `reset()`.
+    """
+
+    def add(self, *, scope: str, ident: str, unlock_at: float) -> None:
+        raise NotImplementedError
+
+    def remove(self, *, scope: str, ident: str) -> None:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def list(self, *, offset: int = 0, limit: int = 100) -> typing.List[Lockout]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _get_member(scope: str, ident: str) -> str:
+        return f'{scope}:{ident}'
+
+    @staticmethod
+    def _parse_member(member: str, unlock_at: float) -> Lockout:
+        scope, ident = member.split(':', 1)
+        return Lockout(scope=scope, ident=ident, unlock_at=unlock_at)
+
+
+class CacheLockoutRegistry(BaseLockoutRegistry):
+    """
+    Generic registry for any cache backend: the whole index is kept in one cache key.
+    Updates are read-modify-write, so concurrent lockouts may overwrite each other,
+    and it is meant only for development. Use `RedisLockoutRegistry` in production.
+
+    The index keeps at most `max_entries` lockouts, the ones that unlock last.
+    """
+    cache = cache
+    cache_key = 'rate-throttle-lockouts'
+    max_entries = 1_000
+
+    def add(self, *, scope: str, ident: str, unlock_at: float) -> None:
+        lockouts = self._get_active_lockouts()
+        lockouts[self._get_member(scope, ident)] = unlock_at
+
+        if len(lockouts) > self.max_entries:
+            lockouts = dict(sorted(lockouts.items(), key=lambda item: item[1])[-self.max_entries:])
+
+        self._save_lockouts(lockouts)
+
+    def remove(self, *, scope: str, ident: str) -> None:
+        lockouts = self._get_active_lockouts()
+
+        if lockouts.pop(self._get_member(scope, ident), None) is not None:
+            self._save_lockouts(lockouts)
+
+    def count(self) -> int:
+        return len(self._get_active_lockouts())
+
+    def list(self, *, offset: int = 0, limit: int = 100) -> typing.List[Lockout]:
+        lockouts = sorted(self._get_active_lockouts().items(), key=lambda item: item[1])
+
+        return [
+            self._parse_member(member, unlock_at)
+            for member, unlock_at in lockouts[offset:offset + limit]
+        ]
+
+    def _get_active_lockouts(self) -> typing.Dict[str, float]:
+        now = clock.now()
+
+        return {
+            member: unlock_at
+            for member, unlock_at in self.cache.get(self.cache_key, {}).items()
+            if unlock_at > now
+        }
+
+    def _save_lockouts(self, lockouts: typing.Dict[str, float]) -> None:
+        if not lockouts:
+            self.cache.delete(self.cache_key)
+            return
+
+        self.cache.set(self.cache_key, lockouts, max(lockouts.values()) - clock.now())
+
+
+class RedisLockoutRegistry(BaseLockoutRegistry):
+    """
+    Sorted set in Redis scored by unlock time, so every operation is O(log n).
+    Requires `django.core.cache.backends.redis.RedisCache`.
+    """
+    cache = cache
+    cache_key = 'rate-throttle-lockouts'
+
+    def add(self, *, scope: str, ident: str, unlock_at: float) -> None:
+        client = self._get_client()
+        key = self._get_key()
+
+        pipeline = client.pipeline()
+        pipeline.zadd(key, {self._get_member(scope, ident): unlock_at})
+        # Expired lockouts are removed on writes, so the set doesn't grow forever.
+        pipeline.zremrangebyscore(key, '-inf', clock.now())
+        pipeline.execute()
+
+    def remove(self, *, scope: str, ident: str) -> None:
+        self._get_client().zrem(self._get_key(), self._get_member(scope, ident))
+
+    def count(self) -> int:
+        return self._get_client().zcount(self._get_key(), f'({clock.now()}', '+inf')
+
+    def list(self, *, offset: int = 0, limit: int = 100) -> typing.List[Lockout]:
+        items = self._get_client().zrangebyscore(
+            self._get_key(),
+            f'({clock.now()}',
+            '+inf',
+            start=offset,
+            num=limit,
+            withscores=True,
+        )
+
+        return [
+            self._parse_member(member.decode() if isinstance(member, bytes) else member, unlock_at)
+            for member, unlock_at in items
+        ]
+
+    def _get_key(self) -> str:
+        return self.cache.make_and_validate_key(self.cache_key)
+
+    def _get_client(self):
+        return self.cache._cache.get_client(write=True)
+
+
+class LockoutList:
+    """
+    Lazy sequence over a registry, e.g. for `django.core.paginator.Paginator`.
+    """
+    registry: BaseLockoutRegistry
+
+    def __init__(self, registry: BaseLockoutRegistry) -> None:
+        self.registry = registry
+
+    def count(self) -> int:
+        return self.registry.count()
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, item: slice) -> typing.List[Lockout]:
+        if not isinstance(item, slice) or item.step not in (None, 1):
+            raise TypeError('LockoutList supports only slices.')
+
+        offset = item.start or 0
+        return self.registry.list(offset=offset, limit=max(item.stop - offset, 0))
+
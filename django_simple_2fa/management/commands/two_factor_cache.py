@@ -0,0 +1,158 @@
+import time
+import typing
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from ...keyspace import KEY_FAMILIES, KeyFamily, KeyInfo, compact_value, get_scanner
+
+
+class Command(BaseCommand):
+    help = (
+        'Report the number and size of cache keys of django-simple-2fa by scope, '
+        'purge expired and orphaned keys and compact throttle histories.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--family', action='append', choices=[family.name for family in KEY_FAMILIES],
+            help='Scan only these key families (all by default).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--purge-expired', action='store_true', help='Delete keys that have expired.')
+        parser.add_argument('--purge-orphaned', action='store_true', help='Delete keys of deleted users.')
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='Rewrite throttle histories with whole-second timestamps, keeping their TTLs.',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only count keys that would be changed.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        families = [
+            family for family in KEY_FAMILIES
+            if not options['family'] or family.name in options['family']
+        ]
+        stats = Counter()
+
+        for family in families:
+            try:
+                scanner = get_scanner(family.cache.backend)
+            except ValueError as e:
+                raise CommandError(e) from e
+
+            for batch in scanner.scan(family.prefix, batch_size=options['batch_size']):
+                self._handle_batch(family, batch, stats=stats, options=options)
+
+        self._report(stats, dry_run=options['dry_run'])
+
+    def _handle_batch(self, family: KeyFamily, batch: typing.List[KeyInfo], *, stats: Counter, options: dict) -> None:
+        now = time.time()
+        expired_keys = []
+        orphaned_keys = []
+
+        for info in batch:
+            scope = family.get_scope(info.key)
+            stats[scope, 'keys'] += 1
+            stats[scope, 'bytes'] += info.size
+
+            if info.is_expired(now):
+                stats[scope, 'expired'] += 1
+                expired_keys.append(info.key)
+
+        if options['purge_orphaned'] and family.user_id_index is not None:
+            orphaned_keys = self._get_orphaned_keys(family, batch, ignored_keys=set(expired_keys))
+
+            for key in orphaned_keys:
+                stats[family.get_scope(key), 'orphaned'] += 1
+
+        keys_to_delete = (expired_keys if options['purge_expired'] else []) + orphaned_keys
+
+        if keys_to_delete:
+            stats['deleted'] += len(keys_to_delete)
+
+            if not options['dry_run']:
+                family.cache.backend.delete_many(keys_to_delete)
+
+        if options['compact'] and family.by_scope:
+            self._compact(family, batch, skipped_keys=set(keys_to_delete), now=now, stats=stats, options=options)
+
+    def _get_orphaned_keys(self,
+                           family: KeyFamily,
+                           batch: typing.List[KeyInfo], *,
+                           ignored_keys: typing.Set[str]) -> typing.List[str]:
+        UserModel = get_user_model()
+        user_ids = {}
+
+        for info in batch:
+            user_id = family.get_user_id(info.key)
+
+            if info.key in ignored_keys or user_id is None:
+                continue
+
+            try:
+                user_ids[info.key] = str(UserModel._meta.pk.to_python(user_id))
+            except ValidationError:
+                # Not a primary key of the current user model.
+                user_ids[info.key] = None
+
+        existing_user_ids = {
+            str(pk)
+            for pk in UserModel._default_manager.filter(
+                pk__in={user_id for user_id in user_ids.values() if user_id is not None},
+            ).values_list('pk', flat=True)
+        }
+
+        return [key for key, user_id in user_ids.items() if user_id not in existing_user_ids]
+
+    def _compact(self,
+                 family: KeyFamily,
+                 batch: typing.List[KeyInfo], *,
+                 skipped_keys: typing.Set[str],
+                 now: float,
+                 stats: Counter,
+                 options: dict) -> None:
+        infos = {info.key: info for info in batch if info.key not in skipped_keys and not info.is_expired(now)}
+        backend = family.cache.backend
+
+        for key, value in backend.get_many(list(infos)).items():
+            compact = compact_value(value)
+
+            if compact is value:
+                continue
+
+            stats['compacted'] += 1
+            expires_at = infos[key].expires_at
+
+            if options['dry_run']:
+                continue
+
+            if expires_at is None:
+                backend.set(key, compact, None)
+            elif expires_at > now:
+                backend.set(key, compact, expires_at - now)
+
+    def _report(self, stats: Counter, *, dry_run: bool) -> None:
+        scopes = sorted({key[0] for key in stats if isinstance(key, tuple)})
+        columns = ('keys', 'bytes', 'expired', 'orphaned')
+
+        self.stdout.write(f'{"scope":<40}' + ''.join(f'{column:>12}' for column in columns))
+
+        for scope in scopes:
+            self.stdout.write(f'{scope:<40}' + ''.join(f'{stats[scope, column]:>12}' for column in columns))
+
+        self.stdout.write(f'{"total":<40}' + ''.join(
+            f'{sum(stats[scope, column] for scope in scopes):>12}' for column in columns
+        ))
+
+        prefix = 'Would have ' if dry_run else ''
+
+        if stats['deleted']:
+            self.stdout.write(f'{prefix}Deleted {stats["deleted"]} keys.'.capitalize())
+
+        if stats['compacted']:
+            self.stdout.write(f'{prefix}Compacted {stats["compacted"]} values.'.capitalize())
@@ -0,0 +1,181 @@
+import dataclasses
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from ... import flags, keyspace, load_testing
+from ...settings import app_settings
+
+
+BACKENDS = ('configured', 'locmem', 'db', 'redis')
+OPERATIONS = ('get_status', 'obtain', 'verify')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test TwoFactorAuth with synthetic users from a thread pool and a process pool, '
+        'and report throughput, latency percentiles and lockouts skipped by races. '
+        'Users are created in the default database, run it against a staging database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per worker.')
+        parser.add_argument('--threads', type=int, default=8, help='Workers of the thread pool (0 to skip it).')
+        parser.add_argument('--processes', type=int, default=4, help='Workers of the process pool (0 to skip it).')
+        parser.add_argument('--bad-password-rate', type=float, default=0.1)
+        parser.add_argument(
+            '--trusted-device-rate', type=float, default=0.3, help='Share of users with a trusted device.',
+        )
+        parser.add_argument('--stuffing-rate', type=float, default=0.1)
+        parser.add_argument('--stuffing-ips', type=int, default=10)
+        parser.add_argument('--contention-rounds', type=int, default=10)
+        parser.add_argument(
+            '--backend', action='append', choices=BACKENDS,
+            help='Cache backends to test (the configured caches by default). '
+                 'locmem isn\'t shared by processes, db creates its cache table.',
+        )
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379/0')
+        parser.add_argument(
+            '--fast-password-hasher', action='store_true',
+            help='Hash passwords with MD5 to measure the package instead of the password hasher.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep-users', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['bad_password_rate'] + options['stuffing_rate'] > 1:
+            raise CommandError('--bad-password-rate and --stuffing-rate must not exceed 1 together.')
+
+        if options['users'] < 1 or options['stuffing_ips'] < 1:
+            raise CommandError('--users and --stuffing-ips must be positive.')
+
+        for backend in options['backend'] or ['configured']:
+            settings_overrides = self._get_settings_overrides(backend, options=options)
+
+            with override_settings(**settings_overrides):
+                if not flags.throttling_is_enabled():
+                    self.stderr.write('THROTTLING_IS_ENABLED is off, throttles are not tested.')
+
+                if backend == 'db':
+                    call_command('createcachetable', verbosity=0)
+
+                self._run(backend, settings_overrides=settings_overrides, options=options)
+
+    def _run(self, backend: str, *, settings_overrides: dict, options: dict) -> None:
+        config = load_testing.LoadTestConfig(
+            prefix=f'load-test-{uuid.uuid4().hex[:8]}',
+            password=uuid.uuid4().hex,
+            requests=options['requests'],
+            bad_password_rate=options['bad_password_rate'],
+            stuffing_rate=options['stuffing_rate'],
+            stuffing_ips=options['stuffing_ips'],
+            contention_rounds=options['contention_rounds'],
+            seed=options['seed'],
+        )
+        users = load_testing.create_users(
+            options['users'],
+            config=config,
+            trusted_device_rate=options['trusted_device_rate'],
+        )
+
+        try:
+            if options['threads'] > 0:
+                report = load_testing.run_thread_pool(users, config=config, threads=options['threads'])
+                self._report(backend, 'threads', report)
+
+            if options['processes'] > 0:
+                report = load_testing.run_process_pool(
+                    users,
+                    # Contention rounds of the process pool need new requesters.
+                    config=dataclasses.replace(config, prefix=f'{config.prefix}-processes'),
+                    processes=options['processes'],
+                    settings_overrides=settings_overrides,
+                )
+                self._report(backend, 'processes', report)
+        finally:
+            if not options['keep_users']:
+                load_testing.delete_users(config)
+
+            if backend != 'configured':
+                self._clear_cache(backend)
+
+    def _get_settings_overrides(self, backend: str, *, options: dict) -> dict:
+        # Synthetic users have example.com addresses.
+        overrides = {'EMAIL_BACKEND': 'django.core.mail.backends.dummy.EmailBackend'}
+
+        if options['fast_password_hasher']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        if backend == 'configured':
+            return overrides
+
+        cache_settings = {
+            'locmem': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'django-simple-2fa-load-test',
+                'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+            },
+            'db': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'django_simple_2fa_load_test_cache',
+                'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+            },
+            'redis': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': options['redis_url'],
+                # Keys of the load test are deleted by this prefix.
+                'KEY_PREFIX': 'django-simple-2fa-load-test',
+            },
+        }[backend]
+
+        overrides['CACHES'] = {
+            **settings.CACHES,
+            'default': cache_settings,
+            app_settings.THROTTLE_CACHE_ALIAS: cache_settings,
+        }
+
+        return overrides
+
+    def _clear_cache(self, backend: str) -> None:
+        if backend != 'redis':
+            # The load test has its own locmem cache and cache table.
+            caches['default'].clear()
+            return
+
+        for family in keyspace.KEY_FAMILIES:
+            cache = family.cache.backend
+
+            for batch in keyspace.get_scanner(cache).scan(family.prefix, batch_size=1000):
+                cache.delete_many([info.key for info in batch])
+
+    def _report(self, backend: str, pool: str, report: load_testing.LoadTestReport) -> None:
+        self.stdout.write(
+            f'{backend} / {pool}: {report.workers} workers, {report.requests} requests '
+            f'in {report.wall_seconds:.1f} s, {report.throughput:.1f} requests/s',
+        )
+        self.stdout.write(f'  {"operation":<12}{"count":>8}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+
+        for operation in OPERATIONS:
+            latencies = report.latencies.get(operation)
+
+            if not latencies:
+                continue
+
+            percentiles = report.get_percentiles(operation)
+            self.stdout.write(
+                f'  {operation:<12}{len(latencies):>8}'
+                + ''.join(f'{percentiles[percentile] * 1000:>10.2f}' for percentile in load_testing.PERCENTILES)
+                + f'{max(latencies) * 1000:>10.2f}',
+            )
+
+        outcomes = ', '.join(f'{kind} {outcome} {count}' for (kind, outcome), count in sorted(report.outcomes.items()))
+        self.stdout.write(f'  outcomes: {outcomes}')
+        self.stdout.write(
+            f'  contention: {len(report.contention_checks)} rounds, {report.skipped_lockouts} skipped lockouts, '
+            f'{report.excess_attempts} excess attempts, {report.lost_updates} lost updates',
+        )
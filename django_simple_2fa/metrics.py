@@ -0,0 +1,362 @@
+"""
+Prometheus-style metrics of throttling and 2FA outcomes.
+
+Metrics are recorded only with `METRICS_ENABLED`.
+Each thread writes to its own values, so recording doesn't take locks;
+values of all threads are summed when metrics are collected.
+Values of a finished thread are folded into one per-metric total, so short-lived threads don't pile up.
+
+With several worker processes, set `METRICS_MULTIPROCESS_DIR` to a directory shared by them:
+every process writes its values to `<pid>.json` there (at most every `METRICS_FLUSH_INTERVAL` seconds),
+and `metrics_view` serves the sum over all files in the text exposition format.
+Clear the directory when the application is (re)deployed.
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import typing
+import weakref
+
+from django.http import HttpRequest, HttpResponse
+
+from .settings import app_settings
+
+
+__all__ = (
+    'Counter',
+    'Histogram',
+    'MetricsRegistry',
+    'audit_events',
+    'codes_sent',
+    'flow_duration',
+    'lockouts',
+    'metrics_view',
+    'notification_emails',
+    'registry',
+    'throttle_checks',
+    'trusted_device_checks',
+    'verifications',
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = typing.Tuple[str, ...]
+
+
+class _ThreadValues:
+    """
+    Holder of values of one thread, it is freed when the thread finishes.
+    """
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self) -> None:
+        self.values = {}
+
+
+class _Metric:
+    type: str
+    name: str
+    documentation: str
+    labelnames: typing.Tuple[str, ...]
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Iterable[str] = (), *,
+                 registry: typing.Optional['MetricsRegistry'] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._thread_values = {}
+        self._finished_values = {}
+        # Reentrant, because `_fold()` may run from the garbage collector while the lock is held.
+        self._lock = threading.RLock()
+        self._registry = registry
+
+        if registry is not None:
+            registry.register(self)
+
+    def collect(self) -> typing.Dict[LabelValues, typing.Any]:
+        """
+        Values of all threads of this process by label values.
+        """
+        with self._lock:
+            result = dict(self._finished_values)
+            thread_values = list(self._thread_values.values())
+
+        for values in thread_values:
+            for label_values, value in list(values.items()):
+                result[label_values] = self._merge(result.get(label_values), value)
+
+        return result
+
+    def _get_values(self) -> typing.Dict[LabelValues, typing.Any]:
+        holder = getattr(self._local, 'holder', None)
+
+        if holder is None:
+            holder = self._local.holder = _ThreadValues()
+
+            with self._lock:
+                self._thread_values[id(holder.values)] = holder.values
+
+            # Values of finished threads are kept, so counters never go down.
+            weakref.finalize(holder, self._fold, holder.values)
+
+        return holder.values
+
+    def _fold(self, values: typing.Dict[LabelValues, typing.Any]) -> None:
+        with self._lock:
+            del self._thread_values[id(values)]
+
+            for label_values, value in values.items():
+                self._finished_values[label_values] = self._merge(self._finished_values.get(label_values), value)
+
+    def _get_label_values(self, labels: typing.Dict[str, typing.Any]) -> LabelValues:
+        return tuple(str(labels[labelname]) for labelname in self.labelnames)
+
+    def _merge(self, value: typing.Any, other: typing.Any) -> typing.Any:
+        raise NotImplementedError
+
+    def _recorded(self) -> None:
+        if self._registry is not None:
+            self._registry.flush_if_needed()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels: typing.Any) -> None:
+        if not app_settings.METRICS_ENABLED:
+            return
+
+        values = self._get_values()
+        label_values = self._get_label_values(labels)
+        values[label_values] = values.get(label_values, 0) + amount
+        self._recorded()
+
+    def _merge(self, value: typing.Optional[float], other: float) -> float:
+        return (value or 0) + other
+
+
+class Histogram(_Metric):
+    """
+    Values are `[count per bucket..., sum, count]`, buckets aren't cumulative.
+    """
+    type = 'histogram'
+    buckets: typing.Tuple[float, ...]
+
+    def __init__(self, *args, buckets: typing.Iterable[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = (*sorted(buckets), math.inf)
+
+    def observe(self, value: float, **labels: typing.Any) -> None:
+        if not app_settings.METRICS_ENABLED:
+            return
+
+        values = self._get_values()
+        label_values = self._get_label_values(labels)
+        histogram = values.get(label_values)
+
+        if histogram is None:
+            histogram = values[label_values] = [0] * (len(self.buckets) + 2)
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                histogram[i] += 1
+                break
+
+        histogram[-2] += value
+        histogram[-1] += 1
+        self._recorded()
+
+    def _merge(self, value: typing.Optional[list], other: list) -> list:
+        if value is None:
+            return list(other)
+
+        return [a + b for a, b in zip(value, other)]
+
+
+class MetricsRegistry:
+    metrics: typing.Dict[str, _Metric]
+
+    def __init__(self) -> None:
+        self.metrics = {}
+        self._next_flush_at = 0.0
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        self.metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str, labelnames: typing.Iterable[str] = ()) -> Counter:
+        return Counter(name, documentation, labelnames, registry=self)
+
+    def histogram(self, name: str, documentation: str, labelnames: typing.Iterable[str] = (), **kwargs) -> Histogram:
+        return Histogram(name, documentation, labelnames, registry=self, **kwargs)
+
+    def collect(self) -> typing.Dict[str, typing.Dict[LabelValues, typing.Any]]:
+        """
+        Values of all metrics by label values, of all processes in multiprocess mode.
+        """
+        directory = app_settings.METRICS_MULTIPROCESS_DIR
+
+        if not directory:
+            return {name: metric.collect() for name, metric in self.metrics.items()}
+
+        self.flush()
+        result = {name: {} for name in self.metrics}
+
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                # Removed or being replaced.
+                continue
+
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+
+                if metric is None:
+                    continue
+
+                for label_values, value in samples:
+                    label_values = tuple(label_values)
+                    result[name][label_values] = metric._merge(result[name].get(label_values), value)
+
+        return result
+
+    def flush_if_needed(self) -> None:
+        if not app_settings.METRICS_MULTIPROCESS_DIR or time.monotonic() < self._next_flush_at:
+            return
+
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        Write values of this process to `METRICS_MULTIPROCESS_DIR/<pid>.json`.
+        """
+        directory = app_settings.METRICS_MULTIPROCESS_DIR
+
+        if not directory or not self._flush_lock.acquire(blocking=False):
+            return
+
+        try:
+            self._next_flush_at = time.monotonic() + app_settings.METRICS_FLUSH_INTERVAL
+            data = {
+                name: [[list(label_values), value] for label_values, value in metric.collect().items()]
+                for name, metric in self.metrics.items()
+            }
+
+            # Written to a temporary file and renamed, so readers never see a partial file.
+            fd, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+
+            os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        finally:
+            self._flush_lock.release()
+
+    def generate_latest(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format.
+        """
+        collected = self.collect()
+        lines = []
+
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {_escape_help(metric.documentation)}')
+            lines.append(f'# TYPE {name} {metric.type}')
+
+            for label_values, value in sorted(collected[name].items()):
+                labels = list(zip(metric.labelnames, label_values))
+
+                if metric.type == 'counter':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+
+                cumulative_count = 0
+
+                for bound, count in zip(metric.buckets, value):
+                    cumulative_count += count
+                    le = '+Inf' if bound == math.inf else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels([*labels, ("le", le)])} {cumulative_count}')
+
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Exposition view for Prometheus. It isn't protected, so route it only on an internal host or wrap it.
+    """
+    return HttpResponse(registry.generate_latest(), content_type=CONTENT_TYPE)
+
+
+def _escape_help(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _format_labels(labels: typing.List[typing.Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+
+    escaped_labels = (
+        (name, value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped_labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+throttle_checks = registry.counter(
+    'django_simple_2fa_throttle_checks_total',
+    'Throttle checks by scope and result (allowed or blocked).',
+    ('scope', 'result'),
+)
+lockouts = registry.counter(
+    'django_simple_2fa_lockouts_total',
+    'Identities locked by a throttle.',
+    ('scope',),
+)
+verifications = registry.counter(
+    'django_simple_2fa_verifications_total',
+    'Verifications by auth type and result (success, failure or blocked).',
+    ('auth_type', 'result'),
+)
+codes_sent = registry.counter(
+    'django_simple_2fa_codes_sent_total',
+    'Verification codes sent by auth type.',
+    ('auth_type',),
+)
+trusted_device_checks = registry.counter(
+    'django_simple_2fa_trusted_device_checks_total',
+    'Trusted device checks by result (hit or miss).',
+    ('result',),
+)
+notification_emails = registry.counter(
+    'django_simple_2fa_notification_emails_total',
+    'Emails about many failed login attempts.',
+)
+flow_duration = registry.histogram(
+    'django_simple_2fa_flow_duration_seconds',
+    'Duration of TwoFactorAuth flows (get_status, obtain and verify).',
+    ('flow',),
+)
+audit_events = registry.counter(
+    'django_simple_2fa_audit_events_total',
+    'Audit events by result (dropped when the buffer is full, written or failed per sink).',
+    ('result',),
+)
@@ -0,0 +1,104 @@
+import functools
+import json
+import typing
+
+from django.http import HttpRequest, HttpResponse
+
+from . import constants, networks, utils
+from .settings import app_settings
+
+
+__all__ = (
+    'ThrottleGateMiddleware',
+    'check_throttle_gate',
+    'throttle_gate',
+)
+
+
+class ThrottleGateMiddleware:
+    """
+    Rejects login requests of blocked clients before the login view runs,
+    i.e. before password hashing in `authenticate()` and any DB queries.
+
+    Only POST requests to views from `THROTTLE_GATE_VIEW_NAMES` are checked.
+    """
+
+    def __init__(self, get_response: typing.Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        return self.get_response(request)
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs) -> typing.Optional[HttpResponse]:
+        if request.method != 'POST':
+            return None
+
+        if request.resolver_match.view_name not in app_settings.THROTTLE_GATE_VIEW_NAMES:
+            return None
+
+        return check_throttle_gate(request)
+
+
+def throttle_gate(view_func: typing.Callable) -> typing.Callable:
+    """
+    Decorator version of `ThrottleGateMiddleware` for a single view.
+    """
+
+    @functools.wraps(view_func)
+    def _wrapped_view(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if request.method == 'POST':
+            response = check_throttle_gate(request)
+
+            if response is not None:
+                return response
+
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped_view
+
+
+def check_throttle_gate(request: HttpRequest) -> typing.Optional[HttpResponse]:
+    """
+    Return a 403 response for a denied network (see `IP_DENYLIST`)
+    or a 429 response if the `2fa-auth` throttle of the requester is spent.
+    """
+    ip = utils.get_ip_from_request(request)
+    ip_rule = utils.get_ip_rule(ip)
+
+    if ip_rule == networks.DENY:
+        return HttpResponse(constants.IP_DENIED_MSG, status=403, content_type='text/plain; charset=utf-8')
+
+    if ip_rule == networks.ALLOW:
+        return None
+
+    username = _get_username_from_request(request)
+
+    if not username:
+        return None
+
+    ident = utils.get_requester_ident(username=username, ip=ip)
+    throttle_status = app_settings.RATE_THROTTLE_FOR_AUTH.get_status(ident)
+
+    if throttle_status.is_allowed:
+        return None
+
+    response = HttpResponse(
+        constants.ACCOUNT_LOCKED_MSG.format(waiting_time=throttle_status.str_waiting_time),
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(max(throttle_status.waiting_time, 1))
+
+    return response
+
+
+def _get_username_from_request(request: HttpRequest) -> typing.Optional[str]:
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return None
+
+        return data.get('username') if isinstance(data, dict) else None
+
+    return request.POST.get('username')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, verbose_name='created at')),
+                ('event', models.CharField(max_length=32, verbose_name='event')),
+                ('outcome', models.CharField(max_length=32, verbose_name='outcome')),
+                ('username', models.CharField(blank=True, db_index=True, max_length=150, verbose_name='username')),
+                ('user_id', models.CharField(blank=True, max_length=64, verbose_name='user ID')),
+                ('ip', models.GenericIPAddressField(blank=True, null=True, verbose_name='IP')),
+                ('device_id', models.CharField(blank=True, max_length=255, verbose_name='device ID')),
+                ('auth_type', models.CharField(blank=True, max_length=32, verbose_name='2FA type')),
+                ('details', models.JSONField(blank=True, default=dict, verbose_name='details')),
+            ],
+            options={
+                'verbose_name': 'audit log entry',
+                'verbose_name_plural': 'audit log entries',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_simple_2fa', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTwoFactorType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('two_factor_type', models.CharField(max_length=32, verbose_name='2FA type')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': '2FA type of a user',
+                'verbose_name_plural': '2FA types of users',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrustedDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_id', models.CharField(max_length=255, verbose_name='device ID')),
+                ('verified_at', models.DateTimeField(verbose_name='verified at')),
+                ('last_seen_at', models.DateTimeField(verbose_name='last seen at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'trusted device',
+                'verbose_name_plural': 'trusted devices',
+                'constraints': [models.UniqueConstraint(fields=('user', 'device_id'), name='django_simple_2fa_unique_device')],
+            },
+        ),
+    ]
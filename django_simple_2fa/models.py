@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+__all__ = (
+    'AuditLogEntry',
+    'RecoveryCodes',
+    'TrustedDevice',
+    'UserTwoFactorType',
+)
+
+
+class AuditLogEntry(models.Model):
+    """
+    Authentication event written by `audit.DatabaseAuditSink`.
+    Users are stored by ID without a foreign key, so entries outlive deleted users.
+    """
+    created_at = models.DateTimeField(_('created at'), db_index=True)
+    event = models.CharField(_('event'), max_length=32)
+    outcome = models.CharField(_('outcome'), max_length=32)
+    username = models.CharField(_('username'), max_length=150, blank=True, db_index=True)
+    user_id = models.CharField(_('user ID'), max_length=64, blank=True)
+    ip = models.GenericIPAddressField(_('IP'), blank=True, null=True)
+    device_id = models.CharField(_('device ID'), max_length=255, blank=True)
+    auth_type = models.CharField(_('2FA type'), max_length=32, blank=True)
+    details = models.JSONField(_('details'), default=dict, blank=True)
+
+    class Meta:
+        verbose_name = _('audit log entry')
+        verbose_name_plural = _('audit log entries')
+        ordering = ('-created_at',)
+
+    def __str__(self) -> str:
+        return f'{self.created_at:%Y-%m-%d %H:%M:%S} {self.event} {self.outcome} {self.username}'
+
+
+class TrustedDevice(models.Model):
+    """
+    Device that passed 2FA, with `PERSISTENT_DEVICES` (see `persistence.DeviceStore`).
+    The cache stays in front of it, rows are written in batches.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    device_id = models.CharField(_('device ID'), max_length=255)
+    # The device is trusted for 4 weeks (`UserDeviceManager._device_ttl`) after it.
+    verified_at = models.DateTimeField(_('verified at'))
+    last_seen_at = models.DateTimeField(_('last seen at'))
+
+    class Meta:
+        verbose_name = _('trusted device')
+        verbose_name_plural = _('trusted devices')
+        constraints = (
+            # Also the index for lookups by user and device.
+            models.UniqueConstraint(fields=('user', 'device_id'), name='django_simple_2fa_unique_device'),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user_id} {self.device_id}'
+
+
+class UserTwoFactorType(models.Model):
+    """
+    2FA type chosen by a user, see `persistence.get_user_two_factor_type()`.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    # `type` of one of `TWO_FACTOR_TYPES`.
+    two_factor_type = models.CharField(_('2FA type'), max_length=32)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('2FA type of a user')
+        verbose_name_plural = _('2FA types of users')
+
+    def __str__(self) -> str:
+        return f'{self.user_id} {self.two_factor_type}'
+
+
+class RecoveryCodes(models.Model):
+    """
+    Unused codes of `auth_types.RecoveryCodesTwoFactorAuthType`, one row per user.
+    `hashes` is a concatenation of 16-byte BLAKE2b digests of the codes salted with `salt`.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    salt = models.BinaryField(_('salt'), max_length=16)
+    hashes = models.BinaryField(_('hashes'))
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('recovery codes')
+        verbose_name_plural = _('recovery codes')
+
+    def __str__(self) -> str:
+        return f'{self.user_id} ({len(self.hashes) // 16} codes)'
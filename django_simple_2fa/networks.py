@@ -0,0 +1,265 @@
+import ipaddress
+import logging
+import os
+import threading
+import time
+import typing
+
+
+__all__ = (
+    'ALLOW',
+    'DENY',
+    'IPAccessList',
+    'NetworkIndex',
+    'aggregate_ip',
+    'normalize_ip',
+)
+
+IPAddress = typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+IPNetwork = typing.Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+ALLOW = 'allow'
+DENY = 'deny'
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkIndex:
+    """
+    Longest-prefix-match index of networks.
+
+    Networks are grouped by prefix length into hash tables,
+    so a lookup makes one probe per distinct prefix length (at most 33 for IPv4 and 129 for IPv6)
+    however many networks are indexed.
+    Only integers are stored, network objects are created for matches.
+    """
+    # {version: [(prefix_length, {network_address >> host_bits: value}), ...]}
+    _tables: typing.Dict[int, typing.List[typing.Tuple[int, typing.Dict[int, typing.Any]]]]
+
+    def __init__(self, networks: typing.Iterable[typing.Union[str, IPNetwork]] = (), value: typing.Any = True) -> None:
+        self._tables = {4: [], 6: []}
+        self._prefixes = {4: {}, 6: {}}
+
+        for network in networks:
+            self.add(network, value)
+
+    def __len__(self) -> int:
+        return sum(len(table) for prefixes in self._prefixes.values() for table in prefixes.values())
+
+    def __bool__(self) -> bool:
+        return any(self._prefixes.values())
+
+    def __contains__(self, address: typing.Union[str, IPAddress]) -> bool:
+        return self._match(address) is not None
+
+    def add(self, network: typing.Union[str, IPNetwork], value: typing.Any = True) -> None:
+        network = ipaddress.ip_network(network, strict=False)
+        prefixes = self._prefixes[network.version]
+
+        if network.prefixlen not in prefixes:
+            prefixes[network.prefixlen] = {}
+            # Longer prefixes first, so the first match is the longest one.
+            self._tables[network.version] = sorted(prefixes.items(), reverse=True)
+
+        host_bits = network.max_prefixlen - network.prefixlen
+        prefixes[network.prefixlen][int(network.network_address) >> host_bits] = value
+
+    def get(self, address: typing.Union[str, IPAddress], default: typing.Any = None) -> typing.Any:
+        """
+        Value of the longest network containing `address`.
+        """
+        match = self._match(address)
+        return default if match is None else match[2]
+
+    def lookup(self, address: typing.Union[str, IPAddress]) -> typing.Optional[typing.Tuple[IPNetwork, typing.Any]]:
+        """
+        Return `(network, value)` of the longest network containing `address`, or `None`.
+        """
+        match = self._match(address)
+
+        if match is None:
+            return None
+
+        network_address, prefixlen, value = match
+        return ipaddress.ip_network((network_address, prefixlen)), value
+
+    def _match(self, address: typing.Union[str, IPAddress]) -> typing.Optional[typing.Tuple[IPAddress, int, typing.Any]]:
+        if isinstance(address, str):
+            address = _parse_ip(address)
+
+            if address is None:
+                return None
+
+        address_int = int(address)
+        max_prefixlen = address.max_prefixlen
+
+        for prefixlen, table in self._tables[address.version]:
+            host_bits = max_prefixlen - prefixlen
+            key = address_int >> host_bits
+
+            if key in table:
+                return type(address)(key << host_bits), prefixlen, table[key]
+
+        return None
+
+
+class IPAccessList:
+    """
+    Allowed and denied networks with longest-prefix matching,
+    e.g. a denied `10.0.0.0/8` with an allowed `10.1.0.0/16` inside it.
+    A network that is both allowed and denied is denied.
+
+    Networks from `path` are added to `allowlist` and `denylist`.
+    The file has one rule per line (`allow 10.0.0.0/8` or `deny 203.0.113.0/24`, `#` starts a comment),
+    and it's reloaded when its modification time changes (checked at most every `check_interval` seconds).
+    If a changed file is invalid, the previous rules are kept.
+    """
+    path: typing.Optional[str]
+    check_interval: float
+    _index: NetworkIndex
+
+    def __init__(self,
+                 allowlist: typing.Iterable[str] = (),
+                 denylist: typing.Iterable[str] = (), *,
+                 path: typing.Optional[str] = None,
+                 check_interval: float = 5) -> None:
+        self.allowlist = tuple(allowlist)
+        self.denylist = tuple(denylist)
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._next_check_at = 0.0
+        self._lock = threading.Lock()
+        self._index = self._build_index(self._read_file() if path else ())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_rule(self, ip: typing.Optional[str]) -> typing.Optional[str]:
+        """
+        `ALLOW`, `DENY` or `None` for an IP address.
+        """
+        if not ip:
+            return None
+
+        if self.path:
+            self._reload_if_changed()
+
+        return self._index.get(ip)
+
+    def reload(self) -> None:
+        self._index = self._build_index(self._read_file())
+
+    def _reload_if_changed(self) -> None:
+        now = time.monotonic()
+
+        if now < self._next_check_at or not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            self._next_check_at = now + self.check_interval
+
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                logger.warning('Could not check IP access list "%s": %r', self.path, e)
+                return
+
+            if mtime == self._mtime:
+                return
+
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                logger.warning('Could not reload IP access list "%s": %r', self.path, e)
+        finally:
+            self._lock.release()
+
+    def _read_file(self) -> typing.List[typing.Tuple[str, str]]:
+        rules = []
+
+        with open(self.path, encoding='utf-8') as f:
+            # Read `st_mtime_ns` before the content, so changes made during reading trigger one more reload.
+            self._mtime = os.fstat(f.fileno()).st_mtime_ns
+
+            for line_number, line in enumerate(f, start=1):
+                line = line.split('#', 1)[0].strip()
+
+                if not line:
+                    continue
+
+                try:
+                    rule, network = line.split()
+                except ValueError:
+                    rule, network = None, None
+
+                if rule not in (ALLOW, DENY):
+                    raise ValueError(f'{self.path}:{line_number}: expected "allow <network>" or "deny <network>".')
+
+                rules.append((rule, network))
+
+        return rules
+
+    def _build_index(self, rules: typing.Iterable[typing.Tuple[str, str]]) -> NetworkIndex:
+        # A new index is built and then swapped, so concurrent lookups never see a partial one.
+        index = NetworkIndex()
+        rules = list(rules)
+
+        for rule, networks in ((ALLOW, self.allowlist), (DENY, self.denylist)):
+            rules.extend((rule, network) for network in networks)
+
+        # Denied networks are added last to win over the same allowed ones.
+        for rule, network in sorted(rules, key=lambda item: item[0] == DENY):
+            index.add(network, rule)
+
+        return index
+
+
+def normalize_ip(value: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    Canonical text form of an IP address (`None` if it is invalid).
+    Ports, brackets and zone IDs are removed, IPv4-mapped IPv6 addresses become IPv4.
+    """
+    address = _parse_ip(value)
+    return None if address is None else str(address)
+
+
+def aggregate_ip(ip: str, *, ipv6_prefix: typing.Optional[int]) -> str:
+    """
+    Replace an IPv6 address with its network (e.g. `/64`), because one client usually owns the whole network.
+    """
+    if not ipv6_prefix:
+        return ip
+
+    address = _parse_ip(ip)
+
+    if address is None or address.version != 6:
+        return ip
+
+    return str(ipaddress.IPv6Network((address, ipv6_prefix), strict=False))
+
+
+def _parse_ip(value: typing.Optional[str]) -> typing.Optional[IPAddress]:
+    if not value:
+        return None
+
+    value = value.strip()
+
+    if value.startswith('['):
+        # `[2001:db8::1]:443`
+        value = value[1:].split(']', 1)[0]
+    elif value.count(':') == 1:
+        # `192.0.2.1:443`
+        value = value.split(':', 1)[0]
+
+    value = value.split('%', 1)[0]
+
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+
+    return address
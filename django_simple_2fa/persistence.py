@@ -0,0 +1,178 @@
+"""
+Trusted devices and 2FA types of users in the DB.
+
+With `PERSISTENT_DEVICES`, trusted devices are also saved as `TrustedDevice` rows,
+so flushing or evicting the cache doesn't send every user back through 2FA at once.
+The cache stays in front of the table:
+
+- reads go to the cache first, and a miss is loaded from the DB and written back to the cache;
+- writes (new devices and last-seen timestamps) are buffered and saved by a background thread
+  every `DEVICE_WRITE_INTERVAL` seconds with one upsert per batch. Repeated writes of a device are merged.
+
+`get_user_two_factor_type()` can be used as `USER_TWO_FACTOR_TYPE_GETTER`, its result is cached
+with `TWO_FACTOR_TYPE_CACHE_TTL` (see `utils.get_two_factor_auth_type()`), and `set_user_two_factor_type()`
+invalidates it.
+"""
+import atexit
+import logging
+import os
+import threading
+import typing
+
+from .clock import to_datetime
+from .settings import app_settings
+
+
+if typing.TYPE_CHECKING:
+    from django.contrib.auth import get_user_model
+
+    from .auth_types.base import BaseTwoFactorAuthType
+
+    UserModel = get_user_model()
+
+__all__ = (
+    'DeviceStore',
+    'device_store',
+    'get_user_two_factor_type',
+    'set_user_two_factor_type',
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceStore:
+    """
+    Write-behind buffer of `TrustedDevice` rows: `(user ID, device ID) -> (verified_at, last_seen_at)`.
+    """
+
+    def __init__(self) -> None:
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+
+    def save(self, *, user_id: typing.Any, device_id: str, verified_at: float, last_seen_at: float) -> None:
+        self._ensure_started()
+
+        with self._lock:
+            self._pending[(user_id, device_id)] = (verified_at, last_seen_at)
+
+    def load(self, *, user_id: typing.Any, device_id: str, min_verified_at: float) -> typing.Optional[float]:
+        """
+        `verified_at` of a device verified after `min_verified_at`, pending writes included.
+        """
+        from .models import TrustedDevice
+
+        pending = self._pending.get((user_id, device_id))
+
+        if pending is not None:
+            verified_at = pending[0]
+        else:
+            verified_at = (
+                TrustedDevice.objects
+                .filter(user_id=user_id, device_id=device_id)
+                .values_list('verified_at', flat=True)
+                .first()
+            )
+            verified_at = verified_at.timestamp() if verified_at is not None else None
+
+        if verified_at is None or verified_at <= min_verified_at:
+            return None
+
+        return verified_at
+
+    def flush(self) -> int:
+        """
+        Write pending rows in the calling thread and return their number.
+        """
+        from django.db import close_old_connections, connections, router
+
+        from .models import TrustedDevice
+
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return 0
+
+            # The writer thread keeps its own connection, which can become stale between flushes.
+            close_old_connections()
+
+            features = connections[router.db_for_write(TrustedDevice)].features
+            # MySQL and MariaDB upsert on any unique constraint and don't accept a target.
+            unique_fields = ('user', 'device_id') if features.supports_update_conflicts_with_target else None
+
+            try:
+                TrustedDevice.objects.bulk_create(
+                    [
+                        TrustedDevice(
+                            user_id=user_id,
+                            device_id=device_id,
+                            verified_at=to_datetime(verified_at),
+                            last_seen_at=to_datetime(last_seen_at),
+                        )
+                        for (user_id, device_id), (verified_at, last_seen_at) in pending.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=('verified_at', 'last_seen_at'),
+                )
+            except Exception:
+                # Devices are still in the cache, so a lost batch costs only a 2FA after the cache is lost.
+                logger.exception('Failed to save %d trusted devices.', len(pending))
+                return 0
+
+        return len(pending)
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            if self._pid is not None:
+                # A forked child: pending rows of the parent are written by the parent.
+                self._pending.clear()
+            else:
+                atexit.register(self.flush)
+
+            self._pid = os.getpid()
+
+            if app_settings.DEVICE_WRITE_INTERVAL is not None:
+                threading.Thread(target=self._run, name='django-simple-2fa-devices', daemon=True).start()
+
+    def _run(self) -> None:
+        stopped = threading.Event()
+
+        while not stopped.wait(app_settings.DEVICE_WRITE_INTERVAL):
+            self.flush()
+
+
+device_store = DeviceStore()
+
+
+def get_user_two_factor_type(*, user: 'UserModel') -> typing.Type['BaseTwoFactorAuthType']:
+    """
+    `USER_TWO_FACTOR_TYPE_GETTER` by `UserTwoFactorType`, `DEFAULT_TWO_FACTOR_TYPE` if a user has no row.
+    """
+    from .models import UserTwoFactorType
+
+    two_factor_type = (
+        UserTwoFactorType.objects
+        .filter(user_id=user.pk)
+        .values_list('two_factor_type', flat=True)
+        .first()
+    )
+
+    return app_settings.TWO_FACTOR_TYPES_MAP.get(two_factor_type, app_settings.DEFAULT_TWO_FACTOR_TYPE)
+
+
+def set_user_two_factor_type(*, user: 'UserModel', two_factor_type: typing.Type['BaseTwoFactorAuthType']) -> None:
+    from .models import UserTwoFactorType
+    from .signals import two_factor_type_changed
+
+    UserTwoFactorType.objects.update_or_create(user=user, defaults={'two_factor_type': two_factor_type.type})
+    two_factor_type_changed.send(sender=UserTwoFactorType, user=user)
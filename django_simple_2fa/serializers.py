@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+
+__all__ = (
+    'TwoFactorAuthSerializer',
+    'TwoFactorAuthVerifySerializer',
+)
+
+
+class TwoFactorAuthSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(trim_whitespace=False)
+    device_id = serializers.CharField(required=False, allow_blank=True)
+
+
+class TwoFactorAuthVerifySerializer(TwoFactorAuthSerializer):
+    verification_code = serializers.CharField(required=False, allow_blank=True)
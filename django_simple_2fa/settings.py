@@ -1,13 +1,12 @@
 from django.conf import settings
-from django.test.signals import setting_changed
-from rest_framework.settings import APISettings as _APISettings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
 
 
-USER_SETTINGS = getattr(settings, 'DJANGO_SIMPLE_2FA', None)
-
 DEFAULTS = {
     'IS_ENABLED': None,
     'THROTTLING_IS_ENABLED': None,
+    'FEATURE_FLAGS_TTL': 0,
 
     'USER_AUTH_SECURITY_CLASS': 'django_simple_2fa.utils.UserAuthSecurity',
     'TWO_FACTOR_TYPES': (
@@ -16,10 +15,68 @@ DEFAULTS = {
     ),
     'DEFAULT_TWO_FACTOR_TYPE': 'django_simple_2fa.auth_types.email.EmailTwoFactorAuthType',
     'USER_TWO_FACTOR_TYPE_GETTER': None,
+    # Cache the result of `USER_TWO_FACTOR_TYPE_GETTER` (in seconds, `0` or `None` disables it).
+    'TWO_FACTOR_TYPE_CACHE_TTL': 0,
 
     'RATE_THROTTLE_FOR_AUTH': 'django_simple_2fa.throttling.rate_throttle_for_auth',
     'RATE_THROTTLE_FOR_OBTAIN': 'django_simple_2fa.throttling.rate_throttle_for_obtain',
     'RATE_THROTTLE_FOR_VERIFY': 'django_simple_2fa.throttling.rate_throttle_for_verify',
+    # Index of active lockouts for the admin, e.g. `django_simple_2fa.lockouts.RedisLockoutRegistry()`.
+    'LOCKOUT_REGISTRY': None,
+    # Cache for `RateThrottle`, e.g. with `django_simple_2fa.cache_backends.SharedMemoryCache`.
+    'THROTTLE_CACHE_ALIAS': 'default',
+
+    # Views protected by `ThrottleGateMiddleware`.
+    'THROTTLE_GATE_VIEW_NAMES': (
+        'admin:login',
+        'django_simple_2fa:status',
+        'django_simple_2fa:obtain',
+        'django_simple_2fa:verify',
+        'django_simple_2fa:login',
+    ),
+
+    # E.g. `{'FAILURE_THRESHOLD': 5, 'RESET_TIMEOUT': 30, 'LATENCY_BUDGET': 0.1, 'LOCAL_MAX_ENTRIES': 10000}`.
+    'CACHE_CIRCUIT_BREAKER': None,
+
+    # `None` means that `REST_FRAMEWORK['NUM_PROXIES']` is used.
+    'NUM_PROXIES': None,
+    # CIDRs of trusted proxies, e.g. `('10.0.0.0/8',)`. If set, it is used instead of `NUM_PROXIES`.
+    'TRUSTED_PROXIES': None,
+    # Throttle IPv6 clients by network, e.g. `64` for `/64`.
+    'IPV6_THROTTLE_PREFIX': None,
+
+    # CIDRs exempt from the login throttle (e.g. VPN) and CIDRs that are always rejected.
+    'IP_ALLOWLIST': (),
+    'IP_DENYLIST': (),
+    # File with `allow <CIDR>` / `deny <CIDR>` lines, reloaded when it changes.
+    'IP_ACCESS_LIST_FILE': None,
+    'IP_ACCESS_LIST_CHECK_INTERVAL': 5,
+
+    # Sinks for timings of `TwoFactorAuth` stages, e.g. `('utils.two_factor_auth.statsd_sink',)`.
+    'TRACING_SINKS': (),
+    # Add `timings` to `TwoFactorAuthObtainResult` and `TwoFactorAuthVerifyResult`.
+    'TRACING_ATTACH_TIMINGS': False,
+
+    # Prometheus-style metrics, see `django_simple_2fa.metrics`.
+    'METRICS_ENABLED': False,
+    # Directory shared by worker processes to aggregate their metrics.
+    'METRICS_MULTIPROCESS_DIR': None,
+    'METRICS_FLUSH_INTERVAL': 1,
+
+    # Save trusted devices in the DB (`TrustedDevice`) behind the cache, see `django_simple_2fa.persistence`.
+    'PERSISTENT_DEVICES': False,
+    # Seconds between batched DB writes of devices, `None` means only explicit `device_store.flush()`.
+    'DEVICE_WRITE_INTERVAL': 5,
+
+    # Sinks for the audit log of authentication events, e.g. `('django_simple_2fa.audit.database_sink',)`.
+    'AUDIT_SINKS': (),
+    # Events buffered in memory; new events are dropped when it's full.
+    'AUDIT_BUFFER_SIZE': 10_000,
+    'AUDIT_BATCH_SIZE': 500,
+    # Seconds between writes of the background thread, `None` means only explicit `audit_log.flush()`.
+    'AUDIT_FLUSH_INTERVAL': 1,
+
+    'WARM_UP_CACHE': False,
 }
 
 IMPORT_STRINGS = (
@@ -35,46 +92,131 @@ IMPORT_STRINGS = (
     'RATE_THROTTLE_FOR_AUTH',
     'RATE_THROTTLE_FOR_OBTAIN',
     'RATE_THROTTLE_FOR_VERIFY',
+    'LOCKOUT_REGISTRY',
+    'TRACING_SINKS',
+    'AUDIT_SINKS',
 )
 
 
-class APPSettings(_APISettings):
+def perform_import(val, setting_name):
+    """
+    If the given setting is a string import notation,
+    then perform the necessary import or imports.
+    """
+    if val is None:
+        return None
+
+    if isinstance(val, str):
+        return import_from_string(val, setting_name)
+
+    if isinstance(val, (list, tuple)):
+        return [import_from_string(item, setting_name) for item in val]
+
+    return val
+
+
+def import_from_string(val, setting_name):
+    try:
+        return import_string(val)
+    except ImportError as e:
+        raise ImportError(
+            f'Could not import "{val}" for setting "DJANGO_SIMPLE_2FA.{setting_name}". '
+            f'{e.__class__.__name__}: {e}.'
+        )
+
+
+class APPSettings:
+    """
+    Settings from `DJANGO_SIMPLE_2FA` that can be accessed as attributes.
+    Import strings are resolved on the first access (or in `setup()`).
+    """
+
+    def __init__(self, user_settings=None, defaults=None, import_strings=None):
+        if user_settings is not None:
+            self._user_settings = user_settings
+
+        self.defaults = defaults or DEFAULTS
+        self.import_strings = import_strings or IMPORT_STRINGS
+        self._cached_attrs = set()
+
+    @property
+    def user_settings(self):
+        if not hasattr(self, '_user_settings'):
+            self._user_settings = getattr(settings, 'DJANGO_SIMPLE_2FA', None) or {}
+
+        return self._user_settings
+
     def __getattr__(self, attr):
         if attr == 'TWO_FACTOR_TYPES_MAP':
             val = {
                 two_factor_type.type: two_factor_type
                 for two_factor_type in self.TWO_FACTOR_TYPES
             }
-
-            # Cache the result
-            self._cached_attrs.add(attr)
-            setattr(self, attr, val)
-            return val
-
-        if attr == 'TWO_FACTOR_TYPES_CHOICES':
+        elif attr == 'TWO_FACTOR_TYPES_CHOICES':
             val = (
                 (two_factor_type.type, two_factor_type.name,)
                 for two_factor_type in self.TWO_FACTOR_TYPES
             )
+        elif attr == 'TRUSTED_PROXIES_INDEX':
+            from .networks import NetworkIndex
+            val = NetworkIndex(self.TRUSTED_PROXIES or ())
+        elif attr == 'IP_ACCESS_LIST':
+            from .networks import IPAccessList
+            val = None
 
-            # Cache the result
-            self._cached_attrs.add(attr)
-            setattr(self, attr, val)
-            return val
+            if self.IP_ALLOWLIST or self.IP_DENYLIST or self.IP_ACCESS_LIST_FILE:
+                val = IPAccessList(
+                    self.IP_ALLOWLIST,
+                    self.IP_DENYLIST,
+                    path=self.IP_ACCESS_LIST_FILE,
+                    check_interval=self.IP_ACCESS_LIST_CHECK_INTERVAL,
+                )
+        elif attr in self.defaults:
+            val = self.user_settings.get(attr, self.defaults[attr])
 
-        return super().__getattr__(attr)
+            if attr == 'NUM_PROXIES' and val is None:
+                val = getattr(settings, 'REST_FRAMEWORK', {}).get('NUM_PROXIES')
 
+            if attr in self.import_strings:
+                val = perform_import(val, attr)
+        else:
+            raise AttributeError(f'Invalid setting: "{attr}"')
 
-app_settings = APPSettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS)
+        # Cache the result
+        self._cached_attrs.add(attr)
+        setattr(self, attr, val)
+        return val
 
+    def setup(self) -> None:
+        """
+        Resolve all import strings and derived settings eagerly.
+        """
+        for attr in self.import_strings:
+            getattr(self, attr)
 
-def reload_app_settings(*args, **kwargs):
-    global app_settings
+        getattr(self, 'TWO_FACTOR_TYPES_MAP')
+        getattr(self, 'TRUSTED_PROXIES_INDEX')
+        getattr(self, 'IP_ACCESS_LIST')
+
+    def reload(self) -> None:
+        for attr in self._cached_attrs:
+            delattr(self, attr)
 
-    setting, value = kwargs['setting'], kwargs['value']
+        self._cached_attrs.clear()
+
+        if hasattr(self, '_user_settings'):
+            delattr(self, '_user_settings')
+
+
+app_settings = APPSettings(None, DEFAULTS, IMPORT_STRINGS)
+
+
+def reload_app_settings(*args, **kwargs):
+    setting = kwargs['setting']
 
-    if setting == 'DJANGO_SIMPLE_2FA':
-        app_settings = APPSettings(value, DEFAULTS, IMPORT_STRINGS)
+    if setting in ('DJANGO_SIMPLE_2FA', 'REST_FRAMEWORK'):
+        # Reload in place, because other modules keep a reference to `app_settings`.
+        app_settings.reload()
 
 
 setting_changed.connect(reload_app_settings)
@@ -0,0 +1,16 @@
+from django.dispatch import Signal, receiver
+
+
+__all__ = (
+    'two_factor_type_changed',
+)
+
+# Send it with `user=...` when the 2FA type of a user changes,
+# e.g. `two_factor_type_changed.send(sender=Profile, user=profile.user)`.
+two_factor_type_changed = Signal()
+
+
+@receiver(two_factor_type_changed)
+def invalidate_two_factor_auth_type(sender, *, user, **kwargs) -> None:
+    from .utils import invalidate_two_factor_auth_type
+    invalidate_two_factor_auth_type(user)
@@ -0,0 +1,287 @@
+"""
+Offline simulation of throttle policies in virtual time.
+
+`simulate()` replays login attempts (e.g. from `synthetic_attempts()`) against a copy of a throttle
+that reads a `VirtualClock` and writes to an in-memory `VirtualCache`, so days of traffic
+take seconds and nothing touches the real cache, the lockout registry or the wall clock.
+Attempts are handled like `TwoFactorAuth` handles credentials: a read-only check, then a failed attempt
+is counted with `increase_attempts()`.
+
+    report = simulate(rate_throttle_for_auth, synthetic_attempts(duration=86_400, users=10_000, attack_rate=50))
+    print(report.attack_block_rate, report.false_lockouts, report.peak_keys, report.peak_bytes)
+
+See `python -m benchmarks.throttle_simulation` for a comparison of policies.
+"""
+import copy
+import heapq
+import itertools
+import math
+import pickle
+import random
+import time
+import typing
+from dataclasses import dataclass, field
+
+from . import flags
+from .clock import VirtualClock
+from .throttling import RateThrottle
+from .utils import get_requester_ident
+
+
+__all__ = (
+    'Attempt',
+    'SimulationReport',
+    'VirtualCache',
+    'simulate',
+    'synthetic_attempts',
+)
+
+
+class Attempt(typing.NamedTuple):
+    timestamp: float
+    username: str
+    ip: str
+    is_attack: bool
+    # The password is correct.
+    is_valid: bool
+
+
+@dataclass
+class SimulationReport:
+    legit_attempts: int = 0
+    # Attempts of legitimate users rejected by the throttle.
+    legit_blocked: int = 0
+    attack_attempts: int = 0
+    attack_blocked: int = 0
+    # Legitimate users blocked at least once.
+    false_lockouts: int = 0
+    peak_keys: int = 0
+    # Pickled size of keys and values.
+    peak_bytes: int = 0
+    cache_gets: int = 0
+    cache_sets: int = 0
+    virtual_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    _locked_out_usernames: typing.Set[str] = field(default_factory=set, repr=False)
+
+    @property
+    def attempts(self) -> int:
+        return self.legit_attempts + self.attack_attempts
+
+    @property
+    def attack_allowed(self) -> int:
+        """
+        Guesses that reached the password check.
+        """
+        return self.attack_attempts - self.attack_blocked
+
+    @property
+    def attack_block_rate(self) -> float:
+        return self.attack_blocked / self.attack_attempts if self.attack_attempts else 0.0
+
+    @property
+    def legit_block_rate(self) -> float:
+        return self.legit_blocked / self.legit_attempts if self.legit_attempts else 0.0
+
+
+class VirtualCache:
+    """
+    In-memory cache with expiration in virtual time, for the methods used by throttles.
+    It tracks the peak number of live keys and their pickled size.
+    """
+    clock: VirtualClock
+    keys: int
+    bytes: int
+    peak_keys: int
+    peak_bytes: int
+    gets: int
+    sets: int
+
+    def __init__(self, clock: VirtualClock) -> None:
+        self.clock = clock
+        # key -> (value, expires_at, size)
+        self._data = {}
+        self._expirations = []
+        self.keys = self.bytes = self.peak_keys = self.peak_bytes = self.gets = self.sets = 0
+
+    def get(self, key: str, default: typing.Any = None) -> typing.Any:
+        self.gets += 1
+        entry = self._data.get(key)
+
+        if entry is None or entry[1] <= self.clock.time():
+            return default
+
+        return entry[0]
+
+    def get_many(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Any]:
+        values = ((key, self.get(key)) for key in keys)
+        return {key: value for key, value in values if value is not None}
+
+    def set(self, key: str, value: typing.Any, timeout: typing.Optional[float] = None) -> None:
+        self.sets += 1
+        self.delete(key)
+
+        if timeout is not None and timeout <= 0:
+            return
+
+        expires_at = math.inf if timeout is None else self.clock.time() + timeout
+        size = len(key) + len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self._data[key] = (value, expires_at, size)
+        self.keys += 1
+        self.bytes += size
+        self.peak_keys = max(self.peak_keys, self.keys)
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+
+        if expires_at != math.inf:
+            heapq.heappush(self._expirations, (expires_at, key))
+
+    def delete(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+
+        if entry is not None:
+            self.keys -= 1
+            self.bytes -= entry[2]
+
+    def expire(self) -> None:
+        """
+        Drop expired entries, so peaks count only live ones.
+        """
+        now = self.clock.time()
+
+        while self._expirations and self._expirations[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expirations)
+            entry = self._data.get(key)
+
+            # The key could have been written again with a later expiration.
+            if entry is not None and entry[1] <= now:
+                self.delete(key)
+
+
+def simulate(rate_throttle: RateThrottle,
+             attempts: typing.Iterable[Attempt], *,
+             get_ident: typing.Optional[typing.Callable[[Attempt], str]] = None,
+             reset_on_success: bool = False) -> SimulationReport:
+    """
+    Replay `attempts` (ordered by timestamp) against a copy of `rate_throttle`.
+    Identities are `get_requester_ident()` by default, use e.g. `lambda attempt: attempt.username`
+    for per-user policies. With `reset_on_success` a valid attempt resets the identity (like `verify()`).
+    """
+    virtual_clock = VirtualClock()
+    virtual_cache = VirtualCache(virtual_clock)
+
+    rate_throttle = copy.copy(rate_throttle)
+    rate_throttle.cache = virtual_cache
+    rate_throttle.timer = virtual_clock.time
+    rate_throttle.use_lockout_registry = False
+
+    if get_ident is None:
+        def get_ident(attempt: Attempt) -> str:
+            return get_requester_ident(username=attempt.username, ip=attempt.ip)
+
+    report = SimulationReport()
+    started_at = time.perf_counter()
+    first_timestamp = None
+
+    with flags.throttling_is_enabled.override(True):
+        for attempt in attempts:
+            if first_timestamp is None:
+                first_timestamp = attempt.timestamp
+
+            virtual_clock.set(attempt.timestamp)
+            virtual_cache.expire()
+
+            ident = get_ident(attempt)
+            is_allowed = rate_throttle.check(ident, increase_attempts=False).is_allowed
+
+            if attempt.is_attack:
+                report.attack_attempts += 1
+                report.attack_blocked += not is_allowed
+            else:
+                report.legit_attempts += 1
+
+                if not is_allowed:
+                    report.legit_blocked += 1
+                    report._locked_out_usernames.add(attempt.username)
+
+            if not is_allowed:
+                continue
+
+            if not attempt.is_valid:
+                rate_throttle.increase_attempts(ident)
+            elif reset_on_success:
+                rate_throttle.reset(ident)
+
+    report.false_lockouts = len(report._locked_out_usernames)
+    report.peak_keys = virtual_cache.peak_keys
+    report.peak_bytes = virtual_cache.peak_bytes
+    report.cache_gets = virtual_cache.gets
+    report.cache_sets = virtual_cache.sets
+    report.virtual_seconds = virtual_clock.time() - (first_timestamp or 0.0)
+    report.wall_seconds = time.perf_counter() - started_at
+
+    return report
+
+
+def synthetic_attempts(*,
+                       duration: float,
+                       users: int,
+                       logins_per_user: float = 2.0,
+                       typo_rate: float = 0.1,
+                       attack_rate: float = 0.0,
+                       attack_usernames: int = 1_000,
+                       attack_ips: int = 100,
+                       start: float = 0.0,
+                       seed: int = 0) -> typing.Iterator[Attempt]:
+    """
+    Login attempts ordered by timestamp, generated lazily.
+
+    `users` log in from their own IPs `logins_per_user` times a day (a Poisson process);
+    a login mistypes the password with probability `typo_rate`, possibly several times in a row,
+    and retries after a few seconds. Attackers make `attack_rate` attempts per second
+    with usernames `user-0`..`user-{attack_usernames - 1}` (so they overlap real users)
+    from `attack_ips` addresses.
+    """
+    rnd = random.Random(seed)
+    end = start + duration
+    login_rate = users * logins_per_user / 86_400
+    pending = []
+    sequence = itertools.count()
+
+    def _get_next(timestamp: float, rate: float) -> float:
+        return timestamp + rnd.expovariate(rate) if rate > 0 else math.inf
+
+    next_login_at = _get_next(start, login_rate)
+    next_attack_at = _get_next(start, attack_rate)
+
+    while True:
+        timestamp = min(next_login_at, next_attack_at)
+
+        while pending and pending[0][0] <= timestamp:
+            yield heapq.heappop(pending)[2]
+
+        if timestamp >= end:
+            break
+
+        if next_login_at <= next_attack_at:
+            user = rnd.randrange(users)
+            username, ip = f'user-{user}', _get_ip(0x0A000000 + user)
+            attempt_at = timestamp
+
+            while rnd.random() < typo_rate:
+                heapq.heappush(pending, (attempt_at, next(sequence), Attempt(attempt_at, username, ip, False, False)))
+                attempt_at += rnd.uniform(2, 15)
+
+            heapq.heappush(pending, (attempt_at, next(sequence), Attempt(attempt_at, username, ip, False, True)))
+            next_login_at = _get_next(timestamp, login_rate)
+        else:
+            username = f'user-{rnd.randrange(attack_usernames)}'
+            ip = _get_ip(0x64400000 + rnd.randrange(attack_ips))
+            heapq.heappush(pending, (timestamp, next(sequence), Attempt(timestamp, username, ip, True, False)))
+            next_attack_at = _get_next(timestamp, attack_rate)
+
+    while pending:
+        yield heapq.heappop(pending)[2]
+
+
+def _get_ip(value: int) -> str:
+    return f'{value >> 24 & 255}.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}'
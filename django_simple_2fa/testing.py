@@ -0,0 +1,46 @@
+import contextlib
+import typing
+
+from .caching import CacheOps, record_cache_ops
+
+
+__all__ = (
+    'CacheOpsTestMixin',
+)
+
+
+class CacheOpsTestMixin:
+    """
+    Mixin for `unittest.TestCase` to keep cache budgets of login flows:
+
+        with self.assertCacheOps(max_gets=2, max_sets=1):
+            TwoFactorAuth(requester).get_status()
+    """
+
+    @contextlib.contextmanager
+    def assertCacheOps(self,
+                       *,
+                       max_gets: typing.Optional[int] = None,
+                       max_sets: typing.Optional[int] = None,
+                       max_deletes: typing.Optional[int] = None,
+                       max_round_trips: typing.Optional[int] = None,
+                       max_bytes_written: typing.Optional[int] = None) -> typing.Iterator[CacheOps]:
+        with record_cache_ops() as cache_ops:
+            yield cache_ops
+
+        budgets = (
+            ('gets', max_gets),
+            ('sets', max_sets),
+            ('deletes', max_deletes),
+            ('round_trips', max_round_trips),
+            ('bytes_written', max_bytes_written),
+        )
+        errors = [
+            f'{name}: {getattr(cache_ops, name)} > {max_value}'
+            for name, max_value in budgets
+            if max_value is not None and getattr(cache_ops, name) > max_value
+        ]
+
+        if errors:
+            keys = '\n'.join(f'  {cache_name}.{operation}({key!r})' for cache_name, operation, key in cache_ops.keys)
+            self.fail(f'Cache budget exceeded ({", ".join(errors)}). Keys:\n{keys}')
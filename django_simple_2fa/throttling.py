@@ -1,71 +1,112 @@
 import datetime
-import time
 import typing
-from dataclasses import dataclass
-
-from django.core.cache import cache
+from dataclasses import dataclass, field
 
+from . import clock, flags, metrics
+from .caching import UNKNOWN, throttle_cache
 from .settings import app_settings
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RateThrottleCondition:
     max_attempts: int
     duration: datetime.timedelta
+    duration_seconds: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'duration_seconds', self.duration.total_seconds())
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ThrottleStatus:
+    """
+    Numbers are computed when a status is created, human-readable times when they are read first.
+    """
     history: typing.List[float]
     condition: RateThrottleCondition
     is_allowed: bool
     timestamp: float
+    num_attempts: int = field(init=False, compare=False)
+    locking_time: int = field(init=False, compare=False)
+    waiting_time: int = field(init=False, compare=False)
+    remaining_attempts: int = field(init=False, compare=False)
+    _str_locking_time: typing.Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _str_waiting_time: typing.Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        num_attempts = self._get_num_attempts()
+        locking_time = self._get_locking_time()
+        remaining_attempts = max(self.condition.max_attempts - num_attempts, 0)
+
+        object.__setattr__(self, 'num_attempts', num_attempts)
+        object.__setattr__(self, 'locking_time', locking_time)
+        object.__setattr__(self, 'waiting_time', 0 if remaining_attempts else locking_time)
+        object.__setattr__(self, 'remaining_attempts', remaining_attempts)
 
     @property
-    def num_attempts(self) -> int:
-        return len(self.history)
+    def str_locking_time(self) -> str:
+        if self._str_locking_time is None:
+            from .utils import convert_seconds_to_str
+            object.__setattr__(self, '_str_locking_time', convert_seconds_to_str(self.locking_time, round_time=True))
+
+        return self._str_locking_time
 
     @property
-    def locking_time(self) -> int:
-        diff = int(self.timestamp - self.history[-1])
+    def str_waiting_time(self) -> str:
+        if self._str_waiting_time is None:
+            from .utils import convert_seconds_to_str
+            object.__setattr__(self, '_str_waiting_time', convert_seconds_to_str(self.waiting_time, round_time=True))
 
-        if diff >= self.condition.duration.total_seconds():
+        return self._str_waiting_time
+
+    @property
+    def is_spent_all_attempts(self) -> bool:
+        return not self.remaining_attempts
+
+    def _get_num_attempts(self) -> int:
+        return len(self.history)
+
+    def _get_locking_time(self) -> int:
+        if not self.history:
             return 0
 
-        return int(self.condition.duration.total_seconds() - diff)
+        diff = int(self.timestamp - self.history[-1])
 
-    @property
-    def waiting_time(self) -> int:
-        if not self.is_spent_all_attempts:
+        if diff >= self.condition.duration_seconds:
             return 0
 
-        return self.locking_time
+        return int(self.condition.duration_seconds - diff)
 
-    @property
-    def str_locking_time(self) -> str:
-        from .utils import convert_seconds_to_str
-        return convert_seconds_to_str(self.locking_time, round_time=True)
 
-    @property
-    def str_waiting_time(self) -> str:
-        from .utils import convert_seconds_to_str
-        return convert_seconds_to_str(self.waiting_time, round_time=True)
+class ThrottleMemo:
+    """
+    Write-through snapshot of throttle histories (or states) read during one request.
 
-    @property
-    def is_spent_all_attempts(self) -> bool:
-        return not self.remaining_attempts
+    `RateThrottle` reads a history from the cache only once per memo for read-only checks
+    and keeps the memo in sync with everything it writes. Writes always re-read the cache,
+    so concurrent requests of one identity don't overwrite each other's attempts with a stale snapshot.
+    """
+    _histories: typing.Dict[str, typing.List[float]]
 
-    @property
-    def remaining_attempts(self) -> int:
-        if self.num_attempts > self.condition.max_attempts:
-            return 0
+    def __init__(self) -> None:
+        self._histories = {}
 
-        return self.condition.max_attempts - self.num_attempts
+    def __contains__(self, cache_key: str) -> bool:
+        return cache_key in self._histories
+
+    def get(self, cache_key: str) -> typing.List[float]:
+        return list(self._histories[cache_key])
+
+    def set(self, cache_key: str, history: typing.List[float]) -> None:
+        self._histories[cache_key] = list(history)
 
 
 class RateThrottle:
-    cache = cache
-    timer = time.time
+    cache = throttle_cache
+    # Called as `self.timer()`, replace it (e.g. with `clock.VirtualClock().time`) to control time.
+    timer = staticmethod(clock.now)
+    # Add lockouts to `LOCKOUT_REGISTRY`.
+    use_lockout_registry = True
     cache_format = 'rate-throttle:{ident}:{scope}'
     scope: str
     condition: RateThrottleCondition
@@ -74,26 +115,55 @@ class RateThrottle:
         self.scope = scope
         self.condition = condition
 
-    def check(self, ident: str, increase_attempts: bool = True) -> ThrottleStatus:
-        history = self._get_history(ident)
-        now = time.time()
+    def check(self,
+              ident: str,
+              increase_attempts: bool = True, *,
+              memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        history = self._get_history(ident, memo=None if increase_attempts else memo)
+        now = self.timer()
+
+        if history is None:
+            metrics.throttle_checks.inc(scope=self.scope, result='blocked')
+            return self._get_unknown_status(now=now)
 
         if len(history) >= self.condition.max_attempts:
+            metrics.throttle_checks.inc(scope=self.scope, result='blocked')
             return ThrottleStatus(history=history, is_allowed=False, condition=self.condition, timestamp=now)
 
         if increase_attempts:
             history.append(now)
+            self._save_history(history, ident=ident, memo=memo)
 
-        self._save_history(history, ident=ident)
+        metrics.throttle_checks.inc(scope=self.scope, result='allowed')
 
         return ThrottleStatus(history=history, is_allowed=True, condition=self.condition, timestamp=now)
 
-    def increase_attempts(self, ident: str) -> ThrottleStatus:
-        now = time.time()
+    def get_status(self, ident: str) -> ThrottleStatus:
+        """
+        Read-only version of `check()`: nothing is written to the cache.
+        """
+        cached_value = self.cache.get(self._get_cache_key(ident))
+        return self._get_status_from_cached_value(cached_value, now=self.timer())
 
+    def check_many(self, idents: typing.Iterable[str]) -> typing.Dict[str, ThrottleStatus]:
+        """
+        Read-only `get_status()` for many identities with `cache.get_many()`.
+        """
+        statuses = get_many_statuses((self, ident) for ident in idents)
+        return {ident: status for (_, ident), status in statuses.items()}
+
+    def increase_attempts(self, ident: str, *, memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        now = self.timer()
+
+        # Not from `memo`: the identity may have failed in another request since it was read.
         history = self._get_history(ident)
+
+        if history is None:
+            # Nothing is saved, so the lockout isn't replaced with one attempt.
+            return self._get_unknown_status(now=now)
+
         history.append(now)
-        self._save_history(history, ident=ident)
+        self._save_history(history, ident=ident, memo=memo)
 
         return ThrottleStatus(
             history=history,
@@ -102,24 +172,89 @@ class RateThrottle:
             timestamp=now,
         )
 
-    def reset(self, ident: str) -> None:
+    def reset(self, ident: str, *, memo: typing.Optional[ThrottleMemo] = None) -> None:
         cache_key = self._get_cache_key(ident)
         self.cache.delete(cache_key)
 
-    def _save_history(self, history: typing.List[float], *, ident: str) -> None:
-        if not app_settings.THROTTLING_IS_ENABLED():
+        if memo is not None:
+            memo.set(cache_key, [])
+
+        if self.use_lockout_registry and app_settings.LOCKOUT_REGISTRY is not None:
+            app_settings.LOCKOUT_REGISTRY.remove(scope=self.scope, ident=ident)
+
+    def _save_history(self,
+                      history: typing.List[float], *,
+                      ident: str,
+                      memo: typing.Optional[ThrottleMemo] = None) -> None:
+        if not flags.throttling_is_enabled():
             return
 
         cache_key = self._get_cache_key(ident)
-        self.cache.set(cache_key, history, self.condition.duration.total_seconds())
-
-    def _get_history(self, ident: str) -> typing.List[float]:
+        self.cache.set(cache_key, history, self.condition.duration_seconds)
+
+        if memo is not None:
+            memo.set(cache_key, history)
+
+        if len(history) == self.condition.max_attempts:
+            # The attempt that spent the last one.
+            metrics.lockouts.inc(scope=self.scope)
+
+        if (len(history) >= self.condition.max_attempts
+                and self.use_lockout_registry
+                and app_settings.LOCKOUT_REGISTRY is not None):
+            app_settings.LOCKOUT_REGISTRY.add(
+                scope=self.scope,
+                ident=ident,
+                unlock_at=history[-1] + self.condition.duration_seconds,
+            )
+
+    def _get_history(self,
+                     ident: str, *,
+                     memo: typing.Optional[ThrottleMemo] = None) -> typing.Optional[typing.List[float]]:
+        """
+        `None` if the history can't be read (see `caching.UNKNOWN`).
+        """
         cache_key = self._get_cache_key(ident)
-        history = cache.get(cache_key, [])
 
-        now = time.time()
+        if memo is not None and cache_key in memo:
+            history = memo.get(cache_key)
+        else:
+            history = self.cache.get(cache_key, [])
+
+            if history is UNKNOWN:
+                return None
+
+            if memo is not None:
+                memo.set(cache_key, history)
 
-        while history and now - history[-1] >= self.condition.duration.total_seconds():
+        return self._prune_history(history, now=self.timer())
+
+    def _get_unknown_status(self, *, now: float) -> ThrottleStatus:
+        """
+        Status of an identity that can't be read from the cache: it is locked as if it just spent all attempts.
+        """
+        return ThrottleStatus(
+            history=[now] * self.condition.max_attempts,
+            is_allowed=False,
+            condition=self.condition,
+            timestamp=now,
+        )
+
+    def _get_status_from_cached_value(self, cached_value: typing.Any, *, now: float) -> ThrottleStatus:
+        if cached_value is UNKNOWN:
+            return self._get_unknown_status(now=now)
+
+        history = self._prune_history(list(cached_value or []), now=now)
+
+        return ThrottleStatus(
+            history=history,
+            is_allowed=len(history) < self.condition.max_attempts,
+            condition=self.condition,
+            timestamp=now,
+        )
+
+    def _prune_history(self, history: typing.List[float], *, now: float) -> typing.List[float]:
+        while history and now - history[-1] >= self.condition.duration_seconds:
             history.pop()
 
         return history
@@ -128,6 +263,268 @@ class RateThrottle:
         return self.cache_format.format(ident=ident, scope=self.scope)
 
 
+@dataclass(frozen=True, slots=True)
+class BackoffThrottleStatus(ThrottleStatus):
+    attempts: int = 0
+    locked_until: float = 0
+    next_lock_duration: int = 0
+
+    def _get_num_attempts(self) -> int:
+        return self.attempts
+
+    def _get_locking_time(self) -> int:
+        if self.locked_until > self.timestamp:
+            return int(self.locked_until - self.timestamp)
+
+        return self.next_lock_duration
+
+
+class BackoffRateThrottle(RateThrottle):
+    """
+    Each consecutive lockout of an identity doubles the lock duration
+    (starting from `condition.duration`) up to `max_duration`.
+    The lockout level decreases by one every `decay`.
+
+    An identity is stored as one small tuple:
+    `(attempts, window_started_at, level, locked_until, level_updated_at)`,
+    and read-only checks don't write to the cache.
+    """
+    max_duration: datetime.timedelta
+    decay: datetime.timedelta
+
+    def __init__(self, *,
+                 scope: str,
+                 condition: RateThrottleCondition,
+                 max_duration: datetime.timedelta = datetime.timedelta(days=1),
+                 decay: datetime.timedelta = datetime.timedelta(days=1)) -> None:
+        super().__init__(scope=scope, condition=condition)
+        self.max_duration = max_duration
+        self.decay = decay
+
+    def check(self,
+              ident: str,
+              increase_attempts: bool = True, *,
+              memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        now = self.timer()
+        state = self._get_state(ident, now=now, memo=None if increase_attempts else memo)
+
+        if state is None:
+            metrics.throttle_checks.inc(scope=self.scope, result='blocked')
+            return self._get_unknown_status(now=now)
+
+        if self._is_locked(state, now=now):
+            metrics.throttle_checks.inc(scope=self.scope, result='blocked')
+            return self._get_status(state, is_allowed=False, now=now)
+
+        if increase_attempts:
+            state = self._add_attempt(state, now=now)
+            self._save_state(state, ident=ident, now=now, memo=memo)
+
+        metrics.throttle_checks.inc(scope=self.scope, result='allowed')
+        return self._get_status(state, is_allowed=True, now=now)
+
+    def increase_attempts(self, ident: str, *, memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        now = self.timer()
+        state = self._get_state(ident, now=now)
+
+        if state is None:
+            return self._get_unknown_status(now=now)
+
+        if self._is_locked(state, now=now):
+            return self._get_status(state, is_allowed=False, now=now)
+
+        state = self._add_attempt(state, now=now)
+        self._save_state(state, ident=ident, now=now, memo=memo)
+
+        return self._get_status(state, is_allowed=True, now=now)
+
+    def get_lock_duration(self, level: int) -> float:
+        if level <= 0:
+            return 0
+
+        duration = self.condition.duration_seconds * 2 ** min(level - 1, 64)
+        return min(duration, self.max_duration.total_seconds())
+
+    def _get_unknown_status(self, *, now: float) -> ThrottleStatus:
+        state = (self.condition.max_attempts, now, 0, now + self.condition.duration_seconds, now)
+        return self._get_status(state, is_allowed=False, now=now)
+
+    def _get_status_from_cached_value(self, cached_value: typing.Any, *, now: float) -> ThrottleStatus:
+        if cached_value is UNKNOWN:
+            return self._get_unknown_status(now=now)
+
+        state = self._normalize_state(cached_value, now=now)
+        return self._get_status(state, is_allowed=not self._is_locked(state, now=now), now=now)
+
+    def _get_status(self, state: tuple, *, is_allowed: bool, now: float) -> BackoffThrottleStatus:
+        attempts, _, level, locked_until, _ = state
+
+        return BackoffThrottleStatus(
+            history=[],
+            condition=self.condition,
+            is_allowed=is_allowed,
+            timestamp=now,
+            attempts=attempts,
+            locked_until=locked_until,
+            next_lock_duration=int(self.get_lock_duration(level + 1)),
+        )
+
+    def _is_locked(self, state: tuple, *, now: float) -> bool:
+        return state[3] > now
+
+    def _add_attempt(self, state: tuple, *, now: float) -> tuple:
+        attempts, window_started_at, level, locked_until, level_updated_at = state
+
+        if not attempts:
+            window_started_at = now
+
+        attempts += 1
+
+        if attempts >= self.condition.max_attempts:
+            level += 1
+            level_updated_at = now
+            locked_until = now + self.get_lock_duration(level)
+
+        return attempts, window_started_at, level, locked_until, level_updated_at
+
+    def _normalize_state(self, cached_value: typing.Any, *, now: float) -> tuple:
+        if not cached_value:
+            return 0, 0.0, 0, 0.0, 0.0
+
+        attempts, window_started_at, level, locked_until, level_updated_at = cached_value
+
+        if locked_until and locked_until <= now:
+            # The lock is over, a new window starts from the next attempt.
+            attempts, locked_until = 0, 0.0
+        elif not locked_until and now - window_started_at >= self.condition.duration_seconds:
+            attempts = 0
+
+        decay = self.decay.total_seconds()
+        decayed_levels = min(int((now - level_updated_at) // decay), level) if level else 0
+
+        if decayed_levels:
+            level -= decayed_levels
+            level_updated_at += decayed_levels * decay
+
+        return attempts, window_started_at, level, locked_until, level_updated_at
+
+    def _get_state(self,
+                   ident: str, *,
+                   now: float,
+                   memo: typing.Optional[ThrottleMemo] = None) -> typing.Optional[tuple]:
+        cache_key = self._get_cache_key(ident)
+
+        if memo is not None and cache_key in memo:
+            cached_value = tuple(memo.get(cache_key))
+        else:
+            cached_value = self.cache.get(cache_key)
+
+            if cached_value is UNKNOWN:
+                return None
+
+            if memo is not None:
+                memo.set(cache_key, cached_value or ())
+
+        return self._normalize_state(cached_value, now=now)
+
+    def _save_state(self, state: tuple, *, ident: str, now: float, memo: typing.Optional[ThrottleMemo] = None) -> None:
+        if not flags.throttling_is_enabled():
+            return
+
+        attempts, window_started_at, level, locked_until, _ = state
+        expires_at = max(locked_until, window_started_at + self.condition.duration_seconds)
+        timeout = expires_at - now + level * self.decay.total_seconds()
+
+        cache_key = self._get_cache_key(ident)
+        self.cache.set(cache_key, state, timeout)
+
+        if memo is not None:
+            memo.set(cache_key, state)
+
+        if locked_until > now:
+            # States are saved only for new attempts, and a locked identity can't make them.
+            metrics.lockouts.inc(scope=self.scope)
+
+            if self.use_lockout_registry and app_settings.LOCKOUT_REGISTRY is not None:
+                app_settings.LOCKOUT_REGISTRY.add(scope=self.scope, ident=ident, unlock_at=locked_until)
+
+
+class ExemptRateThrottle(RateThrottle):
+    """
+    Throttle of an exempt client (see `IP_ALLOWLIST`) with the interface of `rate_throttle`:
+    every check passes, and nothing is read from or written to the cache.
+    """
+    rate_throttle: RateThrottle
+
+    def __init__(self, rate_throttle: RateThrottle) -> None:
+        super().__init__(scope=rate_throttle.scope, condition=rate_throttle.condition)
+        self.rate_throttle = rate_throttle
+
+    def check(self,
+              ident: str,
+              increase_attempts: bool = True, *,
+              memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        return self.get_status(ident)
+
+    def get_status(self, ident: str) -> ThrottleStatus:
+        return self.rate_throttle._get_status_from_cached_value(None, now=self.timer())
+
+    def check_many(self, idents: typing.Iterable[str]) -> typing.Dict[str, ThrottleStatus]:
+        return {ident: self.get_status(ident) for ident in idents}
+
+    def increase_attempts(self, ident: str, *, memo: typing.Optional[ThrottleMemo] = None) -> ThrottleStatus:
+        return self.get_status(ident)
+
+    def reset(self, ident: str, *, memo: typing.Optional[ThrottleMemo] = None) -> None:
+        pass
+
+
+def get_many_statuses(items: typing.Iterable[typing.Tuple[RateThrottle, str]], *,
+                      batch_size: int = 1_000) -> typing.Dict[typing.Tuple[str, str], ThrottleStatus]:
+    """
+    Read-only statuses for pairs of `(throttle, ident)`, keyed by `(scope, ident)`.
+    Histories are fetched with `cache.get_many()` in batches, nothing is written.
+    """
+    statuses = {}
+    batch = {}
+
+    def _fetch() -> None:
+        caches = {}
+
+        for cache_key, (throttle, ident) in batch.items():
+            caches.setdefault(id(throttle.cache), (throttle.cache, []))[1].append(cache_key)
+
+        # Throttles may have their own `timer`, each one is called once per batch.
+        timestamps = {}
+
+        for throttle_cache, cache_keys in caches.values():
+            cached_values = throttle_cache.get_many(cache_keys)
+
+            for cache_key in cache_keys:
+                throttle, ident = batch[cache_key]
+
+                if id(throttle) not in timestamps:
+                    timestamps[id(throttle)] = throttle.timer()
+
+                statuses[(throttle.scope, ident)] = throttle._get_status_from_cached_value(
+                    cached_values.get(cache_key),
+                    now=timestamps[id(throttle)],
+                )
+
+        batch.clear()
+
+    for throttle, ident in items:
+        batch[throttle._get_cache_key(ident)] = (throttle, ident)
+
+        if len(batch) >= batch_size:
+            _fetch()
+
+    if batch:
+        _fetch()
+
+    return statuses
+
+
 rate_throttle_for_auth = RateThrottle(
     scope='2fa-auth',
     condition=RateThrottleCondition(max_attempts=3, duration=datetime.timedelta(minutes=5)),
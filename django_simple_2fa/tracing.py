@@ -0,0 +1,252 @@
+"""
+Timing of the stages of `TwoFactorAuth` flows.
+
+A flow (`get_status`, `obtain`, `verify`) is a trace, and `stage()` blocks inside it
+(`authenticate`, `throttle`, `user_auth_security`, `render_letter`, `send_letter`, ...) are timed.
+Finished traces are passed to the sinks from `TRACING_SINKS`,
+and with `TRACING_ATTACH_TIMINGS` the timings are added to `TwoFactorAuthObtainResult` and `TwoFactorAuthVerifyResult`.
+
+When no sink is configured and timings aren't attached,
+`trace()` and `stage()` return a shared no-op context manager.
+"""
+import contextvars
+import dataclasses
+import functools
+import logging
+import socket
+import time
+import typing
+
+from . import metrics
+from .settings import app_settings
+
+
+__all__ = (
+    'BaseTraceSink',
+    'LoggingSink',
+    'OpenTelemetrySink',
+    'StatsdSink',
+    'Trace',
+    'stage',
+    'trace',
+    'traced',
+)
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('django_simple_2fa_trace', default=None)
+
+
+class Trace:
+    name: str
+    started_at: float
+    duration: typing.Optional[float]
+    # `(stage, started_at, duration)`, `started_at` is `time.perf_counter()`.
+    stages: typing.List[typing.Tuple[str, float, float]]
+    error: typing.Optional[BaseException]
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started_at = 0.0
+        self.duration = None
+        self.stages = []
+        self.error = None
+        self._token = None
+
+    def __enter__(self) -> 'Trace':
+        self._token = _current_trace.set(self)
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.duration = time.perf_counter() - self.started_at
+        self.error = exc_value
+        _current_trace.reset(self._token)
+
+        for sink in app_settings.TRACING_SINKS:
+            try:
+                sink.emit(self)
+            except Exception:
+                logger.exception('Tracing sink %r failed.', sink)
+
+    @property
+    def timings(self) -> typing.Dict[str, float]:
+        """
+        Seconds per stage (repeated stages are summed) and `total`.
+        """
+        timings = {}
+
+        for name, _, duration in self.stages:
+            timings[name] = timings.get(name, 0) + duration
+
+        timings['total'] = self.duration
+        return timings
+
+
+class _Stage:
+    __slots__ = ('_trace', '_name', '_started_at')
+
+    def __init__(self, trace: Trace, name: str) -> None:
+        self._trace = trace
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._started_at = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._trace.stages.append((self._name, self._started_at, time.perf_counter() - self._started_at))
+
+
+class _NoopContext:
+    __slots__ = ()
+    timings = None
+
+    def __enter__(self) -> '_NoopContext':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+_noop_context = _NoopContext()
+
+
+def trace(name: str) -> typing.Union[Trace, _NoopContext]:
+    if not app_settings.TRACING_SINKS and not app_settings.TRACING_ATTACH_TIMINGS:
+        return _noop_context
+
+    return Trace(name)
+
+
+def stage(name: str) -> typing.Union[_Stage, _NoopContext]:
+    current_trace = _current_trace.get()
+
+    if current_trace is None:
+        return _noop_context
+
+    return _Stage(current_trace, name)
+
+
+def traced(name: str) -> typing.Callable:
+    """
+    Run a method in `trace(name)` and attach timings to its result if it has a `timings` field.
+    The duration is also recorded in `metrics.flow_duration`.
+    """
+
+    def decorator(func: typing.Callable) -> typing.Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+
+            try:
+                with trace(name) as current_trace:
+                    result = func(*args, **kwargs)
+            finally:
+                metrics.flow_duration.observe(time.perf_counter() - started_at, flow=name)
+
+            if app_settings.TRACING_ATTACH_TIMINGS and hasattr(result, 'timings'):
+                result = dataclasses.replace(result, timings=current_trace.timings)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class BaseTraceSink:
+    def emit(self, trace: Trace) -> None:
+        raise NotImplementedError
+
+
+class LoggingSink(BaseTraceSink):
+    """
+    Logs one line per trace, e.g. `2fa verify 12.3 ms: authenticate=8.1 throttle=1.2 ...`.
+    """
+    logger: logging.Logger
+    level: int
+
+    def __init__(self, logger_name: str = 'django_simple_2fa.tracing', level: int = logging.INFO) -> None:
+        self.logger = logging.getLogger(logger_name)
+        self.level = level
+
+    def emit(self, trace: Trace) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        timings = trace.timings
+        total = timings.pop('total')
+        stages = ' '.join(f'{name}={duration * 1000:.1f}' for name, duration in timings.items())
+        error = f' ({type(trace.error).__name__})' if trace.error else ''
+
+        self.logger.log(self.level, '2fa %s %.1f ms%s: %s', trace.name, total * 1000, error, stages)
+
+
+class StatsdSink(BaseTraceSink):
+    """
+    Sends timers (`<prefix>.<flow>.<stage>:<ms>|ms`) to a statsd server over UDP, one datagram per trace.
+    """
+    host: str
+    port: int
+    prefix: str
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'django_simple_2fa') -> None:
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self._socket = None
+
+    def emit(self, trace: Trace) -> None:
+        lines = [
+            f'{self.prefix}.{trace.name}.{name}:{duration * 1000:.3f}|ms'
+            for name, duration in trace.timings.items()
+        ]
+
+        if trace.error:
+            lines.append(f'{self.prefix}.{trace.name}.errors:1|c')
+
+        try:
+            self._get_socket().sendto('\n'.join(lines).encode(), (self.host, self.port))
+        except OSError:
+            # Metrics are best effort, like statsd itself.
+            pass
+
+    def _get_socket(self) -> socket.socket:
+        if self._socket is None:
+            family = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)[0][0]
+            self._socket = socket.socket(family, socket.SOCK_DGRAM)
+            self._socket.setblocking(False)
+
+        return self._socket
+
+
+class OpenTelemetrySink(BaseTraceSink):
+    """
+    Exports a trace as a span with a child span per stage.
+    Requires `opentelemetry-api` (`pip install django-simple-2fa[opentelemetry]`).
+    """
+
+    def __init__(self, tracer_name: str = 'django_simple_2fa') -> None:
+        from opentelemetry import trace as otel_trace
+
+        self._otel_trace = otel_trace
+        self._tracer = otel_trace.get_tracer(tracer_name)
+
+    def emit(self, trace: Trace) -> None:
+        # Spans are created after the fact, so `perf_counter()` times are shifted to the wall clock.
+        offset = time.time_ns() - int((trace.started_at + trace.duration) * 1e9)
+
+        def _to_ns(value: float) -> int:
+            return int(value * 1e9) + offset
+
+        span = self._tracer.start_span(f'2fa.{trace.name}', start_time=_to_ns(trace.started_at))
+        context = self._otel_trace.set_span_in_context(span)
+
+        for name, started_at, duration in trace.stages:
+            child_span = self._tracer.start_span(f'2fa.{trace.name}.{name}', context=context, start_time=_to_ns(started_at))
+            child_span.end(end_time=_to_ns(started_at + duration))
+
+        if trace.error:
+            span.record_exception(trace.error)
+
+        span.end(end_time=_to_ns(trace.started_at + trace.duration))
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import views
+
+
+app_name = 'django_simple_2fa'
+
+urlpatterns = [
+    path('status/', views.TwoFactorAuthStatusView.as_view(), name='status'),
+    path('obtain/', views.TwoFactorAuthObtainView.as_view(), name='obtain'),
+    path('verify/', views.TwoFactorAuthVerifyView.as_view(), name='verify'),
+    path('login/', views.TwoFactorAuthLoginView.as_view(), name='login'),
+]
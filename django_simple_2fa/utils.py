@@ -1,18 +1,18 @@
 import datetime
 import logging
-import time
 import typing
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
-from django.core.mail import send_mail
 from django.http import HttpRequest
-from django.template import loader
-from rest_framework.settings import api_settings
+from django.utils.functional import cached_property
 
+from . import audit, clock, flags, metrics, tracing
 from .auth_types.base import BaseTwoFactorAuthType
 from .auth_types.direct import DirectTwoFactorAuthType
+from .caching import cache
+from .networks import aggregate_ip, normalize_ip
+from .persistence import device_store
 from .settings import app_settings
 from .throttling import RateThrottle, RateThrottleCondition
 
@@ -23,11 +23,19 @@ if typing.TYPE_CHECKING:
 
 def get_ip_from_request(request: HttpRequest) -> str:
     """
-    Identify the machine making the request by parsing HTTP_X_FORWARDED_FOR
-    if present and number of proxies is > 0. If not use all of
-    HTTP_X_FORWARDED_FOR if it is available, if not use REMOTE_ADDR.
+    Identify the machine making the request.
 
-    Сopied from rest_framework.throttling.BaseThrottle.get_ident.
+    With `TRUSTED_PROXIES`, HTTP_X_FORWARDED_FOR is walked from right to left
+    starting from REMOTE_ADDR, and the first address that isn't a trusted proxy is used.
+
+    Otherwise, parse HTTP_X_FORWARDED_FOR if present and number of proxies is > 0.
+    If not use all of HTTP_X_FORWARDED_FOR if it is available, if not use REMOTE_ADDR.
+    The number of proxies is taken from `DJANGO_SIMPLE_2FA['NUM_PROXIES']`
+    or `REST_FRAMEWORK['NUM_PROXIES']`.
+
+    Addresses are returned in the canonical form (see `networks.normalize_ip()`).
+
+    The `NUM_PROXIES` part is copied from rest_framework.throttling.BaseThrottle.get_ident.
     """
     xff = request.META.get('HTTP_X_FORWARDED_FOR')
     remote_addr = request.META.get('REMOTE_ADDR')
@@ -35,36 +43,87 @@ def get_ip_from_request(request: HttpRequest) -> str:
     if not xff and not remote_addr:
         logging.error('HTTP_X_FORWARDED_FOR and REMOTE_ADDR are empty.')
 
-    num_proxies = api_settings.NUM_PROXIES
+    if app_settings.TRUSTED_PROXIES:
+        return _get_ip_behind_trusted_proxies(xff, remote_addr)
+
+    num_proxies = app_settings.NUM_PROXIES
 
     if num_proxies is not None:
         if num_proxies == 0 or xff is None:
-            return remote_addr
+            return _normalize_ip(remote_addr)
 
         addrs = xff.split(',')
         client_addr = addrs[-min(num_proxies, len(addrs))]
-        return client_addr.strip()
+        return _normalize_ip(client_addr.strip())
+
+    return ''.join(xff.split()) if xff else _normalize_ip(remote_addr)
+
+
+def _get_ip_behind_trusted_proxies(xff: typing.Optional[str], remote_addr: typing.Optional[str]) -> str:
+    trusted_proxies = app_settings.TRUSTED_PROXIES_INDEX
+    client_addr = normalize_ip(remote_addr) or remote_addr
+
+    if not xff or client_addr not in trusted_proxies:
+        return client_addr
+
+    for addr in reversed(xff.split(',')):
+        addr = normalize_ip(addr)
+
+        if addr is None:
+            # Everything to the left of garbage can be spoofed.
+            break
+
+        client_addr = addr
+
+        if addr not in trusted_proxies:
+            break
 
-    return ''.join(xff.split()) if xff else remote_addr
+    return client_addr
+
+
+def _normalize_ip(ip: typing.Optional[str]) -> typing.Optional[str]:
+    return normalize_ip(ip) or ip
+
+
+def get_requester_ident(*, username: str, ip: str) -> str:
+    """
+    Identity used by the throttles of `TwoFactorAuth`.
+    IPv6 addresses are aggregated by `IPV6_THROTTLE_PREFIX`.
+    """
+    ip = aggregate_ip(ip, ipv6_prefix=app_settings.IPV6_THROTTLE_PREFIX) if ip else ip
+    return f'{username}-{ip}'
+
+
+def get_ip_rule(ip: typing.Optional[str]) -> typing.Optional[str]:
+    """
+    `networks.ALLOW`, `networks.DENY` or `None` for `ip` by `IP_ALLOWLIST`, `IP_DENYLIST` and `IP_ACCESS_LIST_FILE`.
+    It's an in-process lookup without cache I/O.
+    """
+    ip_access_list = app_settings.IP_ACCESS_LIST
+    return None if ip_access_list is None else ip_access_list.get_rule(ip)
 
 
 class UserAuthSecurity:
     username: str
     user: 'UserModel'
     _rate_throttle: RateThrottle
+    letter_template_name = 'two_factor_auth/letters/many_attempts.txt'
 
     # _failed_attempts_to_reset_password: int = 1_000
 
     def __init__(self, username: str) -> None:
-        UserModel = get_user_model()
-
         self.username = username
-        self.user = UserModel.objects.filter(username=self.username).first()
         self._rate_throttle = RateThrottle(
             scope='user-auth-security',
             condition=RateThrottleCondition(max_attempts=10, duration=datetime.timedelta(hours=2)),
         )
 
+    @cached_property
+    def user(self) -> typing.Optional['UserModel']:
+        # Loaded on the first failed attempt, so successful logins don't query it.
+        UserModel = get_user_model()
+        return UserModel.objects.filter(username=self.username).first()
+
     def add_failed_login_attempt(self, ip: str) -> None:
         if not self.user:
             return
@@ -83,6 +142,14 @@ class UserAuthSecurity:
         status = self._rate_throttle.increase_attempts(self.username)
 
         if status.is_spent_all_attempts:
+            audit.record(
+                'lockout',
+                'locked',
+                username=self.username,
+                user=self.user,
+                ip=ip,
+                scope=self._rate_throttle.scope,
+            )
             self._rate_throttle.reset(self.user)
             self.react_on_failed_attempts(ip=ip)
 
@@ -93,23 +160,30 @@ class UserAuthSecurity:
         if need_to_notify:
             context = self.get_context_for_letter(ip=ip)
             self.send_notification_about_login_attempts(context)
-            cache.set(cache_key, time.time(), datetime.timedelta(minutes=30).total_seconds())
+            cache.set(cache_key, clock.now(), datetime.timedelta(minutes=30).total_seconds())
 
     def send_notification_about_login_attempts(self, context: dict) -> None:
+        from django.core.mail import send_mail
+        from django.template import loader
+
         if not self.user.email:
             return
 
-        message = loader.render_to_string(
-            'two_factor_auth/letters/many_attempts.txt',
-            context=context,
-        )
+        with tracing.stage('render_letter'):
+            message = loader.render_to_string(
+                self.letter_template_name,
+                context=context,
+            )
 
-        send_mail(
-            subject='Too many failed login attempts',
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[self.user.email],
-        )
+        with tracing.stage('send_letter'):
+            send_mail(
+                subject='Too many failed login attempts',
+                message=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[self.user.email],
+            )
+
+        metrics.notification_emails.inc()
 
     def get_context_for_letter(self, *, ip: str) -> dict:
         return {
@@ -137,26 +211,97 @@ class UserDeviceManager:
         self.user = user
 
     def add_device(self, device_id: str) -> None:
-        cache_key = self._cache_key_tpl.format(user_id=self.user.id, device_id=device_id)
-        cache.set(cache_key, time.time(), self._device_ttl.total_seconds())
+        now = clock.now()
+        cache.set(self.get_cache_key(device_id), now, self._device_ttl.total_seconds())
+
+        if app_settings.PERSISTENT_DEVICES:
+            device_store.save(user_id=self.user.pk, device_id=device_id, verified_at=now, last_seen_at=now)
 
     def has_device(self, device_id: str) -> bool:
-        cache_key = self._cache_key_tpl.format(user_id=self.user.id, device_id=device_id)
-        return cache.get(cache_key) is not None
+        return self.check_device(device_id, cached_value=cache.get(self.get_cache_key(device_id)))
+
+    def check_device(self, device_id: str, *, cached_value: typing.Optional[float]) -> bool:
+        """
+        Whether a device is trusted by the value of its cache key.
+        With `PERSISTENT_DEVICES` a cache miss is loaded from the DB (and cached again),
+        and a trusted device gets a new last-seen timestamp.
+        """
+        if not app_settings.PERSISTENT_DEVICES:
+            return cached_value is not None
+
+        now = clock.now()
+        device_ttl = self._device_ttl.total_seconds()
+        verified_at = cached_value
+
+        if verified_at is None:
+            verified_at = device_store.load(user_id=self.user.pk, device_id=device_id, min_verified_at=now - device_ttl)
+
+            if verified_at is None:
+                return False
+
+            cache.set(self.get_cache_key(device_id), verified_at, verified_at + device_ttl - now)
+
+        device_store.save(user_id=self.user.pk, device_id=device_id, verified_at=verified_at, last_seen_at=now)
+        return True
+
+    def get_cache_key(self, device_id: str) -> str:
+        return self._cache_key_tpl.format(user_id=self.user.id, device_id=device_id)
+
+
+_two_factor_type_cache_key_tpl = '2fa-type:{user_id}'
 
 
 def get_two_factor_auth_type(*,
                              user: 'UserModel',
                              device_id: typing.Optional[str] = None) -> typing.Type[BaseTwoFactorAuthType]:
-    user_device_manager = UserDeviceManager(user)
+    """
+    `DirectTwoFactorAuthType` for a trusted device, otherwise the type of the user.
 
-    if not app_settings.IS_ENABLED() or (device_id and user_device_manager.has_device(device_id)):
+    With `TWO_FACTOR_TYPE_CACHE_TTL`, the result of `USER_TWO_FACTOR_TYPE_GETTER` is cached
+    and fetched together with the device in one `cache.get_many()` (`None` results aren't cached).
+    Call `invalidate_two_factor_auth_type()` (or send `signals.two_factor_type_changed`) when it changes.
+    """
+    if not flags.is_enabled():
         return DirectTwoFactorAuthType
 
-    if app_settings.USER_TWO_FACTOR_TYPE_GETTER:
-        return app_settings.USER_TWO_FACTOR_TYPE_GETTER(user=user)
+    getter = app_settings.USER_TWO_FACTOR_TYPE_GETTER
+    cache_ttl = app_settings.TWO_FACTOR_TYPE_CACHE_TTL
+    user_device_manager = UserDeviceManager(user)
+    device_cache_key = user_device_manager.get_cache_key(device_id) if device_id else None
+    type_cache_key = _two_factor_type_cache_key_tpl.format(user_id=user.id) if getter and cache_ttl else None
+    cache_keys = [cache_key for cache_key in (device_cache_key, type_cache_key) if cache_key]
+    cached_values = cache.get_many(cache_keys) if cache_keys else {}
+
+    if device_cache_key:
+        cached_device = cached_values.get(device_cache_key)
+        is_trusted_device = user_device_manager.check_device(device_id, cached_value=cached_device)
+        metrics.trusted_device_checks.inc(result='hit' if is_trusted_device else 'miss')
+
+        if is_trusted_device:
+            return DirectTwoFactorAuthType
+
+    if not getter:
+        return app_settings.DEFAULT_TWO_FACTOR_TYPE
 
-    return app_settings.DEFAULT_TWO_FACTOR_TYPE
+    two_factor_type = app_settings.TWO_FACTOR_TYPES_MAP.get(cached_values.get(type_cache_key))
+
+    if two_factor_type is None:
+        two_factor_type = getter(user=user)
+
+        # Only types from `TWO_FACTOR_TYPES` are cached, because they are stored by name.
+        if (type_cache_key
+                and two_factor_type is not None
+                and app_settings.TWO_FACTOR_TYPES_MAP.get(two_factor_type.type) is two_factor_type):
+            cache.set(type_cache_key, two_factor_type.type, cache_ttl)
+
+    return two_factor_type
+
+
+def invalidate_two_factor_auth_type(user: 'UserModel') -> None:
+    """
+    Forget the cached result of `USER_TWO_FACTOR_TYPE_GETTER` for `user`.
+    """
+    cache.delete(_two_factor_type_cache_key_tpl.format(user_id=user.id))
 
 
 def convert_seconds_to_str(seconds: int, *, only_first: bool = False, round_time: bool = False) -> str:
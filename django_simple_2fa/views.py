@@ -0,0 +1,174 @@
+import typing
+import uuid
+
+from django.contrib.auth import login
+from rest_framework import exceptions, permissions, status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import flags
+from .auth_types import DirectTwoFactorAuthType
+from .base import TwoFactorAuth
+from .dto import TwoFactorRequester
+from .errors import TwoFactorAuthError
+from .serializers import TwoFactorAuthSerializer, TwoFactorAuthVerifySerializer
+from .throttling import ThrottleStatus
+from .utils import get_ip_from_request
+
+
+if typing.TYPE_CHECKING:
+    from django.contrib.auth import get_user_model
+    UserModel = get_user_model()
+
+__all__ = (
+    'TwoFactorAuthLoginView',
+    'TwoFactorAuthObtainView',
+    'TwoFactorAuthStatusView',
+    'TwoFactorAuthVerifyView',
+)
+
+
+class BaseTwoFactorAuthView(APIView):
+    """
+    Subclasses define `perform(two_factor_auth, validated_data)` that returns `(data, throttle_status)`.
+
+    Requests come from anonymous users and end with a session login,
+    so CSRF is checked for every request, not only for authenticated ones as `SessionAuthentication` does.
+    """
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+    serializer_class = TwoFactorAuthSerializer
+
+    def initial(self, request: Request, *args, **kwargs) -> None:
+        super().initial(request, *args, **kwargs)
+        self.enforce_csrf(request)
+
+    def enforce_csrf(self, request: Request) -> None:
+        """
+        Override it with `pass` if `perform_login()` issues a token instead of a session.
+        """
+        check = CSRFCheck(lambda _: None)
+        # Sets `request.META['CSRF_COOKIE']` that is used in `process_view()`.
+        check.process_request(request._request)
+        reason = check.process_view(request._request, None, (), {})
+
+        if reason:
+            raise exceptions.PermissionDenied(f'CSRF Failed: {reason}')
+
+    def post(self, request: Request, *args, **kwargs) -> Response:
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        device_id = serializer.validated_data.get('device_id') or request.COOKIES.get('device_id') or str(uuid.uuid4())
+        two_factor_auth = TwoFactorAuth(TwoFactorRequester(
+            username=serializer.validated_data['username'],
+            password=serializer.validated_data['password'],
+            device_id=device_id,
+            ip=get_ip_from_request(request),
+            request=request._request,
+        ))
+
+        with flags.evaluation_scope():
+            try:
+                data, throttle_status = self.perform(two_factor_auth, serializer.validated_data)
+            except TwoFactorAuthError as e:
+                return self.get_error_response(e)
+
+        data['device_id'] = device_id
+
+        return self.get_response(data, throttle_status)
+
+    def perform_login(self, user: 'UserModel') -> None:
+        """
+        Called after a successful verification. Override it to issue a token instead of a session.
+        """
+        login(self.request._request, user)
+
+    def get_verify_data(self, user: 'UserModel') -> dict:
+        return {
+            'user_id': user.pk,
+        }
+
+    def get_response(self,
+                     data: dict,
+                     throttle_status: typing.Optional[ThrottleStatus],
+                     status_code: int = status.HTTP_200_OK) -> Response:
+        response = Response(data, status=status_code)
+
+        if throttle_status is not None:
+            response['X-RateLimit-Remaining'] = str(throttle_status.remaining_attempts)
+
+            if throttle_status.waiting_time:
+                response['Retry-After'] = str(throttle_status.waiting_time)
+
+        return response
+
+    def get_error_response(self, error: TwoFactorAuthError) -> Response:
+        throttle_status = error.throttle_status
+
+        if throttle_status and not throttle_status.is_allowed:
+            status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        else:
+            status_code = status.HTTP_400_BAD_REQUEST
+
+        return self.get_response({'detail': str(error.reason)}, throttle_status, status_code=status_code)
+
+    def _verify(self,
+                two_factor_auth: TwoFactorAuth,
+                verification_code: typing.Optional[str]) -> typing.Tuple[dict, ThrottleStatus]:
+        result = two_factor_auth.verify(verification_code)
+        self.perform_login(result.user)
+
+        return self.get_verify_data(result.user), result.throttle_status
+
+    @staticmethod
+    def _obtain(two_factor_auth: TwoFactorAuth) -> typing.Tuple[dict, typing.Optional[ThrottleStatus]]:
+        result = two_factor_auth.obtain()
+
+        # `result.verification_code` must never be sent to the client.
+        return {'message': str(result.message)}, result.throttle_status
+
+
+class TwoFactorAuthStatusView(BaseTwoFactorAuthView):
+    def perform(self, two_factor_auth, validated_data):
+        result = two_factor_auth.get_status()
+
+        return {'two_factor_type': result.two_factor_type.type}, result.throttle_status
+
+
+class TwoFactorAuthObtainView(BaseTwoFactorAuthView):
+    def perform(self, two_factor_auth, validated_data):
+        return self._obtain(two_factor_auth)
+
+
+class TwoFactorAuthVerifyView(BaseTwoFactorAuthView):
+    serializer_class = TwoFactorAuthVerifySerializer
+
+    def perform(self, two_factor_auth, validated_data):
+        return self._verify(two_factor_auth, validated_data.get('verification_code'))
+
+
+class TwoFactorAuthLoginView(BaseTwoFactorAuthView):
+    """
+    Status, obtain and verify in one request:
+    a trusted device (or a request with a code) is logged in right away,
+    otherwise a code is sent.
+    """
+    serializer_class = TwoFactorAuthVerifySerializer
+
+    def perform(self, two_factor_auth, validated_data):
+        verification_code = validated_data.get('verification_code')
+        result = two_factor_auth.get_status()
+
+        if verification_code or issubclass(result.two_factor_type, DirectTwoFactorAuthType):
+            data, throttle_status = self._verify(two_factor_auth, verification_code)
+            data['is_verified'] = True
+        else:
+            data, throttle_status = self._obtain(two_factor_auth)
+            data['is_verified'] = False
+
+        data['two_factor_type'] = result.two_factor_type.type
+
+        return data, throttle_status
@@ -52,7 +52,12 @@ setup(
     url='https://github.com/rebotics/django-simple-2fa',
     packages=find_packages(exclude=['*.tests', '*.tests.*', 'tests.*', 'tests']),
     include_package_data=True,
+    python_requires='>=3.10',
     install_requires=requirements,
+    extras_require={
+        'drf': ['djangorestframework>=3.16.0'],
+        'opentelemetry': ['opentelemetry-api>=1.20'],
+    },
     license='MIT',
     zip_safe=False,
     keywords='django-simple-2fa',
@@ -62,7 +67,6 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.9',
         'Programming Language :: Python :: 3.10',
         'Programming Language :: Python :: 3.11',
         'Programming Language :: Python :: 3.12',
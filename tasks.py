@@ -81,6 +81,26 @@ def unittest(c):
     c.run("python manage.py test")
 
 
+@task(help={
+    'output': 'Path of the JSON results',
+    'compare': 'JSON results of a previous run to compare with',
+    'iterations': 'Iterations per scenario',
+})
+def benchmark(c, output='benchmarks/results.json', compare='', iterations=500):
+    """
+    Benchmark TwoFactorAuth hot paths and save results as JSON
+    """
+    command = "python -m benchmarks.flows --iterations {iterations} --output {output}".format(
+        iterations=iterations,
+        output=output,
+    )
+
+    if compare:
+        command += " --compare {compare}".format(compare=compare)
+
+    c.run(command)
+
+
 @task
 def lint(c):
     """
@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from django_simple_2fa.settings import APPSettings, DEFAULTS, IMPORT_STRINGS
+
+
+class AppConfigTest(SimpleTestCase):
+    def setUp(self):
+        self.app_config = apps.get_app_config('django_simple_2fa')
+
+    def test_resolve_settings(self):
+        app_settings = APPSettings({}, DEFAULTS, IMPORT_STRINGS)
+        self.app_config.resolve_settings(app_settings)
+
+        self.assertIn('email', app_settings.TWO_FACTOR_TYPES_MAP)
+
+    def test_resolve_settings_with_typo(self):
+        app_settings = APPSettings(
+            {'USER_AUTH_SECURITY_CLASS': 'django_simple_2fa.utils.UserAuthSecurty'},
+            DEFAULTS,
+            IMPORT_STRINGS,
+        )
+
+        with self.assertRaises(expected_exception=ImproperlyConfigured):
+            self.app_config.resolve_settings(app_settings)
+
+    def test_resolve_settings_with_invalid_throttle(self):
+        app_settings = APPSettings(
+            {'RATE_THROTTLE_FOR_AUTH': 'django_simple_2fa.throttling.RateThrottleCondition'},
+            DEFAULTS,
+            IMPORT_STRINGS,
+        )
+
+        with self.assertRaises(expected_exception=ImproperlyConfigured):
+            self.app_config.resolve_settings(app_settings)
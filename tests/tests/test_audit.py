@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from django_simple_2fa import audit
+from django_simple_2fa.base import TwoFactorAuth
+from django_simple_2fa.dto import TwoFactorRequester
+from django_simple_2fa.errors import TwoFactorAuthError
+from django_simple_2fa.models import AuditLogEntry
+from django_simple_2fa.settings import app_settings
+
+
+UserModel = get_user_model()
+
+
+class ListSink(audit.BaseAuditSink):
+    def __init__(self):
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+
+class BrokenSink(audit.BaseAuditSink):
+    def write(self, events):
+        raise OSError('Disk is full.')
+
+
+@mock.patch.object(app_settings, attribute='AUDIT_FLUSH_INTERVAL', new=None)
+class AuditLogTest(SimpleTestCase):
+    def _get_event(self, outcome='success'):
+        return audit.AuditEvent(timestamp=1_700_000_000.0, event='verify', outcome=outcome, username='john')
+
+    def test_buffer_is_bounded(self):
+        audit_log = audit.AuditLog()
+        sink = ListSink()
+
+        with mock.patch.object(app_settings, attribute='AUDIT_SINKS', new=[sink, BrokenSink()]), \
+                mock.patch.object(app_settings, attribute='AUDIT_BUFFER_SIZE', new=2):
+            for _ in range(3):
+                audit_log.record(self._get_event())
+
+            with self.assertLogs('django_simple_2fa.audit', level='ERROR'):
+                self.assertEqual(audit_log.flush(), 2)
+
+        self.assertEqual(len(sink.events), 2)
+        self.assertEqual(audit_log.stats, {'recorded': 2, 'dropped': 1, 'written': 2, 'failed': 2})
+
+    def test_no_sinks(self):
+        with mock.patch.object(audit.audit_log, attribute='record') as mocked_record:
+            audit.record('verify', 'success', username='john')
+
+        self.assertFalse(mocked_record.called)
+
+    def test_jsonl_rotation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit-{pid}.jsonl')
+            sink = audit.JSONLinesAuditSink(path, max_bytes=300, backup_count=2)
+
+            for outcome in ('success', 'failure', 'blocked', 'denied'):
+                sink.write([self._get_event(outcome)])
+
+            path = path.format(pid=os.getpid())
+
+            with open(path) as f:
+                current = [json.loads(line) for line in f]
+
+            with open(f'{path}.1') as f:
+                previous = [json.loads(line) for line in f]
+
+            filenames = sorted(os.listdir(directory))
+
+        basename = os.path.basename(path)
+        self.assertEqual(filenames, [basename, f'{basename}.1', f'{basename}.2'])
+
+        self.assertEqual([event['outcome'] for event in current], ['denied'])
+        self.assertEqual([event['outcome'] for event in previous], ['blocked'])
+        self.assertEqual(current[0]['timestamp'], '2023-11-14T22:13:20+00:00')
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='AUDIT_SINKS', new=[audit.database_sink])
+@mock.patch.object(app_settings, attribute='AUDIT_FLUSH_INTERVAL', new=None)
+class TwoFactorAuthAuditTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        audit.audit_log.flush()
+        self.username = str(uuid.uuid4())
+        self.password = '123456'
+        self.user = UserModel(username=self.username, email=f'{self.username}@example.com')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    def _get_two_factor_auth(self, password=None):
+        return TwoFactorAuth(TwoFactorRequester(
+            username=self.username,
+            password=password or self.password,
+            device_id='device',
+            ip='127.0.0.1',
+        ))
+
+    def test_events(self):
+        with self.assertRaises(TwoFactorAuthError):
+            self._get_two_factor_auth(password='invalid').get_status()
+
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send'):
+            result = self._get_two_factor_auth().obtain()
+
+        with self.assertRaises(TwoFactorAuthError):
+            self._get_two_factor_auth().verify('invalid')
+
+        self._get_two_factor_auth().verify(result.verification_code)
+
+        # Nothing is written during the flows.
+        self.assertFalse(AuditLogEntry.objects.exists())
+        audit.audit_log.flush()
+
+        entries = list(AuditLogEntry.objects.order_by('id'))
+
+        self.assertEqual(
+            [(entry.event, entry.outcome) for entry in entries],
+            [('authenticate', 'failure'), ('obtain', 'success'), ('verify', 'failure'), ('verify', 'success')],
+        )
+        self.assertEqual(entries[0].user_id, '')
+        self.assertEqual(entries[-1].user_id, str(self.user.pk))
+        self.assertEqual(entries[-1].auth_type, 'email')
+        self.assertEqual(entries[-1].ip, '127.0.0.1')
+        self.assertEqual(entries[-1].device_id, 'device')
+
+    def test_lockout(self):
+        for _ in range(3):
+            with self.assertRaises(TwoFactorAuthError):
+                self._get_two_factor_auth(password='invalid').get_status()
+
+        audit.audit_log.flush()
+
+        entry = AuditLogEntry.objects.get(event='lockout')
+        self.assertEqual(entry.details, {'scope': '2fa-auth'})
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_simple_2fa.cache_backends import SharedMemoryCache
+
+
+def _set_keys(location, prefix):
+    cache = SharedMemoryCache(location, {'OPTIONS': {'CAPACITY': 256, 'STRIPES': 4}})
+
+    for i in range(20):
+        cache.set(f'{prefix}:{i}', [float(i)], 60)
+
+
+class SharedMemoryCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.location = os.path.join(directory.name, 'cache')
+        self.cache = SharedMemoryCache(self.location, {'OPTIONS': {'CAPACITY': 256, 'STRIPES': 4}})
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.set('key', [1.0, 2.0], 60)
+        self.assertEqual(self.cache.get('key'), [1.0, 2.0])
+
+        self.cache.set('key', [3.0], 60)
+        self.assertEqual(self.cache.get('key'), [3.0])
+        self.assertFalse(self.cache.add('key', [4.0]))
+
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', [4.0]))
+
+    def test_get_many(self):
+        self.cache.set_many({'a': 1, 'b': 2}, 60)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+
+    def test_expiration(self):
+        self.cache.set('key', 'value', 60)
+
+        with mock.patch('django_simple_2fa.cache_backends.time.time', return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get('key'))
+
+    def test_full_stripe(self):
+        cache = SharedMemoryCache(f'{self.location}-small', {'OPTIONS': {'CAPACITY': 4, 'STRIPES': 1}})
+
+        for i in range(4):
+            cache.set(f'key:{i}', i, 60 + i)
+
+        with self.assertLogs('django_simple_2fa.cache_backends', level='ERROR'):
+            cache.set('key:4', 4, 60)
+            self.assertFalse(cache.add('key:4', 4, 60))
+
+        # Unexpired entries are kept.
+        self.assertEqual(cache.get_many([f'key:{i}' for i in range(5)]), {f'key:{i}': i for i in range(4)})
+
+        with mock.patch('django_simple_2fa.cache_backends.time.time', return_value=time.time() + 60.5):
+            cache.set('key:4', 4, None)
+
+            self.assertEqual(cache.get('key:4'), 4)
+            self.assertIsNone(cache.get('key:0'))
+            self.assertEqual(cache.get('key:3'), 3)
+
+    def test_large_value(self):
+        with self.assertRaises(expected_exception=ValueError):
+            self.cache.set('key', 'x' * 1000)
+
+    def test_shared_between_processes(self):
+        context = multiprocessing.get_context('spawn')
+        processes = [context.Process(target=_set_keys, args=(self.location, prefix)) for prefix in ('a', 'b')]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
+
+        self.assertEqual(self.cache.get('a:5'), [5.0])
+        self.assertEqual(self.cache.get('b:19'), [19.0])
@@ -0,0 +1,207 @@
+import datetime
+import time
+from unittest import mock
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+
+from django_simple_2fa.caching import CircuitBreaker, ResilientCache, record_cache_ops
+from django_simple_2fa.settings import app_settings
+from django_simple_2fa.throttling import RateThrottle, RateThrottleCondition
+
+
+class FaultInjectingCache(LocMemCache):
+    """
+    Local stand-in for a cache backend that can fail or stall.
+    """
+
+    def __init__(self):
+        super().__init__('fault-injecting', {})
+        self.is_down = False
+        self.delay = 0
+        self.calls = 0
+
+    def _inject_fault(self):
+        self.calls += 1
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        if self.is_down:
+            raise ConnectionError('Cache is down.')
+
+    def get(self, *args, **kwargs):
+        self._inject_fault()
+        return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self._inject_fault()
+        return super().set(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._inject_fault()
+        return super().delete(*args, **kwargs)
+
+
+CIRCUIT_BREAKER_SETTINGS = {
+    'CACHE_CIRCUIT_BREAKER': {
+        'FAILURE_THRESHOLD': 2,
+        'RESET_TIMEOUT': 30,
+        'LATENCY_BUDGET': 0.01,
+    },
+}
+
+
+@override_settings(DJANGO_SIMPLE_2FA=CIRCUIT_BREAKER_SETTINGS)
+class ResilientCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.backend = FaultInjectingCache()
+        self.backend.clear()
+        self.cache = ResilientCache(lambda: self.backend, name='test')
+
+    def test_breaker_opens(self):
+        self.backend.is_down = True
+
+        for _ in range(2):
+            self.assertIsNone(self.cache.get('key'))
+
+        self.assertEqual(self.cache.breaker.state, CircuitBreaker.OPEN)
+
+        self.cache.get('key')
+        self.assertEqual(self.backend.calls, 2)
+
+    def test_slow_operations_open_breaker(self):
+        self.backend.delay = 0.02
+
+        for _ in range(2):
+            self.cache.set('key', 'value')
+
+        self.assertEqual(self.cache.breaker.state, CircuitBreaker.OPEN)
+
+    def test_breaker_recovers(self):
+        self.backend.is_down = True
+
+        for _ in range(2):
+            self.cache.get('key')
+
+        self.backend.is_down = False
+
+        with mock.patch('django_simple_2fa.caching.time.monotonic', return_value=time.monotonic() + 31):
+            self.cache.set('key', 'value')
+
+        self.assertEqual(self.cache.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.backend.get('key'), 'value')
+
+    def test_lockout_survives_outage(self):
+        rate_throttle = RateThrottle(
+            scope='test',
+            condition=RateThrottleCondition(max_attempts=2, duration=datetime.timedelta(minutes=1)),
+        )
+        rate_throttle.cache = self.cache
+
+        self.backend.is_down = True
+
+        with mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True), \
+                mock.patch.object(app_settings, attribute='LOCKOUT_REGISTRY', new=None):
+            for _ in range(2):
+                rate_throttle.increase_attempts('john')
+
+            self.assertFalse(rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+            self.backend.is_down = False
+
+            with mock.patch('django_simple_2fa.caching.time.monotonic', return_value=time.monotonic() + 31):
+                self.assertFalse(rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+        # The lockout was pushed to the backend after recovery.
+        self.assertEqual(len(self.backend.get('rate-throttle:john:test')), 2)
+
+    def test_lockout_with_relative_backend_timeouts(self):
+        # Like `RedisCache`: relative seconds instead of a timestamp.
+        self.backend.get_backend_timeout = lambda timeout=DEFAULT_TIMEOUT: 60 if timeout is DEFAULT_TIMEOUT else timeout
+        rate_throttle = RateThrottle(
+            scope='test',
+            condition=RateThrottleCondition(max_attempts=5, duration=datetime.timedelta(minutes=1)),
+        )
+        rate_throttle.cache = self.cache
+
+        self.backend.is_down = True
+
+        with mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True), \
+                mock.patch.object(app_settings, attribute='LOCKOUT_REGISTRY', new=None):
+            for _ in range(10):
+                rate_throttle.increase_attempts('john')
+
+            throttle_status = rate_throttle.check('john', increase_attempts=False)
+
+        self.assertEqual(throttle_status.num_attempts, 10)
+        self.assertFalse(throttle_status.is_allowed)
+
+        found, _, expires_at = self.cache.local_store.get('rate-throttle:john:test')
+        self.assertTrue(found)
+        self.assertAlmostEqual(expires_at, time.time() + 60, delta=5)
+
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='LOCKOUT_REGISTRY', new=None)
+    def test_throttle_cache_fails_closed(self):
+        rate_throttle = RateThrottle(
+            scope='test',
+            condition=RateThrottleCondition(max_attempts=2, duration=datetime.timedelta(minutes=1)),
+        )
+        rate_throttle.cache = ResilientCache(lambda: self.backend, name='test-throttle', fail_closed=True)
+
+        # Before the outage: john is locked, and jane has one attempt.
+        for _ in range(2):
+            rate_throttle.increase_attempts('john')
+
+        rate_throttle.increase_attempts('jane')
+        self.assertTrue(rate_throttle.check('jane', increase_attempts=False).is_allowed)
+
+        self.backend.is_down = True
+
+        for _ in range(2):
+            self.assertFalse(rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+        self.assertEqual(rate_throttle.cache.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(rate_throttle.check_many(['john'])['john'].is_allowed)
+
+        # Identities that weren't seen are locked as well, and their attempts aren't saved.
+        unknown_status = rate_throttle.check('jack', increase_attempts=False)
+        self.assertFalse(unknown_status.is_allowed)
+        self.assertEqual(unknown_status.waiting_time, 60)
+        self.assertFalse(rate_throttle.increase_attempts('jack').is_allowed)
+        self.assertFalse(rate_throttle.cache.local_store.get('rate-throttle:jack:test')[0])
+
+        # jane continues from her last known history.
+        self.assertTrue(rate_throttle.check('jane', increase_attempts=False).is_allowed)
+        self.assertTrue(rate_throttle.increase_attempts('jane').is_spent_all_attempts)
+        self.assertFalse(rate_throttle.check('jane', increase_attempts=False).is_allowed)
+
+        self.backend.is_down = False
+
+        with mock.patch('django_simple_2fa.caching.time.monotonic', return_value=time.monotonic() + 31):
+            self.assertFalse(rate_throttle.check('jane', increase_attempts=False).is_allowed)
+            self.assertTrue(rate_throttle.check('jack', increase_attempts=False).is_allowed)
+
+        self.assertEqual(len(self.backend.get('rate-throttle:jane:test')), 2)
+
+
+class RecordCacheOpsTest(SimpleTestCase):
+    def test_record(self):
+        cache = ResilientCache(lambda: LocMemCache('record-cache-ops', {}), name='test')
+
+        cache.get('outside')
+
+        with record_cache_ops() as outer_ops:
+            cache.set('key', 'value')
+
+            with record_cache_ops() as inner_ops:
+                cache.get_many(iter(['key', 'other']))
+                cache.delete('key')
+
+        self.assertEqual((outer_ops.gets, outer_ops.sets, outer_ops.deletes, outer_ops.round_trips), (1, 1, 1, 3))
+        self.assertEqual((inner_ops.gets, inner_ops.sets, inner_ops.deletes), (1, 0, 1))
+        self.assertEqual(inner_ops.keys, [('test', 'get_many', 'key'), ('test', 'get_many', 'other'), ('test', 'delete', 'key')])
+        self.assertGreater(outer_ops.bytes_written, 0)
+        self.assertEqual(inner_ops.bytes_written, 0)
@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from django_simple_2fa import flags
+from django_simple_2fa.settings import app_settings
+
+
+class FeatureFlagTest(SimpleTestCase):
+    def setUp(self):
+        flags.invalidate_flags()
+        flags.reset_flag_stats()
+        self.is_enabled = mock.Mock(return_value=True)
+
+    def test_without_caching(self):
+        with mock.patch.object(app_settings, attribute='IS_ENABLED', new=self.is_enabled):
+            self.assertTrue(flags.is_enabled())
+            self.assertTrue(flags.is_enabled())
+
+        self.assertEqual(self.is_enabled.call_count, 2)
+        self.assertEqual(flags.get_flag_stats()['IS_ENABLED.evaluations'], 2)
+
+    def test_evaluation_scope(self):
+        with mock.patch.object(app_settings, attribute='IS_ENABLED', new=self.is_enabled):
+            with flags.evaluation_scope():
+                for _ in range(3):
+                    self.assertTrue(flags.is_enabled())
+
+            self.assertTrue(flags.is_enabled())
+
+        self.assertEqual(self.is_enabled.call_count, 2)
+        self.assertEqual(flags.get_flag_stats()['IS_ENABLED.scope_hits'], 2)
+
+    def test_ttl(self):
+        with mock.patch.object(app_settings, attribute='IS_ENABLED', new=self.is_enabled), \
+                mock.patch.object(app_settings, attribute='FEATURE_FLAGS_TTL', new=60):
+            for _ in range(3):
+                self.assertTrue(flags.is_enabled())
+
+            self.assertEqual(self.is_enabled.call_count, 1)
+
+            with mock.patch('django_simple_2fa.flags.time.monotonic', return_value=10 ** 12):
+                self.assertTrue(flags.is_enabled())
+
+        self.assertEqual(self.is_enabled.call_count, 2)
+
+    def test_replaced_callable(self):
+        with mock.patch.object(app_settings, attribute='FEATURE_FLAGS_TTL', new=60):
+            with mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True):
+                self.assertTrue(flags.is_enabled())
+
+            with mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: False):
+                self.assertFalse(flags.is_enabled())
+
+    def test_invalidation_on_setting_changed(self):
+        with mock.patch.object(app_settings, attribute='IS_ENABLED', new=self.is_enabled), \
+                mock.patch.object(app_settings, attribute='FEATURE_FLAGS_TTL', new=60):
+            flags.is_enabled()
+
+        self.assertIsNotNone(flags.is_enabled._cached)
+
+        with override_settings(DJANGO_SIMPLE_2FA={}):
+            self.assertIsNone(flags.is_enabled._cached)
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+
+
+SNIPPET = '''
+import json
+import sys
+
+import django
+from django.conf import settings
+
+settings.configure(INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes'], DATABASES={})
+django.setup()
+
+before = set(sys.modules)
+import django_simple_2fa.base
+print(json.dumps(sorted(set(sys.modules) - before)))
+'''
+
+
+class ImportBudgetTest(SimpleTestCase):
+    # Cumulative time of `import django_simple_2fa.base` in microseconds.
+    import_time_budget = 100_000
+
+    def test_import_budget(self):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SNIPPET],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        imported_modules = json.loads(result.stdout)
+        foreign_modules = [name for name in imported_modules if not name.startswith('django_simple_2fa')]
+
+        self.assertEqual(foreign_modules, [])
+        self.assertNotIn('rest_framework', imported_modules)
+
+        import_time = next(
+            int(line.split('|')[1])
+            for line in result.stderr.splitlines()
+            if line.split('|')[-1].strip() == 'django_simple_2fa.base'
+        )
+
+        self.assertLess(import_time, self.import_time_budget)
@@ -0,0 +1,118 @@
+import io
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from django_simple_2fa import keyspace
+from django_simple_2fa.cache_backends import SharedMemoryCache
+
+
+UserModel = get_user_model()
+
+
+class KeyspaceScannerTest(SimpleTestCase):
+    def test_locmem(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        for i in range(5):
+            cache.set(f'rate-throttle:{i}:2fa-auth', [1.5], 60)
+
+        cache.set('used-device:1:device', 1.0, None)
+
+        batches = list(keyspace.get_scanner(caches['default']).scan('rate-throttle:', batch_size=2))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(
+            sorted(info.key for batch in batches for info in batch),
+            [f'rate-throttle:{i}:2fa-auth' for i in range(5)],
+        )
+        self.assertTrue(all(info.size > 0 and info.expires_at > time.time() for info in batches[0]))
+
+    def test_shared_memory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        backend = SharedMemoryCache(os.path.join(directory.name, 'cache'), {'OPTIONS': {'CAPACITY': 64, 'STRIPES': 4}})
+        backend.set('rate-throttle:1:2fa-auth', [1.5], 60)
+        backend.set('rate-throttle:2:2fa-auth', [1.5], None)
+        backend.set('2fa-type:1', 'email', 60)
+
+        infos = sorted(
+            (info for batch in keyspace.get_scanner(backend).scan('rate-throttle:', batch_size=10) for info in batch),
+            key=lambda info: info.key,
+        )
+
+        self.assertEqual([info.key for info in infos], ['rate-throttle:1:2fa-auth', 'rate-throttle:2:2fa-auth'])
+        self.assertIsNotNone(infos[0].expires_at)
+        self.assertIsNone(infos[1].expires_at)
+
+    def test_compact_value(self):
+        self.assertEqual(keyspace.compact_value([1.2, 3.0]), [2, 3])
+        self.assertEqual(keyspace.compact_value((2, 1.5, 1, 0.0, 1.5)), (2, 2, 1, 0, 2))
+
+        history = [1, 2]
+        self.assertIs(keyspace.compact_value(history), history)
+
+
+class TwoFactorCacheCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = UserModel.objects.create(username='john')
+
+    def _call_command(self, *args):
+        stdout = io.StringIO()
+        call_command('two_factor_cache', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_report(self):
+        cache.set('rate-throttle:1:2fa-auth', [1.0], 60)
+        cache.set('rate-throttle:2:2fa-auth', [1.0], 60)
+        cache.set('rate-throttle:3:2fa-verify', [1.0], 60)
+        cache.set(f'used-device:{self.user.pk}:device', 1.0, 60)
+
+        output = self._call_command()
+
+        self.assertRegex(output, r'rate-throttle:2fa-auth +2 +\d+ +0 +0')
+        self.assertRegex(output, r'rate-throttle:2fa-verify +1 ')
+        self.assertRegex(output, r'devices +1 ')
+        self.assertRegex(output, r'total +4 ')
+
+    def test_purge(self):
+        cache.set(f'used-device:{self.user.pk}:device', 1.0, 60)
+        cache.set(f'used-device:{self.user.pk + 1}:device', 1.0, 60)
+        cache.set('2fa-type:invalid', 'email', 60)
+
+        with mock.patch('time.time', return_value=time.time() - 120):
+            cache.set('rate-throttle:1:2fa-auth', [1.0], 60)
+
+        output = self._call_command('--purge-expired', '--purge-orphaned', '--dry-run')
+
+        self.assertIn('Would have deleted 3 keys.', output)
+        self.assertIsNotNone(cache.get(f'used-device:{self.user.pk + 1}:device'))
+
+        output = self._call_command('--purge-expired', '--purge-orphaned', '--batch-size', '1')
+
+        self.assertIn('Deleted 3 keys.', output)
+        self.assertIsNotNone(cache.get(f'used-device:{self.user.pk}:device'))
+        self.assertIsNone(cache.get(f'used-device:{self.user.pk + 1}:device'))
+        self.assertIsNone(cache.get('2fa-type:invalid'))
+        self.assertRegex(self._call_command(), r'total +1 ')
+
+    def test_compact(self):
+        cache.set('rate-throttle:1:2fa-auth', [1.5, 2.5], 60)
+        cache.set(f'used-device:{self.user.pk}:device', 1.5, 60)
+
+        output = self._call_command('--compact')
+
+        self.assertIn('Compacted 1 values.', output)
+        self.assertEqual(cache.get('rate-throttle:1:2fa-auth'), [2, 3])
+        self.assertEqual(cache.get(f'used-device:{self.user.pk}:device'), 1.5)
+        self.assertAlmostEqual(cache._expire_info[cache.make_key('rate-throttle:1:2fa-auth')], time.time() + 60, 0)
@@ -0,0 +1,69 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from django_simple_2fa import load_testing
+from django_simple_2fa.settings import app_settings
+
+
+UserModel = get_user_model()
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.config = load_testing.LoadTestConfig(prefix='load-test', password='password', requests=20, seed=1)
+
+    def test_thread_pool(self):
+        users = load_testing.create_users(10, config=self.config, trusted_device_rate=0.5)
+        report = load_testing.run_thread_pool(users, config=self.config, threads=4)
+
+        self.assertEqual(report.workers, 4)
+        self.assertEqual(report.requests, 80)
+        self.assertEqual(sum(report.outcomes.values()), 80)
+        self.assertEqual({kind for kind, _ in report.outcomes}, {'bad_password', 'login', 'stuffing', 'trusted'})
+        self.assertEqual(len(report.latencies['get_status']), 80)
+        self.assertGreater(report.get_percentiles('get_status')[99], 0)
+
+        max_attempts = app_settings.RATE_THROTTLE_FOR_AUTH.condition.max_attempts
+        checks = list(report.contention_checks.values())
+
+        self.assertEqual(len(checks), self.config.contention_rounds)
+        self.assertTrue(all(max_attempts <= count <= 4 * max_attempts for count in checks))
+        self.assertEqual(report.excess_attempts, sum(count - max_attempts for count in checks))
+        self.assertEqual(report.skipped_lockouts, sum(count > max_attempts for count in checks))
+
+        self.assertEqual(load_testing.delete_users(self.config), 10)
+
+    def _call_command(self, *args):
+        stdout = io.StringIO()
+        call_command(
+            'two_factor_load_test',
+            '--users', '5', '--requests', '5', '--processes', '0', '--fast-password-hasher', *args,
+            stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def test_command(self):
+        output = self._call_command('--threads', '2', '--backend', 'locmem')
+
+        self.assertIn('locmem / threads: 2 workers, 10 requests', output)
+        self.assertRegex(output, r'get_status +10 ')
+        self.assertIn('contention: 10 rounds', output)
+        self.assertFalse(UserModel.objects.exists())
+
+    def test_command_db_cache(self):
+        # SQLite of tests locks tables between threads.
+        output = self._call_command('--threads', '1', '--backend', 'db')
+
+        self.assertIn('db / threads: 1 workers, 5 requests', output)
+        self.assertIn('contention: 10 rounds', output)
+        self.assertFalse(UserModel.objects.exists())
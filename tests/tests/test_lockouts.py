@@ -0,0 +1,83 @@
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from django_simple_2fa.admin import AdminSiteWith2FA
+from django_simple_2fa.lockouts import CacheLockoutRegistry
+from django_simple_2fa.settings import app_settings
+from django_simple_2fa.throttling import rate_throttle_for_auth
+
+
+UserModel = get_user_model()
+
+lockout_registry = CacheLockoutRegistry()
+
+
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='LOCKOUT_REGISTRY', new=lockout_registry)
+class LockoutRegistryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.superuser = UserModel.objects.create_superuser(username=str(uuid.uuid4()), password='123456')
+        self.site = AdminSiteWith2FA(name='test_admin')
+
+    def _lock(self, ident):
+        for _ in range(rate_throttle_for_auth.condition.max_attempts):
+            rate_throttle_for_auth.increase_attempts(ident)
+
+    def _get_request(self, method, data=None):
+        request = getattr(RequestFactory(), method)('/admin/lockouts/', data or {})
+        request.user = self.superuser
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return request
+
+    def test_registry(self):
+        self._lock('john-127.0.0.1')
+        rate_throttle_for_auth.increase_attempts('jane-127.0.0.1')
+
+        lockouts = lockout_registry.list()
+
+        self.assertEqual(lockout_registry.count(), 1)
+        self.assertEqual((lockouts[0].scope, lockouts[0].ident), ('2fa-auth', 'john-127.0.0.1'))
+        self.assertGreater(lockouts[0].waiting_time, 0)
+
+        rate_throttle_for_auth.reset('john-127.0.0.1')
+
+        self.assertEqual(lockout_registry.count(), 0)
+
+    @mock.patch.object(CacheLockoutRegistry, attribute='max_entries', new=2)
+    def test_max_entries(self):
+        for ident in ('john-127.0.0.1', 'jane-127.0.0.1', 'jack-127.0.0.1'):
+            self._lock(ident)
+
+        self.assertEqual([lockout.ident for lockout in lockout_registry.list()], ['jane-127.0.0.1', 'jack-127.0.0.1'])
+
+    def test_admin_view(self):
+        self._lock('john-127.0.0.1')
+
+        response = self.site.lockouts_view(self._get_request('get'))
+        response.render()
+
+        self.assertContains(response, 'john-127.0.0.1')
+
+        response = self.site.lockouts_view(self._get_request('post', {'scope': '2fa-auth', 'ident': 'john-127.0.0.1'}))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(lockout_registry.count(), 0)
+        self.assertTrue(rate_throttle_for_auth.get_status('john-127.0.0.1').is_allowed)
+
+    def test_admin_view_without_ident(self):
+        self._lock('john-127.0.0.1')
+        request = self._get_request('post', {'scope': '2fa-auth'})
+
+        response = self.site.lockouts_view(request)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(lockout_registry.count(), 1)
+        self.assertEqual([message.level_tag for message in request._messages], ['error'])
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from django_simple_2fa import metrics
+from django_simple_2fa.base import TwoFactorAuth
+from django_simple_2fa.dto import TwoFactorRequester
+from django_simple_2fa.errors import TwoFactorAuthError
+from django_simple_2fa.settings import app_settings
+
+
+UserModel = get_user_model()
+
+
+@mock.patch.object(app_settings, attribute='METRICS_ENABLED', new=True)
+class MetricsRegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+        self.counter = self.registry.counter('test_total', 'Test "counter".', ('scope',))
+        self.histogram = self.registry.histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1))
+
+    def test_threads(self):
+        def _inc():
+            for _ in range(1000):
+                self.counter.inc(scope='a')
+
+        threads = [threading.Thread(target=_inc) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.counter.inc(2, scope='b')
+
+        self.assertEqual(self.registry.collect()['test_total'], {('a',): 4000, ('b',): 2})
+        # Only the values of the current thread are left.
+        self.assertEqual(len(self.counter._thread_values), 1)
+
+    def test_exposition(self):
+        self.counter.inc(scope='x"y')
+
+        for value in (0.05, 0.5, 5):
+            self.histogram.observe(value)
+
+        self.assertEqual(self.registry.generate_latest(), (
+            '# HELP test_total Test "counter".\n'
+            '# TYPE test_total counter\n'
+            'test_total{scope="x\\"y"} 1.0\n'
+            '# HELP test_seconds Test histogram.\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{le="0.1"} 1\n'
+            'test_seconds_bucket{le="1.0"} 2\n'
+            'test_seconds_bucket{le="+Inf"} 3\n'
+            'test_seconds_sum 5.55\n'
+            'test_seconds_count 3\n'
+        ))
+
+    def test_disabled(self):
+        with mock.patch.object(app_settings, attribute='METRICS_ENABLED', new=False):
+            self.counter.inc(scope='a')
+
+        self.assertEqual(self.registry.collect()['test_total'], {})
+
+    def test_multiprocess(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, '1.json'), 'w') as f:
+                json.dump({'test_total': [[['a'], 5]], 'test_seconds': [[[], [1, 0, 0, 0.05, 1]]]}, f)
+
+            with mock.patch.object(app_settings, attribute='METRICS_MULTIPROCESS_DIR', new=directory):
+                self.counter.inc(scope='a')
+                self.histogram.observe(0.5)
+                collected = self.registry.collect()
+
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+
+        self.assertEqual(collected['test_total'], {('a',): 6})
+        self.assertEqual(collected['test_seconds'], {(): [1, 1, 0, 0.55, 2]})
+
+
+@mock.patch.object(app_settings, attribute='METRICS_ENABLED', new=True)
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class TwoFactorAuthMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.username = str(uuid.uuid4())
+        self.password = '123456'
+        self.user = UserModel(username=self.username, email=f'{self.username}@example.com')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    def _get_two_factor_auth(self):
+        return TwoFactorAuth(TwoFactorRequester(
+            username=self.username,
+            password=self.password,
+            device_id='device',
+            ip='127.0.0.1',
+        ))
+
+    def _collect(self):
+        return metrics.registry.collect()
+
+    def test_flows(self):
+        before = self._collect()
+
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send'):
+            self._get_two_factor_auth().obtain()
+
+        for _ in range(3):
+            with self.assertRaises(TwoFactorAuthError):
+                self._get_two_factor_auth().verify('invalid')
+
+        after = self._collect()
+
+        def _get_delta(name, label_values):
+            return after[name].get(label_values, 0) - before[name].get(label_values, 0)
+
+        self.assertEqual(_get_delta('django_simple_2fa_codes_sent_total', ('email',)), 1)
+        self.assertEqual(_get_delta('django_simple_2fa_verifications_total', ('email', 'failure')), 3)
+        self.assertEqual(_get_delta('django_simple_2fa_lockouts_total', ('2fa-verify',)), 1)
+        self.assertEqual(_get_delta('django_simple_2fa_trusted_device_checks_total', ('miss',)), 4)
+        self.assertEqual(
+            after['django_simple_2fa_flow_duration_seconds'][('verify',)][-1]
+            - before['django_simple_2fa_flow_duration_seconds'].get(('verify',), [0])[-1],
+            3,
+        )
+
+    def test_view(self):
+        response = metrics.metrics_view(RequestFactory().get('/metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn(b'# TYPE django_simple_2fa_lockouts_total counter', response.content)
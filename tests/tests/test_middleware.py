@@ -0,0 +1,44 @@
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from django_simple_2fa.networks import IPAccessList
+from django_simple_2fa.settings import app_settings
+from django_simple_2fa.throttling import rate_throttle_for_auth
+from django_simple_2fa.utils import get_requester_ident
+
+
+@override_settings(MIDDLEWARE=['django_simple_2fa.middleware.ThrottleGateMiddleware', *settings.MIDDLEWARE])
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class ThrottleGateMiddlewareTest(TestCase):
+    def setUp(self):
+        self.username = str(uuid.uuid4())
+        self.ident = get_requester_ident(username=self.username, ip='127.0.0.1')
+        rate_throttle_for_auth.reset(self.ident)
+
+    def test_allowed(self):
+        with mock.patch('django_simple_2fa.dto.authenticate', return_value=None):
+            response = self.client.post('/admin/login/', {'username': self.username, 'password': '123456'})
+
+        self.assertNotEqual(response.status_code, 429)
+
+    def test_blocked(self):
+        for _ in range(rate_throttle_for_auth.condition.max_attempts):
+            rate_throttle_for_auth.increase_attempts(self.ident)
+
+        with mock.patch('django_simple_2fa.dto.authenticate') as mocked_authenticate:
+            response = self.client.post('/admin/login/', {'username': self.username, 'password': '123456'})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertFalse(mocked_authenticate.called)
+
+    @mock.patch.object(app_settings, attribute='IP_ACCESS_LIST', new=IPAccessList(denylist=['127.0.0.0/8']))
+    def test_denied_network(self):
+        with mock.patch('django_simple_2fa.dto.authenticate') as mocked_authenticate:
+            response = self.client.post('/admin/login/', {'username': self.username, 'password': '123456'})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(mocked_authenticate.called)
@@ -0,0 +1,205 @@
+import dataclasses
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from django_simple_2fa.base import TwoFactorAuth
+from django_simple_2fa.clock import VirtualClock, use_clock
+from django_simple_2fa.dto import TwoFactorRequester
+from django_simple_2fa.errors import TwoFactorAuthError
+from django_simple_2fa.settings import app_settings
+from django_simple_2fa.simulation import simulate, synthetic_attempts
+from django_simple_2fa.throttling import (
+    BackoffRateThrottle,
+    RateThrottle,
+    RateThrottleCondition,
+    rate_throttle_for_auth,
+)
+from django_simple_2fa.utils import UserAuthSecurity, get_requester_ident
+
+
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class RateThrottleTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.rate_throttle = RateThrottle(
+            scope='test',
+            condition=RateThrottleCondition(max_attempts=2, duration=datetime.timedelta(minutes=1)),
+        )
+
+    def test_check_many(self):
+        for _ in range(2):
+            self.rate_throttle.increase_attempts('locked')
+
+        self.rate_throttle.increase_attempts('used')
+
+        with mock.patch.object(RateThrottle, attribute='cache', new=mock.Mock(wraps=cache)) as mocked_cache:
+            statuses = self.rate_throttle.check_many(['locked', 'used', 'new'])
+
+        self.assertEqual(mocked_cache.get_many.call_count, 1)
+        self.assertFalse(mocked_cache.set.called)
+
+        self.assertFalse(statuses['locked'].is_allowed)
+        self.assertTrue(statuses['used'].is_allowed)
+        self.assertEqual(statuses['used'].remaining_attempts, 1)
+        self.assertTrue(statuses['new'].is_allowed)
+        self.assertEqual(statuses['new'].locking_time, 0)
+
+    def test_bulk_status(self):
+        ident = get_requester_ident(username='john', ip='127.0.0.1')
+
+        for _ in range(rate_throttle_for_auth.condition.max_attempts):
+            rate_throttle_for_auth.increase_attempts(ident)
+
+        statuses = TwoFactorAuth.bulk_status(['john', 'jane'], ['127.0.0.1', '10.0.0.1'])
+
+        self.assertEqual(len(statuses), 4)
+        self.assertFalse(statuses[('john', '127.0.0.1')]['2fa-auth'].is_allowed)
+        self.assertTrue(statuses[('john', '10.0.0.1')]['2fa-auth'].is_allowed)
+        self.assertTrue(statuses[('jane', '127.0.0.1')]['2fa-verify'].is_allowed)
+
+    @mock.patch.object(UserAuthSecurity, attribute='user', new=None)
+    def test_concurrent_failed_logins(self):
+        num_requests = 10
+        rate_throttle = RateThrottle(
+            scope='test-concurrent',
+            condition=RateThrottleCondition(max_attempts=20, duration=datetime.timedelta(minutes=1)),
+        )
+        # Every request reads its throttle status before any of them fails the password check.
+        barrier = threading.Barrier(num_requests, timeout=10)
+
+        def _authenticate(**kwargs):
+            barrier.wait()
+
+        def _get_status(_):
+            with self.assertRaises(expected_exception=TwoFactorAuthError):
+                TwoFactorAuth(TwoFactorRequester(username='john', password='wrong', ip='127.0.0.1')).get_status()
+
+        with mock.patch.object(app_settings, attribute='RATE_THROTTLE_FOR_AUTH', new=rate_throttle), \
+                mock.patch('django_simple_2fa.dto.authenticate', new=_authenticate):
+            with ThreadPoolExecutor(max_workers=num_requests) as executor:
+                list(executor.map(_get_status, range(num_requests)))
+
+        ident = get_requester_ident(username='john', ip='127.0.0.1')
+        self.assertEqual(rate_throttle.get_status(ident).num_attempts, num_requests)
+
+    def test_status_is_immutable(self):
+        for _ in range(2):
+            self.rate_throttle.increase_attempts('john')
+
+        throttle_status = self.rate_throttle.check('john', increase_attempts=False)
+
+        self.assertEqual(throttle_status.num_attempts, 2)
+        self.assertEqual(throttle_status.locking_time, 60)
+        self.assertEqual(throttle_status.waiting_time, 60)
+
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            throttle_status.is_allowed = True
+
+        with mock.patch('django_simple_2fa.utils.convert_seconds_to_str', return_value='1 minute') as mocked_convert:
+            self.assertEqual(throttle_status.str_waiting_time, '1 minute')
+            self.assertEqual(throttle_status.str_waiting_time, '1 minute')
+
+            error = TwoFactorAuthError(throttle_status=throttle_status)
+            self.assertEqual(mocked_convert.call_count, 1)
+
+        self.assertIn('1 minute', str(error))
+
+
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class BackoffRateThrottleTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = VirtualClock(start=1_000_000.0)
+        self.rate_throttle = BackoffRateThrottle(
+            scope='test-backoff',
+            condition=RateThrottleCondition(max_attempts=2, duration=datetime.timedelta(minutes=1)),
+            max_duration=datetime.timedelta(minutes=3),
+            decay=datetime.timedelta(hours=1),
+        )
+        self.rate_throttle.timer = self.clock.time
+
+    def _lock(self):
+        statuses = [self.rate_throttle.increase_attempts('john') for _ in range(2)]
+        self.assertFalse(self.rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+        return statuses[-1]
+
+    def test_lock_duration_doubles(self):
+        waiting_times = []
+
+        for _ in range(4):
+            throttle_status = self._lock()
+            self.assertTrue(throttle_status.is_spent_all_attempts)
+            waiting_times.append(throttle_status.waiting_time)
+            self.clock.advance(throttle_status.waiting_time)
+
+        self.assertEqual(waiting_times, [60, 120, 180, 180])
+
+    def test_last_attempt(self):
+        throttle_status = self.rate_throttle.increase_attempts('john')
+
+        self.assertEqual(throttle_status.remaining_attempts, 1)
+        self.assertEqual(throttle_status.locking_time, 60)
+
+    def test_decay(self):
+        self.clock.advance(self._lock().waiting_time)
+        self.clock.advance(self._lock().waiting_time)
+        self.clock.advance(datetime.timedelta(hours=1).total_seconds())
+
+        self.assertEqual(self._lock().waiting_time, 120)
+
+    def test_check_many_uses_timer(self):
+        self._lock()
+        self.clock.advance(30)
+
+        throttle_status = self.rate_throttle.check_many(['john'])['john']
+
+        self.assertEqual(throttle_status, self.rate_throttle.get_status('john'))
+        self.assertEqual(throttle_status.waiting_time, 30)
+
+    def test_read_only_check_does_not_write(self):
+        with mock.patch.object(RateThrottle, attribute='cache', new=mock.Mock(wraps=cache)) as mocked_cache:
+            self.rate_throttle.check('john', increase_attempts=False)
+
+        self.assertFalse(mocked_cache.set.called)
+
+
+class SimulationTest(SimpleTestCase):
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    def test_clock(self):
+        virtual_clock = VirtualClock(start=1_000_000.0)
+        rate_throttle = RateThrottle(
+            scope='test-clock',
+            condition=RateThrottleCondition(max_attempts=1, duration=datetime.timedelta(minutes=1)),
+        )
+
+        with use_clock(virtual_clock):
+            rate_throttle.increase_attempts('john')
+            self.assertFalse(rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+            virtual_clock.advance(60)
+            self.assertTrue(rate_throttle.check('john', increase_attempts=False).is_allowed)
+
+    def test_simulate(self):
+        attempts = list(synthetic_attempts(duration=3_600, users=100, logins_per_user=240, attack_rate=1,
+                                           attack_usernames=5, attack_ips=1))
+
+        self.assertEqual(attempts, sorted(attempts, key=lambda attempt: attempt.timestamp))
+
+        with mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: False):
+            report = simulate(rate_throttle_for_auth, attempts)
+
+        self.assertEqual(report.attempts, len(attempts))
+        self.assertGreater(report.attack_block_rate, 0.9)
+        self.assertEqual(report.false_lockouts, 0)
+        self.assertGreater(report.peak_keys, 0)
+        self.assertGreater(report.peak_bytes, 0)
+        self.assertAlmostEqual(report.virtual_seconds, 3_600, delta=60)
+
+        # Nothing is written to the real cache.
+        self.assertTrue(rate_throttle_for_auth.get_status('user-0-100.64.0.0').is_allowed)
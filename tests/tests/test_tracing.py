@@ -0,0 +1,91 @@
+import socket
+import uuid
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from django_simple_2fa import tracing
+from django_simple_2fa.base import TwoFactorAuth
+from django_simple_2fa.dto import TwoFactorRequester
+from django_simple_2fa.errors import TwoFactorAuthError
+from django_simple_2fa.settings import app_settings
+
+
+UserModel = get_user_model()
+
+
+class ListSink(tracing.BaseTraceSink):
+    def __init__(self):
+        self.traces = []
+
+    def emit(self, trace):
+        self.traces.append(trace)
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class TracingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.username = str(uuid.uuid4())
+        self.password = '123456'
+        self.user = UserModel(username=self.username, email=f'{self.username}@example.com')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    def _get_two_factor_auth(self, password=None):
+        return TwoFactorAuth(TwoFactorRequester(
+            username=self.username,
+            password=password or self.password,
+            device_id='device',
+            ip='127.0.0.1',
+        ))
+
+    def test_disabled(self):
+        self.assertIs(tracing.trace('verify'), tracing.stage('throttle'))
+
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send'):
+            result = self._get_two_factor_auth().obtain()
+
+        self.assertIsNone(result.timings)
+
+    @mock.patch.object(app_settings, attribute='TRACING_ATTACH_TIMINGS', new=True)
+    def test_attach_timings(self):
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send'):
+            result = self._get_two_factor_auth().obtain()
+
+        self.assertTrue({'throttle', 'authenticate', 'obtain_code', 'render_letter', 'send_letter'} < set(result.timings))
+        self.assertGreaterEqual(result.timings['total'], result.timings['obtain_code'])
+
+        result = self._get_two_factor_auth().verify(result.verification_code)
+        self.assertTrue({'throttle', 'verify_code', 'add_device', 'total'} < set(result.timings))
+
+    def test_sinks(self):
+        sink = ListSink()
+
+        with mock.patch.object(app_settings, attribute='TRACING_SINKS', new=[sink, tracing.LoggingSink()]):
+            with self.assertLogs('django_simple_2fa.tracing', level='INFO') as logs:
+                with self.assertRaises(TwoFactorAuthError):
+                    self._get_two_factor_auth(password='invalid').get_status()
+
+        trace, = sink.traces
+        self.assertEqual(trace.name, 'get_status')
+        self.assertIsInstance(trace.error, TwoFactorAuthError)
+        self.assertIn('user_auth_security', trace.timings)
+        self.assertIn('2fa get_status', logs.output[0])
+
+    def test_statsd_sink(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(('127.0.0.1', 0))
+            server.settimeout(5)
+            sink = tracing.StatsdSink(host='127.0.0.1', port=server.getsockname()[1], prefix='2fa')
+
+            with mock.patch.object(app_settings, attribute='TRACING_SINKS', new=[sink]):
+                self._get_two_factor_auth().get_status()
+
+            lines = server.recv(65535).decode().splitlines()
+
+        self.assertTrue(any(line.startswith('2fa.get_status.total:') and line.endswith('|ms') for line in lines))
+        self.assertTrue(any(line.startswith('2fa.get_status.authenticate:') for line in lines))
@@ -7,17 +7,22 @@ from django.core.mail import EmailMultiAlternatives
 from django.http import HttpRequest
 from rest_framework.test import APITestCase
 
-from django_simple_2fa.auth_types import DirectTwoFactorAuthType
+from django_simple_2fa.auth_types import DirectTwoFactorAuthType, RecoveryCodesTwoFactorAuthType
 from django_simple_2fa.base import TwoFactorAuth
 from django_simple_2fa.dto import TwoFactorRequester
 from django_simple_2fa.errors import TwoFactorAuthError
+from django_simple_2fa.models import RecoveryCodes
+from django_simple_2fa.networks import IPAccessList
 from django_simple_2fa.settings import app_settings
+from django_simple_2fa.testing import CacheOpsTestMixin
+from django_simple_2fa.throttling import RateThrottle
+from django_simple_2fa.utils import get_requester_ident
 
 
 UserModel = get_user_model()
 
 
-class TwoFactorAuthView(APITestCase):
+class TwoFactorAuthView(CacheOpsTestMixin, APITestCase):
     def setUp(self):
         self.username = str(uuid.uuid4())
         self.password = '123456'
@@ -186,3 +191,188 @@ class TwoFactorAuthView(APITestCase):
         )).verify('')
 
         self.assertEqual(response.user, self.user)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: False)
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    def test_throttle_keys_are_read_once(self):
+        cache.clear()
+
+        two_factor_auth = TwoFactorAuth(TwoFactorRequester(
+            username=self.username,
+            password=self.password,
+            device_id=self.device_id,
+            ip='127.0.0.1',
+            request=self.request,
+        ))
+
+        with mock.patch.object(RateThrottle, attribute='cache', new=mock.Mock(wraps=cache)) as mocked_cache:
+            two_factor_auth.get_status()
+            two_factor_auth.verify('')
+
+        read_keys = [call.args[0] for call in mocked_cache.get.call_args_list]
+        self.assertEqual(len(read_keys), len(set(read_keys)))
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='IP_ACCESS_LIST', new=IPAccessList(denylist=['203.0.113.0/24']))
+    def test_denied_network(self):
+        with mock.patch.object(RateThrottle, attribute='cache') as mocked_cache:
+            with self.assertRaises(expected_exception=TwoFactorAuthError):
+                TwoFactorAuth(TwoFactorRequester(
+                    username=self.username,
+                    password=self.password,
+                    device_id=self.device_id,
+                    ip='203.0.113.7',
+                    request=self.request,
+                )).get_status()
+
+        self.assertFalse(mocked_cache.method_calls)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='IP_ACCESS_LIST', new=IPAccessList(allowlist=['10.0.0.0/8']))
+    def test_allowed_network(self):
+        cache.clear()
+        username = str(uuid.uuid4())
+
+        for _ in range(5):
+            with self.assertRaises(expected_exception=TwoFactorAuthError) as e:
+                TwoFactorAuth(TwoFactorRequester(
+                    username=username,
+                    password=self.password,
+                    device_id=self.device_id,
+                    ip='10.1.2.3',
+                    request=self.request,
+                )).get_status()
+
+            self.assertTrue(e.exception.throttle_status.is_allowed)
+
+        ident = get_requester_ident(username=username, ip='10.1.2.3')
+        self.assertFalse(app_settings.RATE_THROTTLE_FOR_AUTH.get_status(ident).num_attempts)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='IP_ACCESS_LIST', new=IPAccessList(allowlist=['10.0.0.0/8']))
+    def test_allowed_network_verify_is_throttled(self):
+        cache.clear()
+        max_attempts = app_settings.RATE_THROTTLE_FOR_VERIFY.condition.max_attempts
+
+        for _ in range(max_attempts + 1):
+            with self.assertRaises(expected_exception=TwoFactorAuthError) as e:
+                TwoFactorAuth(TwoFactorRequester(
+                    username=self.username,
+                    password=self.password,
+                    device_id=self.device_id,
+                    ip='10.1.2.3',
+                    request=self.request,
+                )).verify('000000')
+
+        self.assertFalse(e.exception.throttle_status.is_allowed)
+
+        ident = get_requester_ident(username=self.username, ip='10.1.2.3')
+        self.assertEqual(app_settings.RATE_THROTTLE_FOR_VERIFY.get_status(ident).num_attempts, max_attempts)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    @mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+    def test_cache_budgets(self):
+        cache.clear()
+
+        def _get_two_factor_auth():
+            return TwoFactorAuth(TwoFactorRequester(
+                username=self.username,
+                password=self.password,
+                device_id=self.device_id,
+                ip='127.0.0.1',
+                request=self.request,
+            ))
+
+        with self.assertCacheOps(max_gets=2, max_sets=0, max_deletes=0):
+            _get_two_factor_auth().get_status()
+
+        with mock.patch.object(EmailMultiAlternatives, 'send'):
+            with self.assertCacheOps(max_gets=3, max_sets=2, max_deletes=1):
+                result = _get_two_factor_auth().obtain()
+
+        with self.assertCacheOps(max_gets=4, max_sets=1, max_deletes=1):
+            _get_two_factor_auth().verify(result.verification_code)
+
+        # Trusted device
+        with self.assertCacheOps(max_gets=2, max_sets=0, max_deletes=0):
+            _get_two_factor_auth().get_status()
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='DEFAULT_TWO_FACTOR_TYPE', new=RecoveryCodesTwoFactorAuthType)
+class RecoveryCodesTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.username = str(uuid.uuid4())
+        self.password = '123456'
+        self.user = UserModel(username=self.username, email=f'{self.username}@gmail.com')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    def _get_two_factor_auth(self):
+        return TwoFactorAuth(TwoFactorRequester(
+            username=self.username,
+            password=self.password,
+            device_id=str(uuid.uuid4()),
+            ip='127.0.0.1',
+        ))
+
+    def test_verify(self):
+        with self.assertRaises(TwoFactorAuthError):
+            self._get_two_factor_auth().obtain()
+
+        codes = RecoveryCodesTwoFactorAuthType.generate(user=self.user, count=3)
+
+        self.assertEqual(len(set(codes)), 3)
+        self.assertRegex(codes[0], r'^[0-9A-Z]{5}-[0-9A-Z]{5}$')
+        self.assertEqual(len(RecoveryCodes.objects.get(user=self.user).hashes), 3 * 16)
+        self.assertEqual(self._get_two_factor_auth().obtain().verification_code, '')
+
+        result = self._get_two_factor_auth().verify(codes[1].lower().replace('-', ' '))
+        self.assertEqual(result.user, self.user)
+        self.assertEqual(RecoveryCodesTwoFactorAuthType.count_remaining(user=self.user), 2)
+
+        # Codes are used once.
+        with self.assertRaises(TwoFactorAuthError):
+            self._get_two_factor_auth().verify(codes[1])
+
+        self._get_two_factor_auth().verify(codes[0])
+
+        # New codes replace the old ones.
+        new_codes = RecoveryCodesTwoFactorAuthType.generate(user=self.user)
+
+        self.assertEqual(RecoveryCodesTwoFactorAuthType.count_remaining(user=self.user), 10)
+        self.assertFalse(RecoveryCodesTwoFactorAuthType.is_valid(user=self.user, verification_code=codes[2]))
+        self.assertTrue(RecoveryCodesTwoFactorAuthType.is_valid(user=self.user, verification_code=new_codes[0]))
+
+    def test_lockout_keeps_codes(self):
+        codes = RecoveryCodesTwoFactorAuthType.generate(user=self.user, count=2)
+
+        for _ in range(app_settings.RATE_THROTTLE_FOR_VERIFY.condition.max_attempts):
+            with self.assertRaises(TwoFactorAuthError):
+                self._get_two_factor_auth().verify('00000-00000')
+
+        with self.assertRaises(TwoFactorAuthError) as context:
+            self._get_two_factor_auth().verify(codes[0])
+
+        self.assertFalse(context.exception.throttle_status.is_allowed)
+        self.assertIn('locked', str(context.exception))
+        self.assertEqual(RecoveryCodesTwoFactorAuthType.count_remaining(user=self.user), 2)
+
+    def test_obtain_keeps_attempts(self):
+        RecoveryCodesTwoFactorAuthType.generate(user=self.user, count=2)
+
+        for _ in range(app_settings.RATE_THROTTLE_FOR_VERIFY.condition.max_attempts):
+            self._get_two_factor_auth().obtain()
+
+            with self.assertRaises(TwoFactorAuthError):
+                self._get_two_factor_auth().verify('00000-00000')
+
+        with self.assertRaises(TwoFactorAuthError) as context:
+            self._get_two_factor_auth().verify('00000-00000')
+
+        self.assertFalse(context.exception.throttle_status.is_allowed)
@@ -1,9 +1,30 @@
 import datetime
+import os
+import tempfile
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpRequest
+from django.test import SimpleTestCase, TestCase, override_settings
 from rest_framework.test import APITestCase
 
-from django_simple_2fa.utils import convert_seconds_to_str, get_encoded_email
+from django_simple_2fa.auth_types import DirectTwoFactorAuthType, EmailTwoFactorAuthType
+from django_simple_2fa.caching import cache
+from django_simple_2fa.clock import VirtualClock, use_clock
+from django_simple_2fa.models import TrustedDevice
+from django_simple_2fa.networks import ALLOW, DENY, IPAccessList, NetworkIndex, normalize_ip
+from django_simple_2fa.persistence import device_store, get_user_two_factor_type, set_user_two_factor_type
+from django_simple_2fa.settings import app_settings
+from django_simple_2fa.signals import two_factor_type_changed
+from django_simple_2fa.utils import (
+    UserDeviceManager,
+    convert_seconds_to_str,
+    get_encoded_email,
+    get_ip_from_request,
+    get_requester_ident,
+    get_two_factor_auth_type,
+)
 
 
 UserModel = get_user_model()
@@ -61,3 +82,229 @@ class TwoFactorAuthView(APITestCase):
 
         for param, expected_value in zip(params, expected_values_for_round):
             self.assertEqual(convert_seconds_to_str(int(param), round_time=True), expected_value)
+
+
+class ClientIPTest(SimpleTestCase):
+    def _get_request(self, remote_addr, xff=None):
+        request = HttpRequest()
+        request.META['REMOTE_ADDR'] = remote_addr
+
+        if xff is not None:
+            request.META['HTTP_X_FORWARDED_FOR'] = xff
+
+        return request
+
+    def test_normalize_ip(self):
+        values = (
+            ('192.0.2.1', '192.0.2.1'),
+            (' 192.0.2.1:443 ', '192.0.2.1'),
+            ('2001:DB8:0:0::1', '2001:db8::1'),
+            ('[2001:db8::1]:443', '2001:db8::1'),
+            ('::ffff:192.0.2.1', '192.0.2.1'),
+            ('fe80::1%eth0', 'fe80::1'),
+            ('unknown', None),
+        )
+
+        for value, expected_value in values:
+            self.assertEqual(normalize_ip(value), expected_value)
+
+    def test_network_index(self):
+        index = NetworkIndex(['10.0.0.0/8', '2001:db8::/32'])
+        index.add('10.1.0.0/16', value='vpn')
+
+        self.assertIn('10.2.3.4', index)
+        self.assertIn('2001:db8::1', index)
+        self.assertNotIn('192.0.2.1', index)
+        self.assertEqual(index.lookup('10.1.2.3')[1], 'vpn')
+        self.assertEqual(str(index.lookup('10.2.3.4')[0]), '10.0.0.0/8')
+
+    @override_settings(DJANGO_SIMPLE_2FA={'TRUSTED_PROXIES': ('10.0.0.0/8',)})
+    def test_trusted_proxies(self):
+        values = (
+            (('10.0.0.1', '203.0.113.9, 198.51.100.1, 10.0.0.2'), '198.51.100.1'),
+            (('10.0.0.1', '203.0.113.9, [2001:DB8::1]:80'), '2001:db8::1'),
+            (('10.0.0.1', '10.0.0.3, 10.0.0.2'), '10.0.0.3'),
+            (('198.51.100.7', '203.0.113.9'), '198.51.100.7'),
+            (('10.0.0.1', None), '10.0.0.1'),
+        )
+
+        for args, expected_value in values:
+            self.assertEqual(get_ip_from_request(self._get_request(*args)), expected_value)
+
+    @override_settings(DJANGO_SIMPLE_2FA={'NUM_PROXIES': 1})
+    def test_num_proxies(self):
+        self.assertEqual(get_ip_from_request(self._get_request('10.0.0.1', '203.0.113.9, 2001:DB8::1')), '2001:db8::1')
+
+    @override_settings(DJANGO_SIMPLE_2FA={'IPV6_THROTTLE_PREFIX': 64})
+    def test_requester_ident_with_ipv6(self):
+        self.assertEqual(
+            get_requester_ident(username='john', ip='2001:db8::1'),
+            get_requester_ident(username='john', ip='2001:db8::ffff'),
+        )
+        self.assertEqual(get_requester_ident(username='john', ip='192.0.2.1'), 'john-192.0.2.1')
+
+    def test_ip_access_list(self):
+        ip_access_list = IPAccessList(['10.1.0.0/16', '192.0.2.1/32'], ['10.0.0.0/8', '192.0.2.1/32'])
+
+        self.assertEqual(ip_access_list.get_rule('10.1.2.3'), ALLOW)
+        self.assertEqual(ip_access_list.get_rule('10.2.3.4'), DENY)
+        self.assertEqual(ip_access_list.get_rule('192.0.2.1'), DENY)
+        self.assertIsNone(ip_access_list.get_rule('198.51.100.1'))
+        self.assertIsNone(ip_access_list.get_rule(''))
+
+    def test_ip_access_list_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'ip-access-list')
+
+            with open(path, 'w') as f:
+                f.write('# VPN\nallow 10.0.0.0/8\n\ndeny 203.0.113.0/24  # scanners\n')
+
+            ip_access_list = IPAccessList(denylist=['198.51.100.0/24'], path=path, check_interval=0)
+            self.assertEqual(ip_access_list.get_rule('10.1.2.3'), ALLOW)
+            self.assertEqual(ip_access_list.get_rule('203.0.113.7'), DENY)
+            self.assertEqual(ip_access_list.get_rule('198.51.100.7'), DENY)
+
+            with open(path, 'w') as f:
+                f.write('deny 10.0.0.0/8\n')
+
+            os.utime(path, ns=(0, 0))
+            self.assertEqual(ip_access_list.get_rule('10.1.2.3'), DENY)
+            self.assertIsNone(ip_access_list.get_rule('203.0.113.7'))
+
+            # An invalid file doesn't replace the previous rules.
+            with open(path, 'w') as f:
+                f.write('deny 10.0.0.0/33\n')
+
+            os.utime(path, ns=(1, 1))
+
+            with self.assertLogs('django_simple_2fa.networks', level='WARNING'):
+                self.assertEqual(ip_access_list.get_rule('10.1.2.3'), DENY)
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+class TwoFactorTypeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserModel.objects.create(username='john', email='john@example.com')
+        self.getter = mock.Mock(return_value=EmailTwoFactorAuthType)
+        patcher = mock.patch.object(app_settings, attribute='USER_TWO_FACTOR_TYPE_GETTER', new=self.getter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(app_settings, attribute='TWO_FACTOR_TYPE_CACHE_TTL', new=300)
+    def test_cached(self):
+        with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as mocked_get_many:
+            for _ in range(3):
+                two_factor_type = get_two_factor_auth_type(user=self.user, device_id='device')
+                self.assertIs(two_factor_type, EmailTwoFactorAuthType)
+
+        self.assertEqual(self.getter.call_count, 1)
+        self.assertEqual(mocked_get_many.call_count, 3)
+
+        two_factor_type_changed.send(sender=UserModel, user=self.user)
+        get_two_factor_auth_type(user=self.user, device_id='device')
+
+        self.assertEqual(self.getter.call_count, 2)
+
+    def test_trusted_device(self):
+        UserDeviceManager(self.user).add_device('device')
+
+        self.assertIs(get_two_factor_auth_type(user=self.user, device_id='device'), DirectTwoFactorAuthType)
+        self.assertFalse(self.getter.called)
+
+    def test_without_cache(self):
+        for _ in range(2):
+            get_two_factor_auth_type(user=self.user)
+
+        self.assertEqual(self.getter.call_count, 2)
+
+    @mock.patch.object(app_settings, attribute='TWO_FACTOR_TYPE_CACHE_TTL', new=300)
+    def test_getter_returns_none(self):
+        self.getter.return_value = None
+
+        for _ in range(2):
+            self.assertIsNone(get_two_factor_auth_type(user=self.user))
+
+        self.assertEqual(self.getter.call_count, 2)
+
+
+@mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+@mock.patch.object(app_settings, attribute='PERSISTENT_DEVICES', new=True)
+@mock.patch.object(app_settings, attribute='DEVICE_WRITE_INTERVAL', new=None)
+class PersistentDevicesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        device_store.flush()
+        self.user = UserModel.objects.create(username='john', email='john@example.com')
+        self.user_device_manager = UserDeviceManager(self.user)
+
+    def test_read_through(self):
+        self.user_device_manager.add_device('device')
+
+        # Written in a batch.
+        self.assertFalse(TrustedDevice.objects.exists())
+        self.assertEqual(device_store.flush(), 1)
+
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            self.assertIs(get_two_factor_auth_type(user=self.user, device_id='device'), DirectTwoFactorAuthType)
+
+        # Cached again.
+        with self.assertNumQueries(0):
+            self.assertTrue(self.user_device_manager.has_device('device'))
+
+        self.assertFalse(self.user_device_manager.has_device('other-device'))
+
+    def test_upsert_without_conflict_target(self):
+        self.user_device_manager.add_device('device')
+
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', new=False), \
+                mock.patch.object(TrustedDevice.objects, 'bulk_create') as mocked_bulk_create:
+            self.assertEqual(device_store.flush(), 1)
+
+        self.assertTrue(mocked_bulk_create.call_args.kwargs['update_conflicts'])
+        self.assertIsNone(mocked_bulk_create.call_args.kwargs['unique_fields'])
+
+    def test_last_seen(self):
+        virtual_clock = VirtualClock(start=1_700_000_000.0)
+
+        with use_clock(virtual_clock):
+            self.user_device_manager.add_device('device')
+            device_store.flush()
+
+            for _ in range(3):
+                virtual_clock.advance(60)
+                self.assertTrue(self.user_device_manager.has_device('device'))
+
+            # Merged into one row.
+            with self.assertNumQueries(1):
+                self.assertEqual(device_store.flush(), 1)
+
+        trusted_device = TrustedDevice.objects.get()
+        self.assertEqual(trusted_device.verified_at.timestamp(), 1_700_000_000)
+        self.assertEqual(trusted_device.last_seen_at.timestamp(), 1_700_000_180)
+
+    def test_expired(self):
+        virtual_clock = VirtualClock(start=1_700_000_000.0)
+
+        with use_clock(virtual_clock):
+            self.user_device_manager.add_device('device')
+            device_store.flush()
+            cache.clear()
+            virtual_clock.advance(datetime.timedelta(weeks=4).total_seconds())
+
+            self.assertFalse(self.user_device_manager.has_device('device'))
+
+    @mock.patch.object(app_settings, attribute='TWO_FACTOR_TYPE_CACHE_TTL', new=300)
+    def test_user_two_factor_type(self):
+        with mock.patch.object(app_settings, attribute='USER_TWO_FACTOR_TYPE_GETTER', new=get_user_two_factor_type):
+            self.assertIs(get_two_factor_auth_type(user=self.user), app_settings.DEFAULT_TWO_FACTOR_TYPE)
+
+            set_user_two_factor_type(user=self.user, two_factor_type=DirectTwoFactorAuthType)
+
+            with self.assertNumQueries(1):
+                self.assertIs(get_two_factor_auth_type(user=self.user), DirectTwoFactorAuthType)
+
+            with self.assertNumQueries(0):
+                self.assertIs(get_two_factor_auth_type(user=self.user), DirectTwoFactorAuthType)
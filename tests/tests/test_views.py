@@ -0,0 +1,103 @@
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from rest_framework.test import APIClient, APITestCase
+
+from django_simple_2fa.settings import app_settings
+
+
+UserModel = get_user_model()
+
+
+@mock.patch.object(app_settings, attribute='THROTTLING_IS_ENABLED', new=lambda: True)
+class TwoFactorAuthViewsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.username = str(uuid.uuid4())
+        self.password = '123456'
+        self.user = UserModel(username=self.username, email=f'{self.username}@gmail.com')
+        self.user.set_password(self.password)
+        self.user.save()
+
+        self.data = {
+            'username': self.username,
+            'password': self.password,
+            'device_id': str(uuid.uuid4()),
+        }
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    def test_status(self):
+        response = self.client.post(reverse('django_simple_2fa:status'), self.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['two_factor_type'], 'email')
+        self.assertEqual(response['X-RateLimit-Remaining'], '3')
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    def test_obtain(self):
+        with mock.patch.object(EmailMultiAlternatives, 'send') as mocked_send_mail:
+            response = self.client.post(reverse('django_simple_2fa:obtain'), self.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(mocked_send_mail.called)
+        self.assertNotIn('verification_code', response.data)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    def test_verify_with_invalid_code(self):
+        response = self.client.post(reverse('django_simple_2fa:verify'), {**self.data, 'verification_code': '000000'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['X-RateLimit-Remaining'], '2')
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: False)
+    def test_login_without_csrf_token(self):
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post(reverse('django_simple_2fa:login'), self.data)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('_auth_user_id', client.session)
+
+        csrf_token = get_random_string(CSRF_SECRET_LENGTH)
+        client.cookies[settings.CSRF_COOKIE_NAME] = csrf_token
+        response = client.post(reverse('django_simple_2fa:login'), self.data, HTTP_X_CSRFTOKEN=csrf_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(client.session['_auth_user_id']), self.user.pk)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: False)
+    def test_login_with_trusted_device(self):
+        response = self.client.post(reverse('django_simple_2fa:login'), self.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_verified'])
+        self.assertEqual(response.data['user_id'], self.user.pk)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    def test_login_sends_code(self):
+        with mock.patch.object(EmailMultiAlternatives, 'send'):
+            response = self.client.post(reverse('django_simple_2fa:login'), self.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_verified'])
+
+    @mock.patch.object(app_settings, attribute='IS_ENABLED', new=lambda: True)
+    def test_locked(self):
+        data = {**self.data, 'password': str(uuid.uuid4())}
+
+        for _ in range(3):
+            response = self.client.post(reverse('django_simple_2fa:status'), data)
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('django_simple_2fa:status'), data)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
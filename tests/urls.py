@@ -1,9 +1,10 @@
 from __future__ import absolute_import, unicode_literals
 
-from django.urls import path
+from django.urls import include, path
 from django.contrib import admin
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('2fa/', include('django_simple_2fa.urls', namespace='django_simple_2fa')),
 ]